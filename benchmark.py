@@ -0,0 +1,205 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from logging import getLogger
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import headless
+from nodes import entity
+from simulator import Simulator
+
+logger = getLogger(__name__)
+
+# Times the hot paths of the editor on synthetic graphs of the builtins,
+# headless. Results are saved as JSON to compare versions (see --compare).
+
+
+def chain(graph, n):
+    # Integer -> Add -> Add -> ... : the deepest graph
+    source = graph.create_node("builtins.IntegerNode", name="Integer")
+    source.set_property("value", 1)
+    last = source
+    for i in range(n - 1):
+        node = graph.create_node("builtins.AddNode", name=f"Add{i}")
+        graph.connect(last.get_output("value"), node.get_input("a"))
+        graph.connect(source.get_output("value"), node.get_input("b"))
+        last = node
+    return last
+
+def fanout(graph, n):
+    # Integer -> Add x (n - 1): the widest graph
+    source = graph.create_node("builtins.IntegerNode", name="Integer")
+    source.set_property("value", 1)
+    last = source
+    for i in range(n - 1):
+        last = graph.create_node("builtins.AddNode", name=f"Add{i}")
+        graph.connect(source.get_output("value"), last.get_input("a"))
+        graph.connect(source.get_output("value"), last.get_input("b"))
+    return last
+
+SPREAD_WIDTH = 8
+
+def spread(graph, n):
+    # Integer x SPREAD_WIDTH -> Group -> Add -> Add -> ... : a chain expanding a Spread at every node
+    group = graph.create_node("builtins.GroupNode", name="Group")
+    group.set_property("ninputs", SPREAD_WIDTH)
+    group.on_value_changed(SPREAD_WIDTH)
+    for k in range(SPREAD_WIDTH):
+        source = graph.create_node("builtins.IntegerNode", name=f"Integer{k}")
+        source.set_property("value", k)
+        graph.connect(source.get_output("value"), group.get_input(f"in{k + 1}"))
+    last = group
+    for i in range(max(n - SPREAD_WIDTH - 1, 1)):
+        node = graph.create_node("builtins.AddNode", name=f"Add{i}")
+        graph.connect(last.get_output("value"), node.get_input("a"))
+        graph.connect(group.get_output("value"), node.get_input("b"))
+        last = node
+    return last
+
+SHAPES = {"chain": chain, "fanout": fanout, "spread": spread}
+
+def timeit(function, repeat, setup=None):
+    # The best of repeat, in seconds. setup() is called before each, untimed
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def trait_pairs(graph, calls=10000):
+    # The traits checked by verify_session, (given, expected) for calls
+    pairs = []
+    for node in graph.all_nodes():
+        for port in node.input_ports():
+            if len(port.connected_ports()) > 0:
+                pairs.append((node.get_input_port_traits(port.name()), node.get_port_traits_def(port.name())))
+    return (pairs * (calls // max(len(pairs), 1) + 1))[: calls]
+
+def bench(shape, n, repeat):
+    result = {"shape": shape, "nodes": n}
+
+    def measure(name, function, calls=1, setup=None):
+        try:
+            result[name] = timeit(function, repeat, setup) / calls
+        except RecursionError as e:
+            result[name] = None
+            result.setdefault("errors", {})[name] = repr(e)
+
+    graph = headless.HeadlessGraph()
+    start = time.perf_counter()
+    last = SHAPES[shape](graph, n)
+    result["build"] = time.perf_counter() - start
+    result["nodes"] = len(graph.all_nodes())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, "session.json")
+        measure("save_session", lambda: graph.save_session(file_path))
+        measure("load_session", lambda: headless.HeadlessGraph().load_session(file_path))
+
+    def invalidate():
+        # Resolved traits are cached, and would be only looked up from the second repeat on
+        for node in graph.all_nodes():
+            if hasattr(node, "invalidate_traits"):
+                node.invalidate_traits()
+
+    def verify():
+        headless.reset_session(graph)
+        assert headless.verify_session(graph)
+    measure("verify_session", verify, setup=invalidate)
+    measure("get_output_port_traits", lambda: last.get_output_port_traits("value"), setup=invalidate)
+    if "verify_session" in result.get("errors", {}):
+        return result  # Neither runs
+    pairs = trait_pairs(graph)
+
+    def check():
+        for traits, traits_def in pairs:
+            entity.is_acceptable(traits, traits_def)
+    measure("is_acceptable", check, len(pairs))  # Per call
+
+    def run():
+        graph.simulator = Simulator()
+        headless.reset_session(graph)
+        headless.run_session(graph)
+        graph.simulator.wait()
+    measure("run", run)
+    return result
+
+def version():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return None
+
+def compare(results, baseline, threshold):
+    # -> the timings slower than the baseline by more than threshold (ratio)
+    previous = {(result["shape"], result["nodes"]): result for result in baseline["results"]}
+    regressions = []
+    for result in results["results"]:
+        other = previous.get((result["shape"], result["nodes"]))
+        if other is None:
+            continue
+        for name, value in result.items():
+            if name in ("shape", "nodes", "build", "errors") or value is None or other.get(name) is None:
+                continue
+            ratio = value / other[name] if other[name] > 0 else float("inf")
+            if ratio > threshold:
+                regressions.append((result["shape"], result["nodes"], name, other[name], value, ratio))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the hot paths of the editor on synthetic graphs.")
+    parser.add_argument("-o", "--output", default=None, help="JSON file to save the results to")
+    parser.add_argument("--shapes", nargs="+", default=list(SHAPES), choices=list(SHAPES), help="graphs to generate")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10, 100, 1000, 10000], help="numbers of nodes")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="the best of this many is taken")
+    parser.add_argument("--compare", default=None, help="results of another version to compare with")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown (ratio) reported as a regression by --compare")
+    args = parser.parse_args(argv)
+
+    results = {
+        "version": version(),
+        "date": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": [],
+    }
+    for shape in args.shapes:
+        for n in args.sizes:
+            result = bench(shape, n, args.repeat)
+            results["results"].append(result)
+            print(" ".join(
+                f"{name}={value:.6g}" if isinstance(value, float) else f"{name}={value}"
+                for name, value in result.items() if name != "errors"), flush=True)
+            for name, error in result.get("errors", {}).items():
+                print(f"  {name}: {error}", file=sys.stderr)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for shape, n, name, before, after, ratio in regressions:
+            print(f"regression: {shape} {n} {name} {before:.6g} -> {after:.6g} (x{ratio:.2f})", file=sys.stderr)
+        return 1 if len(regressions) > 0 else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
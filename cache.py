@@ -0,0 +1,215 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import hashlib
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import types
+
+import numpy
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# Outputs of pure nodes kept on disk across sessions. The simulator keys
+# them by the code of the node and the fingerprints of its input tokens
+# (see Simulator), so the cache knows nothing but keys and tokens.
+
+
+@functools.lru_cache(maxsize=None)
+def module_digest(name):
+    # Identifies a module by its source, which holds the helpers of its
+    # functions, e.g. nodes.kernels.elementwise
+    h = hashlib.blake2b(name.encode(), digest_size=16)
+    path = getattr(sys.modules.get(name), "__file__", None)
+    if path is not None:
+        try:
+            with open(path, "rb") as f:
+                h.update(f.read())
+        except OSError:
+            pass
+    return h.digest()
+
+def code_digest(*functions, modules=()):
+    # Identifies functions by their names and code, and the modules they
+    # are defined in, as well as the other modules given. A change in any
+    # gives another digest, so that stale entries are never hit. None is skipped
+    h = hashlib.blake2b(digest_size=16)
+
+    def update(code):
+        h.update(code.co_code)
+        for const in code.co_consts:
+            if isinstance(const, types.CodeType):
+                update(const)  # Its repr has an address
+            else:
+                h.update(repr(const).encode())
+        h.update(repr(code.co_names).encode())
+
+    for function in functions:
+        if function is None:
+            continue
+        if isinstance(function, functools.partial):
+            function = function.func
+        function = getattr(function, "__func__", function)
+        h.update(f"{function.__module__}.{function.__qualname__}".encode())
+        update(function.__code__)
+        h.update(module_digest(function.__module__))
+    for name in modules:
+        h.update(module_digest(name))
+    return h.digest()
+
+class DiskCache:
+    """Content-addressed store of the output tokens of pure nodes.
+
+    An entry is a directory named after its key. Arrays are saved as .npy
+    files, and loaded as read-only memory maps. Everything else is pickled.
+    The least recently used entries are evicted beyond max_bytes. Sessions
+    in the editor and headless runs may share the directory: entries are
+    written to a temporary directory and renamed into place.
+
+    put returns at once: entries are written and evicted in a thread of
+    their own, off the scheduler thread, like checkpoint.Checkpointer does.
+    Tokens are immutable, so they are written as they are.
+    """
+
+    def __init__(self, root, max_bytes=1 << 30):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self.__sizes = None  # entry path -> bytes. Scanned on the first put
+        self.__total = 0
+        self.__writer = ThreadPoolExecutor(max_workers=1)  # Owns __sizes and __total
+
+    def __path(self, key):
+        name = key.hex()
+        return os.path.join(self.root, name[: 2], name)
+
+    def get(self, key):
+        # -> {port name: {"value": ..., "traits": ...}}, or None
+        path = self.__path(key)
+        try:
+            with open(os.path.join(path, "tokens.pkl"), "rb") as f:
+                entries = pickle.load(f)
+            output_tokens = {}
+            for j, (name, traits, is_array, value) in enumerate(entries):
+                if is_array:
+                    value = numpy.load(os.path.join(path, f"{j}.npy"), mmap_mode="r").view(numpy.ndarray)
+                output_tokens[name] = dict(value=value, traits=traits)
+            os.utime(path)  # Recently used
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return None  # Missing, or evicted meanwhile
+        return output_tokens
+
+    def put(self, key, output_tokens):
+        self.__writer.submit(self.__write, key, output_tokens)
+
+    def __write(self, key, output_tokens):
+        try:
+            self.__put(key, output_tokens)
+        except Exception as e:
+            logger.error('put %s: %r', key.hex(), e)
+
+    def __put(self, key, output_tokens):
+        path = self.__path(key)
+        if os.path.isdir(path):
+            return
+
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=self.root)
+        try:
+            entries = []
+            for j, (name, token) in enumerate(output_tokens.items()):
+                value = token["value"]
+                is_array = isinstance(value, numpy.ndarray) and not value.dtype.hasobject and value.size > 0
+                if is_array:
+                    numpy.save(os.path.join(tmp, f"{j}.npy"), value)
+                entries.append((name, token["traits"], is_array, None if is_array else value))
+            with open(os.path.join(tmp, "tokens.pkl"), "wb") as f:
+                pickle.dump(entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = self.__size_of(tmp)
+            if size > self.max_bytes:
+                return
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.rename(tmp, path)
+        except (OSError, pickle.PicklingError, AttributeError, TypeError) as e:
+            # Unpicklable values are not cached. An entry put by another
+            # process first makes the rename fail
+            logger.info('put %s: %r', key.hex(), e)
+            return
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        if self.__sizes is None:
+            self.__scan()
+        else:
+            self.__sizes[path] = size
+            self.__total += size
+        if self.__total > self.max_bytes:
+            self.__evict()
+
+    def __scan(self):
+        self.__sizes = {}
+        for prefix in os.listdir(self.root):
+            if prefix.startswith("."):
+                continue
+            directory = os.path.join(self.root, prefix)
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                self.__sizes[path] = self.__size_of(path)
+        self.__total = sum(self.__sizes.values())
+
+    def __evict(self):
+        self.__scan()  # Entries put by the others count as well
+        mtimes = {}
+        for path in self.__sizes:
+            try:
+                mtimes[path] = os.stat(path).st_mtime
+            except OSError:
+                mtimes[path] = 0
+        for path in sorted(self.__sizes, key=mtimes.get):
+            if self.__total <= self.max_bytes:
+                break
+            self.__total -= self.__sizes.pop(path)
+            self.__remove(path)
+
+    def __remove(self, path):
+        # Gone at once for the readers, then deleted
+        tmp = os.path.join(self.root, f".tmp-{os.path.basename(path)}")
+        try:
+            os.rename(path, tmp)
+        except OSError:
+            return
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    def flush(self):
+        # Waits for the entries put so far to be written
+        self.__writer.submit(lambda: None).result()
+
+    def clear(self):
+        self.flush()
+        if self.__sizes is None:
+            self.__scan()
+        for path in list(self.__sizes):
+            self.__remove(path)
+        self.__sizes = {}
+        self.__total = 0
+
+    def size(self):
+        self.flush()
+        if self.__sizes is None:
+            self.__scan()
+        return self.__total
+
+    @staticmethod
+    def __size_of(path):
+        total = 0
+        try:
+            for name in os.listdir(path):
+                total += os.path.getsize(os.path.join(path, name))
+        except OSError:
+            pass
+        return total
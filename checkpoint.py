@@ -0,0 +1,60 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor
+import os
+import pickle
+import time
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# Checkpoints of the simulator, for resuming a long protocol after a crash.
+# The simulator takes a snapshot of its state on the scheduler thread (see
+# Simulator.snapshot), which refers to the tokens instead of copying them
+# as tokens are immutable, and the snapshot is pickled and written here in
+# a thread of its own.
+
+
+class Checkpointer:
+
+    def __init__(self, path, interval=30.0):
+        self.path = path
+        self.interval = interval  # Seconds between checkpoints
+        self.__last = time.monotonic()
+        self.__executor = ThreadPoolExecutor(max_workers=1)
+        self.__future = None
+
+    def due(self):
+        if self.__future is not None and not self.__future.done():
+            return False  # Still writing the last one
+        return time.monotonic() - self.__last >= self.interval
+
+    def write(self, state):
+        self.__last = time.monotonic()
+        self.__future = self.__executor.submit(self.__write, state)
+
+    def __write(self, state):
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path)  # The last checkpoint survives a crash while writing
+        except Exception as e:
+            logger.error('checkpoint %s: %r', self.path, e)
+        else:
+            logger.info('checkpoint %s', self.path)
+
+    def flush(self):
+        if self.__future is not None:
+            self.__future.result()
+
+    def shutdown(self):
+        self.__executor.shutdown()
+
+    def load(self):
+        return load(self.path)
+
+def load(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
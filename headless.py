@@ -0,0 +1,400 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from logging import getLogger
+
+import argparse
+import inspect
+import json
+import sys
+
+from nodes.core import ofp_node_base, NodeStatusEnum, PortChanges
+from nodes import kernels
+from nodes.control import async_experiments
+from nodes.stream import Stream
+from simulator import Simulator
+from cache import DiskCache
+from checkpoint import Checkpointer
+from tracing import Tracer
+from virtual_time import DurationModel, VirtualClock
+from plan import ExecutionPlan
+
+logger = getLogger(__name__)
+
+# Runs a saved session without Qt. The graph model below provides the part of
+# the NodeGraphQt API used by nodes.core and nodes.kernels, so that the nodes
+# execute exactly as they do in the editor.
+
+
+class HeadlessPort:
+
+    def __init__(self, node, name, is_input):
+        self.__node = node
+        self.__name = name
+        self.__is_input = is_input
+        self.__connected_ports = []
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__}("{self.__name}") of {self.__node}>'
+
+    def name(self):
+        return self.__name
+
+    def node(self):
+        return self.__node
+
+    def connected_ports(self):
+        return list(self.__connected_ports)
+
+    def connect_to(self, port):
+        self.__connected_ports.append(port)
+        port.__connected_ports.append(self)
+        # The node of the input port is told, as in NodeGraphQt
+        in_port, out_port = (self, port) if self.__is_input else (port, self)
+        in_port.node().on_input_connected(in_port, out_port)
+
+    def disconnect_from(self, port):
+        self.__connected_ports.remove(port)
+        port.__connected_ports.remove(self)
+        in_port, out_port = (self, port) if self.__is_input else (port, self)
+        in_port.node().on_input_disconnected(in_port, out_port)
+
+class HeadlessBaseNode:
+
+    TEXT_WIDGET_TYPE = None
+    OBJECT_PORT_PAINTER = None
+
+    NODE_NAME = "Node"
+
+    def __init__(self):
+        self.__name = self.NODE_NAME
+        self.__properties = {}
+        self.__inputs = {}
+        self.__outputs = {}
+        self.color = (13, 18, 23)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__}("{self.__name}")>'
+
+    def name(self):
+        return self.__name
+
+    def set_name(self, name):
+        self.__name = name
+
+    def create_property(self, name, value, **kwargs):
+        self.__properties[name] = value
+
+    def has_property(self, name):
+        return name in self.__properties
+
+    def get_property(self, name):
+        return self.__properties.get(name)
+
+    def set_property(self, name, value, push_undo=True):
+        self.__properties[name] = value
+
+    def properties(self):
+        return self.__properties.copy()
+
+    def add_input(self, name='input', multi_input=False, display_name=True, color=None, locked=False, painter_func=None):
+        port = HeadlessPort(self, name, True)
+        self.__inputs[name] = port
+        return port
+
+    def add_output(self, name='output', multi_output=True, display_name=True, color=None, locked=False, painter_func=None):
+        port = HeadlessPort(self, name, False)
+        self.__outputs[name] = port
+        return port
+
+    def get_input(self, name):
+        return self.__inputs.get(name)
+
+    def get_output(self, name):
+        return self.__outputs.get(name)
+
+    def input_ports(self):
+        return list(self.__inputs.values())
+
+    def output_ports(self):
+        return list(self.__outputs.values())
+
+    def delete_input(self, name):
+        del self.__inputs[name]
+
+    def delete_output(self, name):
+        del self.__outputs[name]
+
+    def on_input_connected(self, in_port, out_port):
+        pass
+
+    def on_input_disconnected(self, in_port, out_port):
+        pass
+
+    def set_color(self, r=0, g=0, b=0, a=255):
+        self.color = (r, g, b)
+
+    def update_port_tooltip(self, port, port_traits):
+        pass
+
+    def update_node_tooltip(self, text):
+        pass
+
+class HeadlessNode(ofp_node_base(HeadlessBaseNode)):
+
+    def __init__(self):
+        super(HeadlessNode, self).__init__()
+
+def kernel_node_types():
+    # RangeKernel -> builtins.RangeNode as registered by the editor
+    node_types = {}
+    for name, kernel in inspect.getmembers(kernels, inspect.isclass):
+        if not issubclass(kernel, kernels.BuiltinKernel) or kernel is kernels.BuiltinKernel:
+            continue
+        assert name.endswith("Kernel"), name
+        node_name = name[: -len("Kernel")]
+        node_type = f"builtins.{node_name}Node"
+        node_types[node_type] = type(f"{node_name}Node", (kernel, HeadlessNode), {"NODE_NAME": node_name, "type_": node_type})
+    return node_types
+
+NODE_TYPES = kernel_node_types()
+
+def declared_node_types(declarations):
+    # MeasureNode under node in config.yaml -> nodes.test.MeasureNode as registered by the editor
+    node_types = {}
+    for name, doc in declarations.items():
+        node_type = f"nodes.{doc.get('tab', 'test')}.{name}"
+        node_types[node_type] = type(name, (kernels.declared_kernel(doc), HeadlessNode), {"NODE_NAME": name, "type_": node_type})
+    return node_types
+
+# Saved by the editor, but with nothing to run: the switches of the stations
+IGNORED_NODE_TYPES = ("nodes.config.ConfigNode", )
+
+class HeadlessGraph:
+
+    def __init__(self, simulator=None, declarations=None):
+        # declarations: node in config.yaml
+        self.simulator = simulator or Simulator()
+        self.__node_types = dict(NODE_TYPES, **declared_node_types(declarations or {}))
+        self.__nodes = {}
+        self.__plan = None
+        self.__plan_ports = None  # PortChanges.count when the plan was built
+
+    def all_nodes(self):
+        return list(self.__nodes.values())
+
+    def get_node_by_id(self, node_id):
+        return self.__nodes.get(node_id)
+
+    def create_node(self, node_type, node_id=None, name=None):
+        if node_type not in self.__node_types:
+            raise ValueError(f"Unsupported node type [{node_type}]")
+        node = self.__node_types[node_type]()
+        if name is not None:
+            node.set_name(name)
+        node_id = node_id or hex(id(node))
+        self.__nodes[node_id] = node
+        self.__plan = None
+        return node
+
+    def connect(self, out_port, in_port):
+        out_port.connect_to(in_port)
+        self.__plan = None
+
+    def execution_plan(self):
+        if self.__plan is None or self.__plan_ports != PortChanges.count:
+            self.__plan = ExecutionPlan(self.all_nodes())
+            self.__plan_ports = PortChanges.count
+        return self.__plan
+
+    def deserialize_session(self, layout_data):
+        # Checked before any node is created, so that a session is run whole or not at all
+        node_types = {node_data["type_"] for node_data in layout_data.get("nodes", {}).values()}
+        unsupported = sorted(node_types - set(self.__node_types) - set(IGNORED_NODE_TYPES))
+        if len(unsupported) > 0:
+            raise ValueError(
+                f"Unsupported node types {unsupported}. Group nodes, e.g. ForEach, do not run headless, "
+                "and nodes declared in config.yaml need its node section (--config)")
+
+        for node_id, node_data in layout_data.get("nodes", {}).items():
+            if node_data["type_"] in IGNORED_NODE_TYPES:
+                continue
+            node = self.create_node(node_data["type_"], node_id, node_data.get("name"))
+            custom = node_data.get("custom", {})
+            for name, value in custom.items():
+                node.set_property(name, value, push_undo=False)
+            if "ninputs" in custom:
+                # The widget emits valueChanged in the editor
+                node.on_value_changed(custom["ninputs"])
+
+        for connection in layout_data.get("connections", []):
+            out_id, out_name = connection["out"]
+            in_id, in_name = connection["in"]
+            out_port = self.__nodes[out_id].get_output(out_name)
+            in_port = self.__nodes[in_id].get_input(in_name)
+            assert out_port is not None and in_port is not None, connection
+            self.connect(out_port, in_port)
+
+    def load_session(self, file_path):
+        with open(file_path) as f:
+            layout_data = json.load(f)
+        self.deserialize_session(layout_data)
+
+    def serialize_session(self):
+        # The part of a session saved by the editor read by deserialize_session
+        node_ids = {node: node_id for node_id, node in self.__nodes.items()}
+        layout_data = {"nodes": {}, "connections": []}
+        for node_id, node in self.__nodes.items():
+            layout_data["nodes"][node_id] = {"type_": node.type_, "name": node.name(), "custom": node.properties()}
+            for port in node.input_ports():
+                for another in port.connected_ports():
+                    layout_data["connections"].append({"in": [node_id, port.name()], "out": [node_ids[another.node()], another.name()]})
+        return layout_data
+
+    def save_session(self, file_path):
+        with open(file_path, "w") as f:
+            json.dump(self.serialize_session(), f, indent=2)
+
+def reset_session(graph):
+    for node in graph.all_nodes():
+        if node.get_node_status() in (NodeStatusEnum.DONE, NodeStatusEnum.WAITING, NodeStatusEnum.RUNNING):
+            node.reset()
+            node.set_node_status(NodeStatusEnum.READY)
+
+def verify_session(graph):
+    is_valid_graph = True
+    for node in graph.all_nodes():
+        is_valid_node = node.check()
+        is_valid_graph = is_valid_graph and is_valid_node
+    return is_valid_graph
+
+def run_session(graph, runs=1):
+    all_nodes = graph.all_nodes()
+    for node in all_nodes:
+        if node.get_node_status() == NodeStatusEnum.READY:
+            node.set_node_status(NodeStatusEnum.WAITING)
+    graph.simulator.schedule(graph.execution_plan(), id(graph), runs)
+
+def run_batch(graph, parameters):
+    # Runs an instance of the graph per entry of parameters (see Simulator.submit_batch),
+    # and returns their results
+    for node in graph.all_nodes():
+        if node.get_node_status() == NodeStatusEnum.READY:
+            node.set_node_status(NodeStatusEnum.WAITING)
+    simulator = graph.simulator
+    instances = simulator.submit_batch(graph.execution_plan(), id(graph), parameters)
+    simulator.wait()
+    results = []
+    for instance in instances:
+        assert simulator.is_finished(instance), instance
+        results.append(simulator.results(instance))
+        simulator.release(instance)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a protocol session without the editor.")
+    parser.add_argument("session", help="session file saved by the editor (JSON)")
+    parser.add_argument("-n", "--runs", type=int, default=1, help="number of runs pipelined through the graph")
+    parser.add_argument("--capacity", type=int, default=None, help="max tokens queued at an input port")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="execute nodes in a thread pool of this size")
+    parser.add_argument("-p", "--processes", type=int, default=None, help="execute pure nodes in a process pool of this size")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="send instrument requests through the asyncio server")
+    parser.add_argument("--config", default=None, help="config.yaml declaring the nodes (node) and giving the stations (model.station, model.capacity) for --async and --virtual")
+    parser.add_argument("--timeout", type=float, default=None, help="timeout of an instrument request in seconds, waiting for a station included")
+    parser.add_argument("--incremental", action="store_true", help="reuse the outputs of pure nodes whose inputs are unchanged since their last execution")
+    parser.add_argument("--cache", default=None, help="directory caching the outputs of pure nodes across runs")
+    parser.add_argument("--cache-size", type=int, default=1024, help="max size of the cache in MiB")
+    parser.add_argument("--checkpoint", default=None, help="file to save the state of the runs to periodically")
+    parser.add_argument("--checkpoint-interval", type=float, default=30.0, help="seconds between checkpoints")
+    parser.add_argument("--resume", action="store_true", help="continue the runs saved in --checkpoint")
+    parser.add_argument("--trace", default=None, help="file to save a trace of the executions to (Chrome trace JSON, for chrome://tracing or Perfetto)")
+    parser.add_argument("--virtual", action="store_true", help="simulate the durations on the line in virtual time (model.duration in --config)")
+    parser.add_argument("--critical-path", action="store_true", help="report the longest path by the durations in --config (model.duration)")
+    parser.add_argument("--stream", type=int, default=None, help="pure nodes expanding a Spread of this many elements or more compute them lazily, as the nodes downstream read them")
+    parser.add_argument("--batch", default=None, help="JSON list of parameters, one instance each: {node name: {output port: value}}")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log the simulator")
+    args = parser.parse_args(argv)
+
+    if args.verbose:
+        from logging import basicConfig, INFO
+        basicConfig(level=INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    doc = {}
+    if args.config is not None:
+        import yaml
+        with open(args.config) as f:
+            doc = yaml.safe_load(f)
+    model = doc.get('model', {})
+
+    server = None
+    if args.use_async:
+        server = async_experiments
+        server.configure(model.get('station', {}), args.timeout, model.get('capacity'))
+        server.start()
+
+    if args.resume and args.checkpoint is None:
+        parser.error("--resume requires --checkpoint")
+
+    cache = None if args.cache is None else DiskCache(args.cache, args.cache_size << 20)
+    checkpoint = None if args.checkpoint is None else Checkpointer(args.checkpoint, args.checkpoint_interval)
+    tracer = None if args.trace is None else Tracer()
+    durations = DurationModel(model)
+    clock = VirtualClock(durations) if args.virtual else None
+    cost = durations.estimate if len(model.get('duration', {})) > 0 else None  # Nodes on the longest path first
+    graph = HeadlessGraph(Simulator(
+        capacity=args.capacity, max_workers=args.workers, server=server, processes=args.processes,
+        incremental=args.incremental, cache=cache, checkpoint=checkpoint, tracer=tracer, clock=clock, cost=cost, stream=args.stream),
+        doc.get('node', {}))
+    try:
+        graph.load_session(args.session)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        graph.simulator.shutdown()
+        if server is not None:
+            server.stop()
+        return 1
+
+    reset_session(graph)
+    if not verify_session(graph):
+        for node in graph.all_nodes():
+            if node.get_node_status() == NodeStatusEnum.ERROR:
+                print(f"{node.name()}: {node.get_property('message')}", file=sys.stderr)
+        return 1
+
+    if args.critical_path:
+        path, total = graph.simulator.critical_path(graph.execution_plan())
+        print(f"critical path: {' -> '.join(node.name() for node in path)} ({total:g}{' s' if cost is not None else ' nodes'})")
+
+    if args.batch is not None:
+        with open(args.batch) as f:
+            parameters = json.load(f)
+        for results in run_batch(graph, parameters):
+            print(json.dumps({
+                name: {port_name: token["value"] for port_name, token in tokens.items()}
+                for name, tokens in results.items()
+            }, default=lambda value: list(value) if isinstance(value, Stream) else str(value)))
+    elif args.resume:
+        graph.simulator.resume(graph.execution_plan(), id(graph))
+    else:
+        run_session(graph, args.runs)
+    graph.simulator.wait()
+    graph.simulator.shutdown()
+    if server is not None:
+        server.stop()
+    if tracer is not None:
+        tracer.save(args.trace)
+    if clock is not None:
+        report = clock.report()
+        print(f"makespan: {report['makespan']:g} s")
+        for station, stats in report["stations"].items():
+            print(f"{station}: utilization {stats['utilization']:.1%}, {stats['executions']} executions, "
+                  f"queueing delay {stats['queueing_delay']:g} s (mean {stats['mean_queueing_delay']:g} s, max {stats['max_queueing_delay']:g} s)")
+
+    is_done = True
+    for node in graph.all_nodes():
+        status = node.get_node_status()
+        print(f"{node.name()}: {status.name}")
+        is_done = is_done and status == NodeStatusEnum.DONE
+    return 0 if is_done else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import hashlib
+import weakref
+from collections import deque
+
+from nodes.stream import Stream
+from token_store import Token, fingerprint, digest
+from cache import code_digest
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# Incremental mode: a PURE and DETERMINISTIC node whose input tokens have the same
+# fingerprints as in its last execution yields the output tokens of
+# that execution again instead of executing. Its outputs are then
+# fingerprinted after its code and inputs, so that nodes downstream
+# of unchanged ones are skipped as well. Tokens from the other nodes
+# are fingerprinted by content (see token_store.fingerprint).
+# With a cache.DiskCache, the outputs are also looked up on disk by
+# the same fingerprint, which holds across sessions.
+
+
+class Memo:
+    """Output tokens of the last execution of nodes, by their input tokens.
+
+    The Simulator calls lookup() as a node runs, and store() with the
+    outputs of each execution, in the same order. forget() drops the
+    executions in flight when the node is reset, fail() when it failed.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache  # A cache.DiskCache or None
+        self.__memo = weakref.WeakKeyDictionary()  # node -> (fingerprint of the inputs, output tokens)
+        self.__code_digests = {}  # node class -> cache.code_digest of its pure function, its _execute_batch and the traits
+        self.__fingerprints = weakref.WeakKeyDictionary()  # node -> fingerprints of the inputs in flight, None if not memoized
+
+    def is_memoized(self, node: "OFPNode") -> bool:
+        return node.PURE and node.DETERMINISTIC
+
+    def __is_cached(self, node: "OFPNode") -> bool:
+        return self.cache is not None and node.DETERMINISTIC
+
+    def input_fingerprint(self, node: "OFPNode", input_tokens: dict) -> bytes:
+        # Of the code, the default values and the input tokens. PURE nodes read no properties
+        cls = type(node)
+        if cls not in self.__code_digests:
+            self.__code_digests[cls] = code_digest(node.pure_function(), node._execute_batch, modules=("nodes.core", "nodes.entity"))
+        h = hashlib.blake2b(self.__code_digests[cls], digest_size=16)
+        h.update(digest(node.default_value))
+        for name in sorted(input_tokens):
+            h.update(name.encode())
+            h.update(fingerprint(input_tokens[name]))
+        return h.digest()
+
+    def lookup(self, node: "OFPNode", input_tokens: dict, outputs: bool = True, overridden: bool = False):
+        # The output tokens to yield instead of executing node on input_tokens,
+        # or None. outputs: if the node has outputs. Sinks, e.g. Scatter,
+        # execute to show their inputs in a new session.
+        # Raises StreamError failing to read a Stream in input_tokens
+        if not self.is_memoized(node):
+            return None
+        input_fingerprint = None if overridden else self.input_fingerprint(node, input_tokens)
+        self.__fingerprints.setdefault(node, deque()).append(input_fingerprint)
+        if input_fingerprint is None:
+            return None
+        memo = self.__memo.get(node)
+        if self.__is_cached(node) and (memo is None or memo[0] != input_fingerprint) and outputs:
+            output_tokens = self.cache.get(input_fingerprint)
+            if output_tokens is not None:
+                memo = self.__memo[node] = (input_fingerprint, output_tokens)
+        if memo is not None and memo[0] == input_fingerprint and len(self.__fingerprints[node]) == 1:
+            return dict(memo[1])
+        return None
+
+    def store(self, node: "OFPNode", output_tokens: dict) -> dict:
+        # Fingerprints the outputs of the next execution of node in flight
+        input_fingerprint = self.__fingerprints[node].popleft() if self.is_memoized(node) else None
+        if input_fingerprint is None:
+            return output_tokens
+        output_tokens = {
+            name: Token.of(value, hashlib.blake2b(name.encode(), digest_size=16, key=input_fingerprint).digest())
+            for name, value in output_tokens.items()
+        }
+        if (self.__is_cached(node) and len(output_tokens) > 0 and self.__memo.get(node, (None, ))[0] != input_fingerprint
+                and not any(isinstance(token["value"], Stream) for token in output_tokens.values())):
+            self.cache.put(input_fingerprint, output_tokens)  # Executed. Written in the background, but not Streams, which would be computed in full
+        self.__memo[node] = (input_fingerprint, output_tokens)
+        return output_tokens
+
+    def forget(self, node: "OFPNode") -> None:
+        self.__fingerprints.pop(node, None)
+
+    def fail(self, node: "OFPNode") -> None:
+        if node in self.__fingerprints:
+            self.__fingerprints[node].clear()
+
+    def invalidate(self, node: "OFPNode") -> None:
+        # Not to be reused, e.g. failing to compute a Stream it returned
+        self.__memo.pop(node, None)
+
+    def flush(self) -> None:
+        if self.cache is not None:
+            self.cache.flush()
@@ -8,6 +8,11 @@ import numpy
 import uuid
 import datetime
 import inspect
+import asyncio
+import contextvars
+import threading
+import heapq
+import itertools
 
 from nodes import entity
 
@@ -60,3 +65,330 @@ class DummyServer(ServerBase):
         return data
 
 experiments = DummyServer()
+
+class AsyncServerBase:
+
+    async def serve_plate_96wells(self):
+        raise NotImplementedError()
+
+    async def dispose_labware(self, obj):
+        raise NotImplementedError()
+
+    async def save_artifacts(self, data, where):
+        raise NotImplementedError()
+
+    async def store_labware(self, obj, where):
+        raise NotImplementedError()
+
+    async def dispense_liquid_96wells(self, obj, data, channel):
+        raise NotImplementedError()
+
+    async def read_absorbance_3colors(self, obj):
+        raise NotImplementedError()
+
+class AsyncDummyServer(AsyncServerBase):
+
+    def __init__(self, latency=0.0):
+        self.latency = latency  # seconds per request
+        self.__server = DummyServer()
+
+    async def serve_plate_96wells(self):
+        await asyncio.sleep(self.latency)
+        return self.__server.serve_plate_96wells()
+
+    async def dispose_labware(self, obj):
+        await asyncio.sleep(self.latency)
+        return self.__server.dispose_labware(obj)
+
+    async def save_artifacts(self, data, where):
+        await asyncio.sleep(self.latency)
+        return self.__server.save_artifacts(data, where)
+
+    async def store_labware(self, obj, where):
+        await asyncio.sleep(self.latency)
+        return self.__server.store_labware(obj, where)
+
+    async def dispense_liquid_96wells(self, obj, data, channel):
+        await asyncio.sleep(self.latency)
+        return self.__server.dispense_liquid_96wells(obj, data, channel)
+
+    async def read_absorbance_3colors(self, obj):
+        await asyncio.sleep(self.latency)
+        return self.__server.read_absorbance_3colors(obj)
+
+# Stations of the line, as given in config.yaml (model):
+#
+#   station:
+#     station3: [DispenseLiquid96WellsNode]
+#     station4: [ObjectBiNode, DispenseLiquid96WellsNode]
+#   capacity:  # executions served at a time, 1 by default
+#     station4: 2
+
+class StationRequest:
+
+    def __init__(self, key, owner, candidates, callback):
+        self.key = key  # (-priority, start tag, serial)
+        self.owner = owner
+        self.candidates = candidates
+        self.callback = callback
+        self.station = None  # Granted
+        self.done = False  # Granted or cancelled
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+class StationAllocator:
+    """Allocates the stations to the executions of nodes at runtime.
+
+    A station serves up to its capacity at a time. A request takes the
+    least loaded of the enabled stations listing its node class, or waits
+    in their queues. Waiting requests are served by the priority of their
+    owner, e.g. a protocol, then in turns between owners (start-time fair
+    queueing), so that two protocols competing for a station share it
+    instead of the first one taking it until it is done.
+    """
+
+    def __init__(self, stations=None, capacity=None):
+        self.__lock = threading.Lock()
+        self.__disabled = set()
+        self.__priorities = {}  # owner -> priority. Higher first
+        self.configure(stations or {}, capacity)
+
+    def configure(self, stations, capacity=None):
+        capacity = {station: int((capacity or {}).get(station, 1)) for station in stations}
+        for station, value in capacity.items():
+            if value < 1:
+                raise ValueError(f"Capacity of {station} must be 1 or more: {value}")
+        candidates = {}
+        for station, class_names in stations.items():
+            for class_name in class_names or ():
+                candidates.setdefault(class_name, []).append(station)
+        with self.__lock:
+            self.__candidates = {class_name: tuple(value) for class_name, value in candidates.items()}
+            self.__capacity = capacity
+            self.__in_use = dict.fromkeys(stations, 0)
+            self.__granted = dict.fromkeys(stations, 0)  # Total, to balance ties
+            self.__queues = {station: [] for station in stations}  # heaps of StationRequest
+            self.__finish = {}  # owner -> finish tag of its last request
+            self.__virtual = 0  # start tag of the last request served
+            self.__serial = itertools.count()
+
+    def stations(self):
+        return list(self.__capacity)
+
+    def candidates(self, class_name):
+        return self.__candidates.get(class_name, ())
+
+    def station_of(self, class_name):
+        # The first station listing the class, enabled or not
+        candidates = self.__candidates.get(class_name, ())
+        return candidates[0] if len(candidates) > 0 else ""
+
+    def capacity(self, station):
+        return self.__capacity[station]
+
+    def in_use(self, station):
+        return self.__in_use[station]
+
+    def waiting(self, station):
+        return sum(1 for request in self.__queues[station] if not request.done)
+
+    def is_enabled(self, station):
+        return station not in self.__disabled
+
+    def set_enabled(self, station, enabled=True):
+        granted = []
+        with self.__lock:
+            if enabled:
+                self.__disabled.discard(station)
+                if station in self.__queues:
+                    self.__serve(station, granted)
+            else:
+                self.__disabled.add(station)
+        self.__notify(granted)
+
+    def set_priority(self, owner, priority):
+        self.__priorities[owner] = priority
+
+    def allocate(self, class_name):
+        # The station a request would take now, without taking it. "" if none is enabled
+        with self.__lock:
+            station = self.__least_loaded(class_name, free=False)
+        return station or ""
+
+    def request(self, class_name, callback, owner=None):
+        # callback(station) once granted, maybe at once, on the thread granting it.
+        # A class no station lists is given "", and needs no release
+        candidates = self.__candidates.get(class_name, ())
+        if len(candidates) == 0:
+            callback("")
+            return None
+
+        granted = []
+        with self.__lock:
+            start = max(self.__virtual, self.__finish.get(owner, 0))
+            self.__finish[owner] = start + 1
+            key = (-self.__priorities.get(owner, 0), start, next(self.__serial))
+            request = StationRequest(key, owner, candidates, callback)
+            station = self.__least_loaded(class_name, free=True)
+            if station is not None:
+                self.__grant(request, station, granted)
+            else:
+                for station in candidates:
+                    heapq.heappush(self.__queues[station], request)
+        self.__notify(granted)
+        return request
+
+    def cancel(self, request):
+        # False if granted already. Then the station is to be released
+        with self.__lock:
+            if request is None or request.station is not None:
+                return False
+            request.done = True
+            for station in request.candidates:
+                queue = self.__queues[station]
+                if request in queue:
+                    queue.remove(request)  # Not left behind a disabled station
+                    heapq.heapify(queue)
+            return True
+
+    def release(self, station):
+        granted = []
+        with self.__lock:
+            assert self.__in_use[station] > 0, station
+            self.__in_use[station] -= 1
+            self.__serve(station, granted)
+        self.__notify(granted)
+
+    def __least_loaded(self, class_name, free):
+        best, best_load = None, None
+        for station in self.__candidates.get(class_name, ()):
+            if station in self.__disabled:
+                continue
+            in_use, capacity = self.__in_use[station], self.__capacity[station]
+            if free and in_use >= capacity:
+                continue
+            load = (in_use / capacity, self.__granted[station])
+            if best is None or load < best_load:
+                best, best_load = station, load
+        return best
+
+    def __serve(self, station, granted):
+        queue = self.__queues[station]
+        while len(queue) > 0 and self.__in_use[station] < self.__capacity[station] and station not in self.__disabled:
+            request = heapq.heappop(queue)
+            if not request.done:
+                self.__virtual = max(self.__virtual, request.key[1])
+                self.__grant(request, station, granted)
+
+    def __grant(self, request, station, granted):
+        request.station = station
+        request.done = True
+        self.__in_use[station] += 1
+        self.__granted[station] += 1
+        granted.append(request)
+
+    @staticmethod
+    def __notify(granted):
+        # Outside the lock: a callback may request or release
+        for request in granted:
+            request.callback(request.station)
+
+class AsyncExperiments:
+    """Drives an AsyncServerBase on an asyncio event loop of its own.
+
+    Requests made by a node wait for a station listing its class name in
+    config.yaml (model.station), allocated by a StationAllocator. Requests
+    from other nodes are not limited. The owner given to submit, e.g. a
+    protocol, is the owner of the requests made by the coroutine.
+    """
+
+    def __init__(self, server: AsyncServerBase, stations=None, timeout=None):
+        self.server = server
+        self.timeout = timeout  # seconds per request. None for no limit
+        self.allocator = StationAllocator()
+        self.__owner = contextvars.ContextVar("owner", default=None)
+        self.__loop = None
+        self.__thread = None
+        self.configure(stations or {})
+
+    def configure(self, stations, timeout=None, capacity=None):
+        assert self.__loop is None, "Configure before start"
+        self.allocator.configure(stations, capacity)
+        if timeout is not None:
+            self.timeout = timeout
+
+    def station_of(self, class_name):
+        return self.allocator.station_of(class_name)
+
+    def is_running(self):
+        return self.__loop is not None
+
+    def start(self):
+        if self.__loop is not None:
+            return
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target=self.__loop.run_forever, name="AsyncExperiments", daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        if self.__loop is None:
+            return
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        self.__loop.close()
+        self.__loop = None
+        self.__thread = None
+
+    def submit(self, coro, owner=None):
+        # Returns concurrent.futures.Future. Thread-safe
+        assert self.__loop is not None, "Not started"
+        if owner is not None:
+            coro = self.__owned(owner, coro)
+        return asyncio.run_coroutine_threadsafe(coro, self.__loop)
+
+    async def __owned(self, owner, coro):
+        self.__owner.set(owner)  # In the context of this task only
+        return await coro
+
+    async def request(self, class_name, name, *args):
+        # Fails at once if every station serving the class is disabled, and
+        # after timeout seconds in total, waiting for a station included
+        candidates = self.allocator.candidates(class_name)
+        if len(candidates) > 0 and not any(self.allocator.is_enabled(station) for station in candidates):
+            raise RuntimeError(f"No station enabled for {class_name}: {', '.join(candidates)}")
+
+        loop = asyncio.get_running_loop()
+        deadline = None if self.timeout is None else loop.time() + self.timeout
+        future = loop.create_future()
+
+        def granted(station):
+            # Maybe on another thread, e.g. enabling a station
+            loop.call_soon_threadsafe(resolve, station)
+
+        def resolve(station):
+            if future.cancelled():
+                if station != "":
+                    self.allocator.release(station)
+            else:
+                future.set_result(station)
+
+        request = self.allocator.request(class_name, granted, self.__owner.get())
+        try:
+            station = await asyncio.wait_for(future, self.timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            self.allocator.cancel(request)  # Released by resolve if granted meanwhile
+            raise
+        timeout = None if deadline is None else max(deadline - loop.time(), 0.0)
+        if station == "":
+            return await self.__call(timeout, name, *args)
+        try:
+            return await self.__call(timeout, name, *args)
+        finally:
+            self.allocator.release(station)
+
+    async def __call(self, timeout, name, *args):
+        logger.debug("request %s %s", name, args)
+        return await asyncio.wait_for(getattr(self.server, name)(*args), timeout)
+
+async_experiments = AsyncExperiments(AsyncDummyServer())
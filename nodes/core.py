@@ -0,0 +1,628 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+from collections import deque
+from enum import IntEnum, auto
+import dataclasses
+import itertools
+
+from nodes import entity
+from nodes.stream import Stream, CHUNK
+
+# Qt-free part of the node implementation. The base class given to
+# trait_node_base/ofp_node_base supplies the graph API (NodeGraphQt.BaseNode
+# in the editor, headless.HeadlessBaseNode for batch runs) together with
+# the presentation hooks below:
+#
+#   TEXT_WIDGET_TYPE: widget type for text properties
+#   OBJECT_PORT_PAINTER: painter function for Object ports
+#   update_port_tooltip(port, port_traits)
+#   update_node_tooltip(text)
+
+
+def traits_str(traits):
+    text = str(traits)
+    text = text.replace('typing.', '').replace('nodes.entity.', '')
+    return text
+
+class TraitExpression:
+    """A traits expression, e.g. an io_mapping, compiled once.
+
+    Results are memoized by the traits of the inputs the expression names.
+    """
+
+    FUNCTIONS = {"upper": entity.upper, "first_arg": entity.first_arg}
+    MEMO_MAX = 1024
+
+    def __init__(self, expression):
+        params = entity.get_categories()
+        self.code = compile(expression, "<string>", "eval")
+        self.is_static = all(name in params for name in self.code.co_names)
+        self.names = tuple(name for name in self.code.co_names if name not in params and name not in self.FUNCTIONS)
+        self.__globals = dict(params, **self.FUNCTIONS, __builtins__={})
+        self.__memo = {}  # traits of the names -> traits
+
+    def __call__(self, inputs):
+        key = tuple(inputs.get(name) for name in self.names)
+        try:
+            return self.__memo[key]
+        except KeyError:
+            pass
+        assert all(name in inputs for name in self.names), f"{self.code.co_names} {inputs}"
+        traits = entity.intern(eval(self.code, self.__globals, {name: inputs[name] for name in self.names}))
+        if len(self.__memo) >= self.MEMO_MAX:
+            self.__memo.clear()
+        self.__memo[key] = traits
+        return traits
+
+_expressions = {}  # expression -> TraitExpression
+
+def evaluate_traits(expression, inputs=None):
+    compiled = _expressions.get(expression)
+    if compiled is None:
+        compiled = _expressions[expression] = TraitExpression(expression)
+    return compiled(inputs or {}), compiled.is_static
+
+class NodeStatusEnum(IntEnum):
+    READY = auto()
+    ERROR = auto()
+    WAITING = auto()
+    RUNNING = auto()
+    DONE = auto()
+
+def expand_input_tokens(input_tokens, expandables):
+    if len(expandables) == 0:
+        yield input_tokens
+    else:
+        assert all(token["traits"] != entity.Spread for token in input_tokens.values()), f"Group cannot be bare [{input_tokens}]"
+        max_length = max(len(input_tokens[name]["value"]) for name in expandables)
+        # assert all(not entity.is_acceptable(token["traits"], entity.Object) for (name, token) in input_tokens.items() if name not in expandables), f"Object is not copyable [{input_tokens}]"
+        elements = {name: iter(input_tokens[name]["value"]) for name in expandables}  # Read in order, as Streams are
+        for i in range(max_length):
+            yield {
+                name: (
+                    dict(value=next(elements[name]), traits=token["traits"].__args__[0])
+                    if name in expandables
+                    else dict(value=token["value"], traits=token["traits"])
+                )
+                for (name, token) in input_tokens.items()
+            }
+
+def chunk_input_tokens(input_tokens, expandables, size):
+    # input_tokens with the expanded Spreads cut into lists of up to size elements
+    max_length = max(len(input_tokens[name]["value"]) for name in expandables)
+    elements = {name: iter(input_tokens[name]["value"]) for name in expandables}
+    for i in range(0, max_length, size):
+        yield {
+            name: (
+                dict(value=list(itertools.islice(elements[name], size)), traits=token["traits"])
+                if name in expandables
+                else token
+            )
+            for (name, token) in input_tokens.items()
+        }
+
+class IONode: pass
+
+class PortChanges:
+    # Ports added to or deleted from any node so far, e.g. by a property
+    # like ninputs. A graph rebuilds its ExecutionPlan, which lists the
+    # ports, when the count differs from that of the plan
+    count = 0
+
+def resolve_traits(nodes):
+    # Resolves the output traits of the nodes, and of those upstream first,
+    # with a stack instead of recursion, so that long chains are resolved
+    # at any depth. A resolved node only asks its neighbours upstream
+    stack = [(node, False) for node in nodes]
+    while len(stack) > 0:
+        node, expanded = stack.pop()
+        if node.is_traits_resolved():
+            continue
+        elif expanded:
+            node.resolve_output_traits()
+            continue
+        stack.append((node, True))
+        for another in node.upstream_trait_nodes():
+            if not another.is_traits_resolved():
+                stack.append((another, False))
+
+@dataclasses.dataclass
+class PortTraits:
+    traits: type = entity.Any
+    optional: bool = False
+    expand: bool = False
+
+def trait_node_base(cls):
+    class _TraitNodeBase(cls):
+
+        def __init__(self, *args, **kwargs):
+            super(_TraitNodeBase, self).__init__(*args, **kwargs)
+
+            self.__port_traits = {}
+            self.__io_mapping = {}
+            self.__default_value = {}
+            # Output traits resolved from io_mapping. Valid until a change upstream,
+            # which invalidates the downstream cone (see invalidate_traits)
+            self.__output_traits = {}
+            self.__traits_resolved = False
+
+            self.create_property("message", "", widget_type=self.TEXT_WIDGET_TYPE)
+
+        def get_port_traits_def(self, name):
+            if name in self.__port_traits:
+                return self.__port_traits[name].traits
+            return entity.Any
+
+        def get_input_port_traits(self, name):
+            input_port = self.get_input(name)
+
+            for connected in input_port.connected_ports():
+                another = connected.node()
+                parent_port = getattr(another, "parent_port", None)
+                if parent_port is not None:
+                    # PortInputNode
+                    another_traits = parent_port.node().get_input_port_traits(parent_port.name())
+                    logger.debug(f"get_input_port_traits: {parent_port.node()} {another} {connected} {another_traits}")
+                    return another_traits
+                else:
+                    return another.get_output_port_traits(connected.name())
+            else:
+                if name in self.__default_value:
+                    return self.__default_value[name]["traits"]
+            return self.get_port_traits_def(name)
+
+        def get_output_port_traits(self, name):
+            if name in self.__io_mapping:
+                if not self.__traits_resolved:
+                    resolve_traits((self, ))
+                return self.__output_traits[name]
+            return self.get_port_traits_def(name)
+
+        def is_traits_resolved(self):
+            return self.__traits_resolved
+
+        def resolve_output_traits(self):
+            # Called by resolve_traits once the nodes upstream are resolved
+            output_traits = {}
+            if len(self.__io_mapping) > 0:
+                input_traits = {input.name(): self.get_input_port_traits(input.name()) for input in self.input_ports()}
+                expandables = self.list_expandables(input_traits)
+
+                _input_traits = {
+                    name: traits if name not in expandables else entity.first_arg(traits)
+                    for name, traits in input_traits.items()
+                }
+                for name, expression in self.__io_mapping.items():
+                    port_traits, _ = evaluate_traits(expression, _input_traits)
+                    output_traits[name] = port_traits if len(expandables) == 0 else entity.Spread[port_traits]
+            self.__output_traits = output_traits
+            self.__traits_resolved = True
+
+        def upstream_trait_nodes(self):
+            # Nodes the input traits are given by. A group node for a PortInputNode
+            for port in self.input_ports():
+                for connected in port.connected_ports():
+                    another = connected.node()
+                    parent_port = getattr(another, "parent_port", None)
+                    if parent_port is not None:
+                        another = parent_port.node()
+                    if hasattr(another, "is_traits_resolved"):
+                        yield another
+
+        def invalidate_traits(self):
+            # Unresolves the output traits of this node and of its downstream
+            # cone, into subgraphs through the PortInputNodes of group nodes.
+            # A node left unresolved has its cone unresolved already
+            stack = [self]
+            while len(stack) > 0:
+                node = stack.pop()
+                if not node.__traits_resolved and node is not self:
+                    continue
+                node.__traits_resolved = False
+                node.__output_traits = {}
+                for port in node.output_ports():
+                    for connected in port.connected_ports():
+                        if hasattr(connected.node(), "invalidate_traits"):
+                            stack.append(connected.node())
+                subgraph = node.get_sub_graph() if hasattr(node, "get_sub_graph") else None
+                if subgraph is not None:
+                    for another in subgraph.all_nodes():
+                        if getattr(another, "parent_port", None) is None:
+                            continue
+                        for port in another.output_ports():
+                            for connected in port.connected_ports():
+                                if hasattr(connected.node(), "invalidate_traits"):
+                                    stack.append(connected.node())
+
+        def on_input_connected(self, in_port, out_port):
+            super(_TraitNodeBase, self).on_input_connected(in_port, out_port)
+            self.invalidate_traits()
+
+        def on_input_disconnected(self, in_port, out_port):
+            super(_TraitNodeBase, self).on_input_disconnected(in_port, out_port)
+            self.invalidate_traits()
+
+        def set_port_traits(self, port, port_traits):
+            assert isinstance(port_traits, PortTraits)
+            self.__port_traits[port.name()] = port_traits
+            self.update_port_tooltip(port, port_traits)
+
+        def update_port_traits(self, port, traits):
+            assert issubclass(traits, entity.Entity)
+            params = dataclasses.asdict(self.__port_traits[port.name()])
+            params["traits"] = traits
+            port_traits = PortTraits(**params)
+            self.set_port_traits(port, port_traits)
+            self.invalidate_traits()
+
+        def is_optional_port(self, name):
+            return self.__port_traits[name].optional
+
+        def is_expandable_port(self, name):
+            return self.__port_traits[name].expand
+
+        @property
+        def expandable_ports(self):
+            for name, port_traits in self.__port_traits.items():
+                if port_traits.expand:
+                    yield name
+
+        def add_input(self, name='input', multi_input=False, display_name=True, color=None, locked=False, painter_func=None):
+            traits = self.get_port_traits_def(name)
+            if entity.is_acceptable(traits, entity.Object):
+                multi_input = False
+                painter_func = painter_func or self.OBJECT_PORT_PAINTER
+            elif entity.is_acceptable(traits, entity.Data):
+                multi_input = False
+                color = color or (180, 80, 0)
+            return super(_TraitNodeBase, self).add_input(name, multi_input, display_name, color, locked, painter_func)
+
+        def add_output(self, name='input', multi_output=False, display_name=True, color=None, locked=False, painter_func=None):
+            traits = self.get_port_traits_def(name)
+            if entity.is_acceptable(traits, entity.Object):
+                multi_output = False
+                painter_func = painter_func or self.OBJECT_PORT_PAINTER
+            elif entity.is_acceptable(traits, entity.Data):
+                multi_output = True
+                color = color or (180, 80, 0)
+            return super(_TraitNodeBase, self).add_output(name, multi_output, display_name, color, locked, painter_func)
+
+        def delete_input(self, name):
+            if name in self.__port_traits:
+                del self.__port_traits[name]
+            if name in self.__default_value:
+                del self.__default_value[name]
+            super(_TraitNodeBase, self).delete_input(name)
+            PortChanges.count += 1
+            self.invalidate_traits()
+
+        def delete_output(self, name):
+            if name in self.__port_traits:
+                del self.__port_traits[name]
+            if name in self.__io_mapping:
+                del self.__io_mapping[name]
+            super(_TraitNodeBase, self).delete_output(name)
+            PortChanges.count += 1
+            self.invalidate_traits()
+
+        def set_default_value(self, name, value, traits):
+            assert name in self.__port_traits
+            assert self.__port_traits[name].optional  # check if it's optional
+            assert entity.is_acceptable(traits, self.__port_traits[name].traits)
+            self.__default_value[name] = dict(value=value, traits=traits)
+            self.invalidate_traits()
+
+        @property
+        def default_value(self):
+            return self.__default_value.copy()
+
+        @property
+        def io_mapping(self):
+            return self.__io_mapping.copy()
+
+        @property
+        def message(self):
+            return self.get_proprety('message')
+
+        @message.setter
+        def message(self, text):
+            self.set_property('message', text, push_undo=False)
+            self.update_node_tooltip(text)
+
+        def add_input_w_traits(self, name, traits, *, optional=False, expand=False):
+            if expand:
+                traits = traits | entity.Spread[traits]
+
+            assert not optional or entity.is_acceptable(traits, entity.Data)
+            assert entity.is_acceptable(traits, entity.Data) or entity.is_acceptable(traits, entity.Object)
+
+            port_traits = PortTraits(traits=traits, optional=optional, expand=expand)
+            self.__port_traits[name] = port_traits  # required
+            self.add_input(name)
+            self.set_port_traits(self.get_input(name), port_traits)
+            PortChanges.count += 1
+            self.invalidate_traits()
+
+        def add_output_w_traits(self, name, traits, *, expand=False, expression=None):
+            if expand:
+                traits = traits | entity.Spread[traits]
+                expression = expression or traits_str(traits)
+
+            assert entity.is_acceptable(traits, entity.Data) or entity.is_acceptable(traits, entity.Object)
+
+            if expression is not None:
+                self.__io_mapping[name] = expression
+
+            port_traits = PortTraits(traits=traits, optional=False, expand=expand)
+            self.__port_traits[name] = port_traits  # required
+            self.add_output(name)
+            self.set_port_traits(self.get_output(name), port_traits)
+            PortChanges.count += 1
+            self.invalidate_traits()
+
+        def check(self):
+            is_valid = True
+
+            # if isinstance(node, ObjectOFPNode):
+            #     station = graph.allocate_station(node)
+            #     node.set_property("station", station, push_undo=False)
+            #     is_valid = is_valid and station != ""
+
+            for port in self.input_ports():
+                port_traits_def = self.get_port_traits_def(port.name())
+                connected_ports = port.connected_ports()
+
+                if len(connected_ports) == 0:
+                    if not self.is_optional_port(port.name()):
+                        is_valid = False
+                        error_msg = f"Port [{port.name()}] is disconnected"
+                        break
+                else:
+                    assert len(connected_ports) == 1
+                    port_traits = self.get_input_port_traits(port.name())
+                    if not entity.is_acceptable(port_traits, port_traits_def):
+                        is_valid = False
+                        error_msg = f"Port [{port.name()}] traits mismatches. [{traits_str(port_traits_def)}] expected. [{traits_str(port_traits)}] given"
+                        logger.info(error_msg)
+                        break
+
+            for port in self.output_ports():
+                port_traits_def = self.get_port_traits_def(port.name())
+
+                connected_ports = port.connected_ports()
+                if len(connected_ports) == 0 and not entity.is_acceptable(port_traits_def, entity.Data):
+                    is_valid = False
+                    error_msg = f"Port [{port.name()}] is disconnected"
+                    break
+
+            if not is_valid:
+                self.set_node_status(NodeStatusEnum.ERROR)
+                self.message = error_msg
+            elif self.get_node_status() == NodeStatusEnum.ERROR:
+                self.set_node_status(NodeStatusEnum.READY)
+                self.message = ''
+            return is_valid
+
+        def _execute(self, input_tokens):  #XXX: rename this
+            raise NotImplementedError()
+
+        def list_expandables(self, input_traits):
+            expandables = []
+            for name, traits in input_traits.items():
+                if not entity.is_spread(traits):
+                    continue
+                elif not self.is_expandable_port(name):
+                    continue
+                traits_def = self.get_port_traits_def(name)
+                assert len(traits.__args__) == 1, traits
+                if entity.is_acceptable(traits.__args__[0], traits_def):
+                    expandables.append(name)
+            return tuple(expandables)
+
+        def execute(self, input_tokens, stream=None):
+            # stream: the min length of an expansion returned as Streams, for
+            # PURE nodes. None for lists
+            input_tokens, expandables = self.__prepare(input_tokens)
+
+            if len(expandables) == 0:
+                # no expansion
+                return self._execute(input_tokens)
+            elif stream is not None and self.__is_streamed(input_tokens, expandables, stream):
+                return self.__stream(input_tokens, expandables)
+            elif self._execute_batch is not None and not any(isinstance(input_tokens[name]["value"], Stream) for name in expandables):
+                output_tokens = self._execute_batch(input_tokens, expandables)
+                if output_tokens is not NotImplemented:
+                    return output_tokens
+
+            results = []
+            # updates = {}
+            for _input_tokens in expand_input_tokens(input_tokens, expandables):
+                # _input_tokens.update(updates)
+                _output_tokens = self._execute(_input_tokens)
+                results.append(_output_tokens)
+                # updates = {self.__io_mapping[name]: token for name, token in _output_tokens.items() if name in loop_items}
+            return self.__merge(input_tokens, expandables, results)
+
+        def prepare_execution(self, input_tokens):
+            # Splits execute into the calls of _execute, which may be made
+            # elsewhere, and a function merging their results
+            input_tokens, expandables = self.__prepare(input_tokens)
+            if len(expandables) == 0:
+                return [input_tokens], lambda results: results[0]
+            # Per element, also with _execute_batch: the calls are spread over workers
+            batch = list(expand_input_tokens(input_tokens, expandables))
+            return batch, lambda results: self.__merge(input_tokens, expandables, results)
+
+        _execute_async = None  # Coroutine version of _execute, if any
+
+        # Vectorized version of _execute over the expanded Spreads, if any:
+        # _execute_batch(input_tokens, expandables) -> the merged output tokens,
+        # or NotImplemented for the inputs it cannot take, e.g. ragged arrays,
+        # to fall back to _execute per element
+        _execute_batch = None
+
+        def is_async(self):
+            return self._execute_async is not None
+
+        async def execute_async(self, input_tokens):
+            input_tokens, expandables = self.__prepare(input_tokens)
+
+            if len(expandables) == 0:
+                # no expansion
+                return await self._execute_async(input_tokens)
+
+            results = []
+            for _input_tokens in expand_input_tokens(input_tokens, expandables):
+                _output_tokens = await self._execute_async(_input_tokens)
+                results.append(_output_tokens)
+            return self.__merge(input_tokens, expandables, results)
+
+        def __results(self, input_tokens, expandables):
+            # The results of _execute one by one, computed CHUNK elements at a time with _execute_batch
+            if self._execute_batch is None:
+                yield from map(self._execute, expand_input_tokens(input_tokens, expandables))
+                return
+            for chunk in chunk_input_tokens(input_tokens, expandables, CHUNK):
+                output_tokens = self._execute_batch(chunk, expandables)
+                if output_tokens is NotImplemented:
+                    yield from map(self._execute, expand_input_tokens(chunk, expandables))
+                    continue
+                for i in range(len(chunk[expandables[0]]["value"])):
+                    yield {
+                        name: dict(value=token["value"][i], traits=token["traits"].__args__[0])
+                        for name, token in output_tokens.items()
+                    }
+
+        def __prepare(self, input_tokens):
+            input_tokens = dict(self.__default_value, **input_tokens)
+            expandables = self.list_expandables({name: token["traits"] for name, token in input_tokens.items()})
+            for name, token in input_tokens.items():
+                if name not in expandables and isinstance(token["value"], Stream):
+                    input_tokens[name] = dict(value=list(token["value"]), traits=token["traits"])  # Taken as a whole
+            return input_tokens, expandables
+
+        def __is_streamed(self, input_tokens, expandables, stream):
+            # A long expansion, or one of a Stream, unless an Object passes through (see __merge)
+            length = max(len(input_tokens[name]["value"]) for name in expandables)
+            if length == 0 or any(name not in expandables and entity.is_acceptable(token["traits"], entity.Object) for name, token in input_tokens.items()):
+                return False
+            return length >= stream or any(isinstance(input_tokens[name]["value"], Stream) for name in expandables)
+
+        def __stream(self, input_tokens, expandables):
+            # Streams of the values at each output port, over a Stream of the results
+            length = max(len(input_tokens[name]["value"]) for name in expandables)
+            results = Stream(lambda: self.__results(input_tokens, expandables), length, origin=self)
+            first = next(iter(results))  # Executed at once, for the traits
+            output_tokens = {}
+            for output_port in self.output_ports():
+                name = output_port.name()
+                output_tokens[name] = {
+                    "value": Stream(lambda name=name: (result[name]["value"] for result in results), length, origin=self, inputs=(input_tokens, name)),
+                    "traits": entity.Spread[first[name]["traits"]]
+                }
+            return output_tokens
+
+        def __merge(self, input_tokens, expandables, results):
+            loop_items = [name for name, token in input_tokens.items() if name not in expandables and entity.is_acceptable(token["traits"], entity.Object)]
+
+            output_tokens = {}
+            for output_port in self.output_ports():
+                name = output_port.name()
+                if name in loop_items:
+                    output_tokens[name] = {
+                        "value": results[-1][name]["value"],
+                        "traits": results[-1][name]["traits"]
+                    }
+                else:
+                    output_tokens[name] = {
+                        "value": [result[name]["value"] for result in results],
+                        "traits": entity.Spread[results[0][name]["traits"]]
+                    }
+            return output_tokens
+
+    return _TraitNodeBase
+
+def ofp_node_base(cls):
+    class _OFPNodeBase(trait_node_base(cls)):
+
+        CONCURRENCY = 1  # Max executions at a time in a thread pool. 0 to execute on the scheduler thread
+        PURE = False  # _execute reads nothing but the input tokens. It may run in a worker process
+        DETERMINISTIC = True  # A PURE node gives the same outputs for the same inputs, which may then be reused. False for e.g. random numbers
+
+        def __init__(self):
+            super(_OFPNodeBase, self).__init__()
+
+            self.create_property('status', NodeStatusEnum.ERROR)
+
+            self._input_queue = deque()
+            self.output_queue = deque()
+            self._num_executing = 0
+
+        def update_color(self):
+            logger.debug("update_color %s", self)
+
+            value = self.get_node_status()
+            if value == NodeStatusEnum.READY:
+                self.set_color(13, 18, 23)
+            elif value == NodeStatusEnum.ERROR:
+                self.set_color(63, 18, 23)
+            elif value == NodeStatusEnum.WAITING:
+                self.set_color(63, 68, 73)
+            elif value == NodeStatusEnum.RUNNING:
+                self.set_color(13, 18, 73)
+            elif value == NodeStatusEnum.DONE:
+                self.set_color(13, 68, 23)
+            else:
+                assert False, "Never reach here {}".format(value)
+
+        def get_node_status(self):
+            return NodeStatusEnum(self.get_property('status'))
+
+        def set_node_status(self, newstatus):
+            logger.debug(f"set_node_status {repr(newstatus)}")
+            self.set_property('status', newstatus.value, push_undo=False)
+
+        def run(self, input_tokens):
+            self._input_queue.append(input_tokens)
+            if self.get_node_status() != NodeStatusEnum.RUNNING:
+                self.set_node_status(NodeStatusEnum.RUNNING)
+
+        def reset(self):
+            self._input_queue.clear()
+            self.output_queue.clear()
+            self._num_executing = 0
+
+        def start_execution(self):
+            # execute() may then be called on another thread. It must not set properties
+            assert self.get_node_status() == NodeStatusEnum.RUNNING
+            assert len(self._input_queue) > 0
+            self._num_executing += 1
+            return self._input_queue.popleft()
+
+        def finish_execution(self, output_tokens):
+            self._num_executing -= 1
+            self.output_queue.append(output_tokens)
+
+            if len(self._input_queue) == 0 and self._num_executing == 0:
+                self.set_node_status(NodeStatusEnum.DONE)
+
+        def update_node_status(self, **kwargs):
+            # kwargs: options of execute, e.g. stream
+            current_status = self.get_node_status()
+            if current_status == NodeStatusEnum.RUNNING:
+                output_tokens = self.execute(self.start_execution(), **kwargs)
+                # try:
+                #     output_tokens = self.execute(self._input_queue.popleft())
+                # except:
+                #     self.set_node_status(NodeStatusEnum.ERROR)
+
+                self.finish_execution(output_tokens)
+
+        def _execute(self, input_tokens):
+            raise NotImplementedError()
+
+    return _OFPNodeBase
@@ -10,6 +10,7 @@ import typing
 import importlib
 import itertools
 import functools
+import threading
 
 
 class _EntityMeta(type):
@@ -37,33 +38,57 @@ def is_category(cls):
             return True
     return False
 
+# Subtype lattice of the Entity classes. Every class gets a bit, and its
+# ancestors are the bits of the Entity classes in its MRO, so that a
+# subclass test is a mask. Classes are added on first use.
+
+_bits = {}  # Entity class -> bit
+_ancestors = {}  # Entity class -> bits of its Entity superclasses, itself included
+_lattice_lock = threading.Lock()
+
+def _ancestors_of(cls):
+    mask = _ancestors.get(cls)
+    if mask is None:
+        with _lattice_lock:
+            mask = 0
+            for base in cls.__mro__:
+                if isinstance(base, _EntityMeta):
+                    if base not in _bits:
+                        _bits[base] = 1 << len(_bits)
+                    mask |= _bits[base]
+            _ancestors[cls] = mask
+    return mask
+
+def is_subclass(one, another):
+    # issubclass over Entity classes
+    _ancestors_of(another)
+    return _ancestors_of(one) & _bits[another] != 0
+
 def _is_acceptable(one, another):
     # print(f"_is_acceptable: {one}, {another}")
     assert inspect.isclass(another)
     if inspect.isclass(one):
         assert issubclass(one, Entity)
-        return issubclass(one, another)
+        return is_subclass(one, another)
     elif is_union(one):
         return all(_is_acceptable(x, another) for x in one.__args__)
     elif isinstance(one, typing._GenericAlias):
         assert inspect.isclass(one.__origin__) and issubclass(one.__origin__, Entity), f"{one}"
 
         #XXX:
-        if issubclass(one.__origin__, Spread) and another in (Object, Data):
+        if is_subclass(one.__origin__, Spread) and another in (Object, Data):
             assert len(one.__args__) == 1
             return _is_acceptable(one.__args__[0], another)
 
-        return issubclass(one.__origin__, another)
+        return is_subclass(one.__origin__, another)
     else:
         assert False, f"Never reach here [{type(one)}]"
 
-def is_acceptable(one, another):
-    # print(f"is_acceptable: {one}, {another}")
+def _check_acceptable(one, another):
     if inspect.isclass(another):
         assert issubclass(another, Entity)
         return _is_acceptable(one, another)
     elif is_union(another):
-        # return any(_is_acceptable(one, x) for x in another.__args__)
         return any(is_acceptable(one, x) for x in another.__args__)
     elif isinstance(another, typing._GenericAlias):
         return (
@@ -75,6 +100,35 @@ def is_acceptable(one, another):
     else:
         assert False, f"Never reach here: {another} ({type(another)})"
 
+# Results of is_acceptable by the identities of the traits. An entry keeps
+# its traits alive, so that their ids are not reused meanwhile. Equal
+# traits built apart, e.g. unions, share entries through intern().
+_acceptable = {}  # (id(one), id(another)) -> (one, another, result)
+_ACCEPTABLE_MAX = 1 << 16
+
+def is_acceptable(one, another):
+    entry = _acceptable.get((id(one), id(another)))
+    if entry is not None and entry[0] is one and entry[1] is another:
+        return entry[2]
+    result = _check_acceptable(one, another)
+    if len(_acceptable) >= _ACCEPTABLE_MAX:
+        _acceptable.clear()
+    _acceptable[(id(one), id(another))] = (one, another, result)
+    return result
+
+@functools.lru_cache(maxsize=1 << 12)
+def _interned(cls, traits, args):
+    return traits  # The equal traits seen first, while they are among the recently used
+
+def intern(traits):
+    # The canonical object of traits equal to the given ones. Unions equal
+    # but in another order are kept apart, as they are shown as written.
+    # Traits evicted meanwhile only miss the identity caches above
+    try:
+        return _interned(type(traits), traits, getattr(traits, "__args__", None))
+    except TypeError:
+        return traits  # Unhashable
+
 class Any(Entity): pass
 
 class Object(Entity): pass
@@ -136,50 +190,97 @@ def is_spread(x):
 def is_array(x):
     return isinstance(x, typing._GenericAlias) and x.__origin__ == Array
 
-#TODO: Only numbers are supported.
+# Numeric lattice. A numeric trait is a scalar of _SCALARS, a chain
+# (Boolean < Integer < Float), in Array and Spread at any depth. Their
+# least upper bounds are precomputed over _PRIMITIVES, and memoized for
+# deeper nestings once met, so that a join is a lookup.
+#
+# Boolean joins below Integer as numpy promotes bool to int, e.g.
+# upper(Boolean, Integer) is Integer, and Spread of Spread joins as well.
+# upper used to take Integer and Float in at most Spread[Array[...]], and
+# failed on the others. The ports of the builtins take Real, so Boolean is
+# joined only by expressions of nodes declared in config.yaml.
+
+_SCALARS = (Boolean, Integer, Float)
+_PRIMITIVES = tuple(
+    wrap(scalar)
+    for wrap in (lambda x: x, lambda x: Array[x], lambda x: Spread[x], lambda x: Spread[Array[x]])
+    for scalar in _SCALARS
+)
+# The primitives abstract traits, e.g. Real or Array, expand to
 _POSSIBLE_TRAITS = (Integer, Float, Array[Integer], Array[Float], Spread[Integer], Spread[Float], Spread[Array[Integer]], Spread[Array[Float]])
 
-def primitive_upper(x, y):
-    assert x in _POSSIBLE_TRAITS, x
-    assert y in _POSSIBLE_TRAITS, y
+def is_numeric(x):
+    while (is_spread(x) or is_array(x)) and len(x.__args__) == 1:
+        x = x.__args__[0]
+    return any(x is scalar for scalar in _SCALARS)
 
+def _join(x, y):
     if is_spread(x) or is_spread(y):
         return Spread[primitive_upper(x.__args__[0] if is_spread(x) else x, y.__args__[0] if is_spread(y) else y)]
     elif is_array(x) or is_array(y):
         return Array[primitive_upper(x.__args__[0] if is_array(x) else x, y.__args__[0] if is_array(y) else y)]
-    elif x == Float or y == Float:
-        return Float
-    else:
-        assert x == Integer, x
-        assert y == Integer, y
-        return Integer
+    return x if _SCALARS.index(x) >= _SCALARS.index(y) else y
+
+_joins = {}  # (x, y) -> the least upper bound of numeric traits
+
+def primitive_upper(x, y):
+    try:
+        return _joins[(x, y)]
+    except KeyError:
+        pass
+    assert is_numeric(x), x
+    assert is_numeric(y), y
+    z = _joins[(x, y)] = _joins[(y, x)] = intern(_join(x, y))
+    return z
+
+for _x, _y in itertools.product(_PRIMITIVES, repeat=2):
+    primitive_upper(_x, _y)
+
+_primitives = {}  # traits -> the numeric traits they accept
 
 def expand_to_primitives(x):
-    a = tuple(y for y in _POSSIBLE_TRAITS if is_acceptable(y, x))
-    assert len(a) > 0, x
+    a = _primitives.get(x)
+    if a is None:
+        if is_numeric(x):
+            a = (x, )
+        else:
+            a = tuple(y for y in _POSSIBLE_TRAITS if is_acceptable(y, x))
+        assert len(a) > 0, x
+        _primitives[x] = a
     return a
 
 def _upper(x, y):
     assert isinstance(x, tuple)
     assert isinstance(y, tuple)
-    a = tuple(set(primitive_upper(x_, y_) for x_, y_ in itertools.product(x, y)))
+    a = tuple(dict.fromkeys(primitive_upper(x_, y_) for x_, y_ in itertools.product(x, y)))
     assert len(a) > 0, f"upper: {x}, {y}"
-    # print(f"upper: {x}, {y}, {a} ({len(a)})")
     return a
 
+_uppers = {}  # traits -> upper(*traits)
+
 def upper(*traits):
     assert len(traits) > 0
-    a = tuple(functools.reduce(_upper, (expand_to_primitives(x) for x in traits)))
-    if len(a) == 1:
-        return a[0]
-    return typing.Union[a]
+    z = _uppers.get(traits)
+    if z is None:
+        a = tuple(functools.reduce(_upper, (expand_to_primitives(x) for x in traits)))
+        z = a[0] if len(a) == 1 else intern(typing.Union[a])
+        if len(_uppers) >= _ACCEPTABLE_MAX:
+            _uppers.clear()
+        _uppers[traits] = z
+    return z
+
+_categories = None  # The members of this module, which do not change once imported
 
 def get_categories():
-    return {
-        key: value
-        for key, value in inspect.getmembers(importlib.import_module(__name__))
-        if is_category(value)
-    }
+    global _categories
+    if _categories is None:
+        _categories = {
+            key: value
+            for key, value in inspect.getmembers(importlib.import_module(__name__))
+            if is_category(value)
+        }
+    return dict(_categories)
 
 if __name__ == "__main__":
     assert is_acceptable(Array, Any)
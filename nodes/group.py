@@ -18,6 +18,8 @@ logger = getLogger(__name__)
 
 class OFPGroupNode(ofp_node_base(GroupNode)):
 
+    CONCURRENCY = 0
+
     def __init__(self):
         super(OFPGroupNode, self).__init__()
 
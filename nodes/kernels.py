@@ -0,0 +1,835 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+import functools
+import uuid
+
+import numpy
+
+from nodes.core import NodeStatusEnum, IONode, traits_str, evaluate_traits
+from nodes import entity
+from nodes.control import experiments, async_experiments
+
+# Qt-free ports and _execute of the builtin nodes. Widgets are added by the
+# editor classes in nodes.builtins and nodes.manipulate, which mix these in
+# (e.g. RangeNode(RangeKernel, BuiltinNode)). headless mixes the same kernels
+# into HeadlessNode.
+#
+# Arrays in the input tokens are read-only, as they are shared with the
+# other nodes reading them. _execute returns new arrays, e.g. a + b rather
+# than a += b, or modifies a copy.
+
+
+class BuiltinKernel:
+
+    def _execute(self, input_tokens):
+        raise NotImplementedError("Override this")
+
+    def pure_function(self):
+        # _execute of a PURE kernel as a picklable function of the input tokens
+        assert self.PURE
+        for cls in type(self).__mro__:
+            if '_execute' in vars(cls):
+                return functools.partial(cls._execute, None)
+
+    async def _request(self, name, *args):
+        # Calls the AsyncServerBase once a station serving this node is allocated
+        return await async_experiments.request(self.__class__.__name__, name, *args)
+
+# Vectorized expansion: a Spread of numbers or equal-length arrays is
+# stacked into one array along a new first axis, and a kernel with
+# _execute_batch computes all the elements in a single numpy call.
+# Anything else (ragged, non-numeric, empty) goes back to _execute per element.
+
+def spread_length(input_tokens, expandables):
+    # The number of elements, or None unless every Spread has as many
+    length = len(input_tokens[expandables[0]]["value"])
+    if length == 0 or any(len(input_tokens[name]["value"]) != length for name in expandables):
+        return None
+    return length
+
+def element_traits(input_tokens, expandables, name):
+    traits = input_tokens[name]["traits"]
+    return traits.__args__[0] if name in expandables else traits
+
+INT_BOUND = 1 << 31  # Python ints below it are added, subtracted and multiplied within int64
+
+def is_scalar(value):
+    # A Python number, which numpy casts to the type of the other operand (NEP 50)
+    return type(value) in (int, float)
+
+def stack(values):
+    # A numeric array of the values, or None. Mixed types are not upcast,
+    # e.g. 1 + 1 is an int in a Spread of ints and floats. Python ints
+    # which might overflow int64, unlike in _execute, are not stacked either
+    if isinstance(values, list):
+        types = set(value.dtype if isinstance(value, numpy.ndarray) else type(value) for value in values)
+        if len(types) > 1:
+            return None
+        elif int in types and any(abs(value) >= INT_BOUND for value in values):
+            return None
+    try:
+        array = numpy.asarray(values)
+    except ValueError:
+        return None  # Ragged
+    return array if array.dtype.kind in "iuf" else None
+
+def operand(value):
+    # value not expanded, as it is, or None unless numeric
+    if is_scalar(value):
+        return value if type(value) is float or abs(value) < INT_BOUND else None
+    elif isinstance(value, (numpy.ndarray, numpy.generic)) and value.dtype.kind in "iuf":
+        return value
+    return None
+
+def elementwise(ufunc, input_tokens, expandables, names=("a", "b")):
+    # ufunc over the elements, as _execute would compute them one by one
+    if spread_length(input_tokens, expandables) is None:
+        return NotImplemented
+    args, first = [], []  # first: the operands of the first element
+    for name in names:
+        value = input_tokens[name]["value"]
+        expanded = name in expandables
+        array = stack(value) if expanded else operand(value)
+        if array is None:
+            return NotImplemented
+        args.append((array, expanded))
+        first.append(value[0] if expanded else value)
+    ndim = max(array.ndim - 1 if expanded else numpy.ndim(array) for array, expanded in args)
+    # The axes of an element are aligned to the right with those of the others
+    args = [
+        array.reshape(array.shape[: 1] + (1, ) * (ndim + 1 - array.ndim) + array.shape[1: ]) if expanded else array
+        for array, expanded in args
+    ]
+    if numpy.result_type(*args) != numpy.result_type(*first):
+        return NotImplemented  # Stacked Python numbers are no longer cast to the type of the other operand
+    value = ufunc(*args)
+    traits = entity.upper(*(element_traits(input_tokens, expandables, name) for name in names))
+    # Python numbers give Python numbers, numpy scalars numpy scalars
+    value = value.tolist() if value.ndim == 1 and all(is_scalar(x) for x in first) else list(value)
+    return {"value": {"value": value, "traits": entity.Spread[traits]}}
+
+def input_kernel_base(base, items):
+    assert all(entity.is_acceptable(traits, base) for traits in items.values())
+
+    class _InputKernelBase(BuiltinKernel, IONode):
+
+        OUTPUT_PORT_NAME = "value"
+        BASE_ENTITY_TYPE = base
+        ENTITY_TYPES = dict(items, **{'': base})
+
+        def __init__(self):
+            super(_InputKernelBase, self).__init__()
+
+            assert all(entity.is_acceptable(traits, self.BASE_ENTITY_TYPE) for traits in self.ENTITY_TYPES.values()), f"{self.BASE_ENTITY_TYPE} {self.ENTITY_TYPES}"
+
+            self.add_output_w_traits(self.OUTPUT_PORT_NAME, base)
+
+        def set_property(self, name, value, push_undo=True):
+            # logger.info(f"set_property: {self}, {value} {push_undo}")
+            if name == self.OUTPUT_PORT_NAME:
+                traits = self.ENTITY_TYPES.get(value, self.BASE_ENTITY_TYPE)
+                self.update_port_traits(self.get_output(self.OUTPUT_PORT_NAME), traits)
+            super(_InputKernelBase, self).set_property(name, value, push_undo)
+
+    return _InputKernelBase
+
+class GroupKernel(BuiltinKernel):
+
+    def __init__(self):
+        super(GroupKernel, self).__init__()
+
+        self.add_input_w_traits("in1", entity.Data)
+        self.add_output_w_traits("value", entity.Spread[entity.Data], expression="Spread[in1]")
+
+    def check(self):
+        logger.debug("GroupNode: check")
+        if not super(GroupKernel, self).check():
+            return False
+
+        traits = self.get_input_port_traits('in1')
+        for i in range(1, len(self.input_ports())):
+            another_traits = self.get_input_port_traits(f'in{i+1}')
+            if another_traits != traits:
+                self.set_node_status(NodeStatusEnum.ERROR)
+                self.message = f"Port [in{i+1}] has wrong traits [{traits_str(another_traits)}]. [{traits_str(traits)}] expected"
+                return False
+        return True
+
+    def _execute(self, input_tokens):
+        ninputs = int(self.get_property("ninputs"))
+        value = [input_tokens[f"in{i+1}"]["value"] for i in range(ninputs)]
+        traits = input_tokens["in1"]["traits"]  # The first element
+        return {"value": {"value": value, "traits": entity.Spread[traits]}}
+
+    def on_value_changed(self, *args, **kwargs):
+        n = int(args[0])
+        nports = len(self.input_ports())
+        if n > nports:
+            for i in range(nports, n):
+                self.add_input_w_traits(f"in{i+1}", entity.Data)
+        elif n < nports:
+            for i in range(nports, n, -1):
+                name = f"in{i}"
+                port = self.get_input(name)
+                for another in port.connected_ports():
+                    port.disconnect_from(another)
+                self.delete_input(name)
+
+class AsArrayKernel(BuiltinKernel):
+
+    PURE = True
+
+    def __init__(self):
+        super(AsArrayKernel, self).__init__()
+
+        self.add_input_w_traits("in1", entity.Spread[entity.Data], expand=True)
+        self.add_output_w_traits("out1", entity.Array[entity.Data], expand=True, expression="first_arg(in1)")
+
+    def _execute(self, input_tokens):
+        # print(input_tokens["in1"]["traits"])
+        # print(entity.first_arg(input_tokens["in1"]["traits"]))
+        # print(entity.Array[entity.first_arg(input_tokens["in1"]["traits"])])
+        traits = entity.Array[entity.first_arg(input_tokens["in1"]["traits"])]
+        return {"out1": {"value": numpy.asarray(input_tokens["in1"]["value"]), "traits": traits}}
+
+class GroupObjectKernel(BuiltinKernel):
+
+    def __init__(self):
+        super(GroupObjectKernel, self).__init__()
+
+        self.add_input_w_traits("in1", entity.Object)
+        self.add_output_w_traits("value", entity.Spread[entity.Object], expression="Spread[in1]")
+
+    def check(self):
+        if not super(GroupObjectKernel, self).check():
+            return False
+
+        traits = self.get_input_port_traits('in1')
+        for i in range(1, len(self.input_ports())):
+            another_traits = self.get_input_port_traits(f'in{i+1}')
+            if another_traits != traits:
+                self.set_node_status(NodeStatusEnum.ERROR)
+                self.message = f"Port [in{i+1}] has wrong traits [{traits_str(another_traits)}]. [{traits_str(traits)}] expected"
+                return False
+        return True
+
+    def _execute(self, input_tokens):
+        ninputs = int(self.get_property("ninputs"))
+        value = [input_tokens[f"in{i+1}"]["value"] for i in range(ninputs)]
+        traits = input_tokens["in1"]["traits"]  # The first element
+        return {"value": {"value": value, "traits": entity.Spread[traits]}}
+
+    def on_value_changed(self, *args, **kwargs):
+        n = int(args[0])
+        nports = len(self.input_ports())
+        if n == nports:
+            return
+        elif n > nports:
+            for i in range(nports, n):
+                self.add_input_w_traits(f"in{i+1}", entity.Object)
+        elif n < nports:
+            for i in range(nports, n, -1):
+                name = f"in{i}"
+                port = self.get_input(name)
+                for another in port.connected_ports():
+                    port.disconnect_from(another)
+                self.delete_input(name)
+        self.check()
+
+class IntegerKernel(BuiltinKernel):
+
+    def __init__(self):
+        super(IntegerKernel, self).__init__()
+
+        self.add_output_w_traits("value", entity.Integer)
+        # self.create_property("out1", "0", widget_type=NodePropWidgetEnum.QLINE_EDIT.value)
+
+    def _execute(self, input_tokens):
+        return {"value": {"value": int(self.get_property("value")), "traits": entity.Integer}}
+
+class FloatKernel(BuiltinKernel):
+
+    def __init__(self):
+        super(FloatKernel, self).__init__()
+
+        self.add_output_w_traits("value", entity.Float)
+        # self.create_property("out1", "0", widget_type=NodePropWidgetEnum.QLINE_EDIT.value)
+
+    def _execute(self, input_tokens):
+        return {"value": {"value": float(self.get_property("value")), "traits": entity.Float}}
+
+class LiquidClassKernel(BuiltinKernel):  # IONode
+
+    def __init__(self):
+        super(LiquidClassKernel, self).__init__()
+
+        self.add_output_w_traits("value", entity.LiquidClass)
+
+    def _execute(self, input_tokens):
+        return {"value": {"value": self.get_property("value"), "traits": entity.LiquidClass}}
+
+class FullKernel(BuiltinKernel):
+
+    PURE = True
+
+    def __init__(self):
+        super(FullKernel, self).__init__()
+        self.add_input_w_traits("size", entity.Integer, expand=True)
+        self.add_input_w_traits("fill_value", entity.Real, optional=True, expand=True)
+        self.add_output_w_traits("value", entity.Array[entity.Real], expand=True, expression="Array[fill_value]")
+
+        self.set_default_value("fill_value", 0.0, entity.Float)
+
+    def _execute(self, input_tokens):
+        fill_value = input_tokens["fill_value"]["value"]
+        size = input_tokens["size"]["value"]
+        return {"value": {"value": numpy.full(size, fill_value, dtype=type(fill_value)), "traits": entity.Array[input_tokens["fill_value"]["traits"]]}}
+
+    def _execute_batch(self, input_tokens, expandables):
+        length = spread_length(input_tokens, expandables)
+        if length is None:
+            return NotImplemented
+        sizes, fill_values = (
+            input_tokens[name]["value"] if name in expandables else [input_tokens[name]["value"]] * length
+            for name in ("size", "fill_value"))
+        dtypes = set(type(fill_value) for fill_value in fill_values)
+        if len(dtypes) != 1:
+            return NotImplemented
+        # Filled at once, and split into the arrays of each size
+        values = numpy.repeat(numpy.asarray(fill_values, dtype=dtypes.pop()), sizes)
+        traits = entity.Array[element_traits(input_tokens, expandables, "fill_value")]
+        return {"value": {"value": numpy.split(values, numpy.cumsum(sizes)[: -1]), "traits": entity.Spread[traits]}}
+
+class RangeKernel(BuiltinKernel):
+
+    PURE = True
+
+    def __init__(self):
+        super(RangeKernel, self).__init__()
+        self.add_input_w_traits("start", entity.Real, optional=True, expand=True)
+        self.add_input_w_traits("stop", entity.Real, expand=True)
+        self.add_input_w_traits("step", entity.Real, optional=True, expand=True)
+        self.add_output_w_traits("value", entity.Array[entity.Real], expand=True, expression="Array[upper(start, stop, step)]")
+
+        self.set_default_value("start", 0, entity.Integer)
+        self.set_default_value("step", 1, entity.Integer)
+
+    def _execute(self, input_tokens):
+        start = input_tokens["start"]["value"]
+        stop = input_tokens["stop"]["value"]
+        step = input_tokens["step"]["value"]
+        traits = entity.upper(input_tokens["start"]["traits"], input_tokens["stop"]["traits"], input_tokens["step"]["traits"])
+        return {"value": {"value": numpy.arange(start, stop, step), "traits": entity.Array[traits]}}
+
+class LinspaceKernel(BuiltinKernel):
+
+    PURE = True
+
+    def __init__(self):
+        super(LinspaceKernel, self).__init__()
+        self.add_input_w_traits("start", entity.Real, optional=True, expand=True)
+        self.add_input_w_traits("stop", entity.Real, optional=True, expand=True)
+        self.add_input_w_traits("num", entity.Integer, expand=True)
+        self.add_output_w_traits("value", entity.Array[entity.Float], expand=True, expression="Array[Float]")
+
+        self.set_default_value("start", 0, entity.Float)
+        self.set_default_value("stop", 1, entity.Float)
+
+    def _execute(self, input_tokens):
+        start = input_tokens["start"]["value"]
+        stop = input_tokens["stop"]["value"]
+        num = input_tokens["num"]["value"]
+        return {"value": {"value": numpy.linspace(start, stop, num, dtype=numpy.float64), "traits": entity.Array[entity.Float]}}
+
+class RandomUniformKernel(BuiltinKernel):
+
+    PURE = True
+    DETERMINISTIC = False  # Never reused from a cache
+
+    def __init__(self):
+        super(RandomUniformKernel, self).__init__()
+        self.add_input_w_traits("low", entity.Real | entity.Array[entity.Real], optional=True, expand=True)
+        self.add_input_w_traits("high", entity.Real | entity.Array[entity.Real], optional=True, expand=True)
+        self.add_input_w_traits("size", entity.Integer, expand=True)
+        self.add_output_w_traits("value", entity.Array[entity.Float], expand=True, expression="Array[Float]")
+
+        self.set_default_value("low", 0.0, entity.Float)
+        self.set_default_value("high", 1.0, entity.Float)
+
+    def _execute(self, input_tokens):
+        low = input_tokens["high"]["value"]
+        high = input_tokens["low"]["value"]
+        size = input_tokens["size"]["value"]
+        return {"value": {"value": numpy.random.uniform(low, high, size), "traits": entity.Array[entity.Float]}}
+
+class RepeatKernel(BuiltinKernel):
+
+    PURE = True
+
+    def __init__(self):
+        super(RepeatKernel, self).__init__()
+        self.add_input_w_traits("a", entity.Array, expand=True)
+        self.add_input_w_traits("repeats", entity.Integer, expand=True)
+        self.add_output_w_traits("value", entity.Array, expand=True, expression="a")
+
+    def _execute(self, input_tokens):
+        a = input_tokens["a"]["value"]
+        repeats = input_tokens["repeats"]["value"]
+        return {"value": {"value": numpy.repeat(a, repeats), "traits": input_tokens["a"]["traits"]}}
+
+class TileKernel(BuiltinKernel):
+
+    PURE = True
+
+    def __init__(self):
+        super(TileKernel, self).__init__()
+        self.add_input_w_traits("a", entity.Array, expand=True)
+        self.add_input_w_traits("reps", entity.Integer, expand=True)
+        self.add_output_w_traits("value", entity.Array, expand=True, expression="a")
+
+    def _execute(self, input_tokens):
+        a = input_tokens["a"]["value"]
+        reps = input_tokens["reps"]["value"]
+        return {"value": {"value": numpy.tile(a, reps), "traits": input_tokens["a"]["traits"]}}
+
+class SliceKernel(BuiltinKernel):
+
+    PURE = True
+
+    def __init__(self):
+        super(SliceKernel, self).__init__()
+        self.add_input_w_traits("a", entity.Array, expand=True)
+        self.add_output_w_traits("value", entity.Array, expand=True, expression="a")
+
+        self.add_input_w_traits("start", entity.Integer, optional=True, expand=True)
+        self.add_input_w_traits("stop", entity.Integer, optional=True, expand=True)
+        self.add_input_w_traits("step", entity.Integer, optional=True, expand=True)
+
+    def _execute(self, input_tokens):
+        a = input_tokens["a"]["value"]
+        start = input_tokens["start"]["value"] if "start" in input_tokens else None
+        stop = input_tokens["stop"]["value"] if "stop" in input_tokens else None
+        step = input_tokens["step"]["value"] if "step" in input_tokens else None
+        value = a[slice(start, stop, step)]  # A view. Tokens are read-only
+        return {"value": {"value": value, "traits": input_tokens["a"]["traits"]}}
+
+class SumKernel(BuiltinKernel):
+
+    PURE = True
+
+    def __init__(self):
+        super(SumKernel, self).__init__()
+        self.add_input_w_traits("a", entity.Array[entity.Real], expand=True)
+        self.add_output_w_traits("value", entity.Real, expand=True, expression="first_arg(a)")
+
+    def _execute(self, input_tokens):
+        a = input_tokens["a"]["value"]
+        return {"value": {"value": numpy.sum(a), "traits": entity.first_arg(input_tokens["a"]["traits"])}}
+
+    def _execute_batch(self, input_tokens, expandables):
+        if spread_length(input_tokens, expandables) is None:
+            return NotImplemented
+        a = input_tokens["a"]["value"]
+        array = stack(a)
+        if array is not None and array.ndim == 2:
+            value = array.sum(axis=1)
+        elif all(isinstance(x, numpy.ndarray) and x.ndim == 1 and x.size > 0 and x.dtype == a[0].dtype for x in a) and a[0].dtype.kind in "iu":
+            # Ragged integers: sums of the segments of one array. Floats are
+            # summed one by one, in the same order as numpy.sum
+            value = numpy.add.reduceat(numpy.concatenate(a), numpy.cumsum([0] + [x.size for x in a[: -1]]))
+        else:
+            return NotImplemented
+        traits = entity.first_arg(input_tokens["a"]["traits"].__args__[0])
+        return {"value": {"value": list(value), "traits": entity.Spread[traits]}}
+
+class LengthKernel(BuiltinKernel):
+
+    PURE = True
+
+    def __init__(self):
+        super(LengthKernel, self).__init__()
+        self.add_input_w_traits("a", entity.Array, expand=True)
+        self.add_output_w_traits("value", entity.Integer, expand=True, expression="Integer")  # why an expression is needed here?
+
+    def _execute(self, input_tokens):
+        a = input_tokens["a"]["value"]
+        return {"value": {"value": len(a), "traits": entity.Integer}}
+
+class AddKernel(BuiltinKernel):
+
+    PURE = True
+
+    def __init__(self):
+        super(AddKernel, self).__init__()
+        self.add_input_w_traits("a", entity.Array[entity.Real] | entity.Real, expand=True)
+        self.add_input_w_traits("b", entity.Array[entity.Real] | entity.Real, expand=True)
+        self.add_output_w_traits("value", entity.Array[entity.Real] | entity.Real, expand=True, expression="upper(a, b)")
+
+    def _execute(self, input_tokens):
+        a = input_tokens["a"]["value"]
+        b = input_tokens["b"]["value"]
+        traits = entity.upper(input_tokens["a"]["traits"], input_tokens["b"]["traits"])
+        return {"value": {"value": a + b, "traits": traits}}
+
+    def _execute_batch(self, input_tokens, expandables):
+        return elementwise(numpy.add, input_tokens, expandables)
+
+class SubKernel(BuiltinKernel):
+
+    PURE = True
+
+    def __init__(self):
+        super(SubKernel, self).__init__()
+        self.add_input_w_traits("a", entity.Array | entity.Real, expand=True)
+        self.add_input_w_traits("b", entity.Array | entity.Real, expand=True)
+        self.add_output_w_traits("value", entity.Array | entity.Real, expand=True, expression="upper(a, b)")
+
+    def _execute(self, input_tokens):
+        a = input_tokens["a"]["value"]
+        b = input_tokens["b"]["value"]
+        traits = entity.upper(input_tokens["a"]["traits"], input_tokens["b"]["traits"])
+        return {"value": {"value": a - b, "traits": traits}}
+
+    def _execute_batch(self, input_tokens, expandables):
+        return elementwise(numpy.subtract, input_tokens, expandables)
+
+class MulKernel(BuiltinKernel):
+
+    PURE = True
+
+    def __init__(self):
+        super(MulKernel, self).__init__()
+        self.add_input_w_traits("a", entity.Array | entity.Real, expand=True)
+        self.add_input_w_traits("b", entity.Array | entity.Real, expand=True)
+        self.add_output_w_traits("value", entity.Array | entity.Real, expand=True, expression="upper(a, b)")
+
+    def _execute(self, input_tokens):
+        a = input_tokens["a"]["value"]
+        b = input_tokens["b"]["value"]
+        traits = entity.upper(input_tokens["a"]["traits"], input_tokens["b"]["traits"])
+        return {"value": {"value": a * b, "traits": traits}}
+
+    def _execute_batch(self, input_tokens, expandables):
+        return elementwise(numpy.multiply, input_tokens, expandables)
+
+class DisplayKernel(BuiltinKernel):
+
+    CONCURRENCY = 0  # Shows the token in a widget
+
+    def __init__(self):
+        super(DisplayKernel, self).__init__()
+        self.add_input_w_traits("in1", entity.Data)
+        self.create_property("in1", "", widget_type=self.TEXT_WIDGET_TYPE)
+
+    def _execute(self, input_tokens):
+        assert "in1" in input_tokens
+        self.set_property("in1", str(input_tokens["in1"]))
+        return {}
+
+class ScatterKernel(BuiltinKernel):
+
+    def __init__(self):
+        super(ScatterKernel, self).__init__()
+
+        self.add_input_w_traits("scale", entity.Float, optional=True)
+        self.add_input_w_traits("x", entity.Array, expand=True)
+        self.add_input_w_traits("y", entity.Array, expand=True)
+
+        self.set_default_value("scale", 0.25, entity.Float)
+
+    def _execute(self, input_tokens):
+        # Nothing to draw without the editor. See ScatterNode.execute
+        return {}
+
+    @staticmethod
+    def render(input_tokens):
+        # Plots the (x, y) pairs in "points" into an RGBA array. Needs matplotlib
+        from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+        from matplotlib.figure import Figure
+        import matplotlib.pyplot as plt
+
+        scale = input_tokens["scale"]
+        with plt.style.context('dark_background'):
+            fig = Figure(figsize=(8 * scale, 6 * scale))
+            canvas = FigureCanvas(fig)
+            ax = fig.add_subplot(111)
+
+            for x, y in input_tokens["points"]:
+                ax.plot(x, y, '.')
+
+            fig.tight_layout()
+            canvas.draw()
+        return {"image": numpy.asarray(canvas.buffer_rgba())}
+
+class InspectKernel(BuiltinKernel):
+
+    CONCURRENCY = 0  # Shows the token in a widget
+
+    def __init__(self):
+        super(InspectKernel, self).__init__()
+        self.add_input_w_traits("in1", entity.Object)
+        self.add_output_w_traits("out1", entity.Object, expression="in1")
+
+        self.create_property("in1", "", widget_type=self.TEXT_WIDGET_TYPE)
+
+    def _execute(self, input_tokens):
+        assert "in1" in input_tokens
+        self.set_property("in1", str(input_tokens["in1"]))
+        return {"out1": input_tokens["in1"]}
+
+class SwitchKernel(BuiltinKernel):
+
+    def __init__(self):
+        super(SwitchKernel, self).__init__()
+
+        self.add_input_w_traits("in1", entity.Data)
+        self.add_input_w_traits("in2", entity.Data)
+        self.add_input_w_traits("cond", entity.Boolean, expand=True)  #TODO: entity.Array[entity.Boolean] -> Array[in1]
+        self.add_output_w_traits("value", entity.Data, expand=True, expression="in1")
+
+    def check(self):
+        logger.debug("SwitchNode: check")
+        if not super(SwitchKernel, self).check():
+            return False
+
+        traits1 = self.get_input_port_traits('in1')
+        traits2 = self.get_input_port_traits('in2')
+        if traits1 != traits2:
+            self.set_node_status(NodeStatusEnum.ERROR)
+            self.message = f"Port [in2] has wrong traits [{traits_str(traits2)}]. [{traits_str(traits1)}] expected"
+            return False
+        return True
+
+    def _execute(self, input_tokens):
+        cond = input_tokens["cond"]["value"]
+        src = "in1" if cond else "in2"
+        return {"value": input_tokens[src]}
+
+class BooleanTrueKernel(BuiltinKernel):
+
+    def __init__(self):
+        super(BooleanTrueKernel, self).__init__()
+        self.add_output_w_traits("out", entity.Boolean)
+
+    def _execute(self, input_tokens):
+        return {"out": {"value": True, "traits": entity.Boolean}}
+
+class BooleanFalseKernel(BuiltinKernel):
+
+    def __init__(self):
+        super(BooleanFalseKernel, self).__init__()
+        self.add_output_w_traits("out", entity.Boolean)
+
+    def _execute(self, input_tokens):
+        return {"out": {"value": False, "traits": entity.Boolean}}
+
+class BooleanKernel(BuiltinKernel):
+
+    def __init__(self):
+        super(BooleanKernel, self).__init__()
+        self.add_output_w_traits("out", entity.Boolean)
+
+    def _execute(self, input_tokens):
+        value = self.get_property("value")
+        return {"out": {"value": value, "traits": entity.Boolean}}
+
+# Manipulate
+
+class ServeKernel(input_kernel_base(entity.Labware, {"Plate (96-well)": entity.Plate96, "Tube (5ml)": entity.Tube5})):
+
+    def _execute(self, input_tokens):
+        assert len(input_tokens) == 0, input_tokens
+        value = experiments.serve_plate_96wells()
+        return {"value": value}
+
+    async def _execute_async(self, input_tokens):
+        assert len(input_tokens) == 0, input_tokens
+        value = await self._request("serve_plate_96wells")
+        return {"value": value}
+
+class StoreLabwareKernel(BuiltinKernel):
+
+    CONCURRENCY = 0  # Shows the token in a widget
+
+    def __init__(self):
+        super(StoreLabwareKernel, self).__init__()
+
+        self.add_input_w_traits("in1", entity.Labware, expand=True)
+
+        self.create_property("in1", "", widget_type=self.TEXT_WIDGET_TYPE)
+
+    def _execute(self, input_tokens):
+        assert "in1" in input_tokens
+        self.set_property("in1", str(input_tokens["in1"]))
+        where = self.get_property("where")
+        if where == "":
+            experiments.dispose_labware(input_tokens["in1"])
+        else:
+            experiments.store_labware(input_tokens["in1"], where)
+        return {}
+
+class StoreArtifactsKernel(BuiltinKernel):
+
+    CONCURRENCY = 0  # Shows the token in a widget
+
+    def __init__(self):
+        super(StoreArtifactsKernel, self).__init__()
+
+        self.add_input_w_traits("in1", entity.Data)
+
+        self.create_property("in1", "", widget_type=self.TEXT_WIDGET_TYPE)
+
+    def _execute(self, input_tokens):
+        assert "in1" in input_tokens
+        self.set_property("in1", str(input_tokens["in1"]))
+        experiments.save_artifacts(input_tokens["in1"], self.get_property("where"))
+        return {}
+
+class DispenseLiquid96WellsKernel(BuiltinKernel):
+
+    def __init__(self):
+        super(DispenseLiquid96WellsKernel, self).__init__()
+
+        self.add_input_w_traits("in1", entity.Plate96, expand=True)
+        self.add_output_w_traits("out1", entity.Plate96, expand=True, expression="in1")
+        self.add_input_w_traits("channel", entity.Integer | entity.LiquidClass, optional=True, expand=True)
+        self.add_input_w_traits("volume", entity.Array[entity.Real], expand=True)
+
+        self.set_default_value("channel", 0, entity.Integer)
+
+        self.__channels = {'Pure Water': 0, 'Red Water': 1, 'Blue Water': 2}
+
+    def __params(self, input_tokens):
+        data = input_tokens["volume"]["value"].astype(int).resize(96)
+
+        if input_tokens["channel"]["traits"] == entity.LiquidClass:
+            channel = self.__channels[input_tokens["channel"]["value"]]
+        else:
+            assert input_tokens["channel"]["traits"] == entity.Integer
+            channel = input_tokens["channel"]["value"]
+        return {'data': data, 'channel': channel}
+
+    def _execute(self, input_tokens):
+        params = self.__params(input_tokens)
+        # logger.info(f"DispenseLiquid96WellsNode execute with {str(params)}")
+        # _, opts = fluent.experiments.dispense_liquid_96wells(**params)
+        experiments.dispense_liquid_96wells(input_tokens["in1"], params["data"], params["channel"])
+        return {"out1": input_tokens["in1"]}
+
+    async def _execute_async(self, input_tokens):
+        params = self.__params(input_tokens)
+        await self._request("dispense_liquid_96wells", input_tokens["in1"], params["data"], params["channel"])
+        return {"out1": input_tokens["in1"]}
+
+class ReadAbsorbance3ColorsKernel(BuiltinKernel):
+
+    def __init__(self):
+        super(ReadAbsorbance3ColorsKernel, self).__init__()
+
+        self.add_input_w_traits("in1", entity.Plate96, expand=True)
+        self.add_output_w_traits("out1", entity.Plate96, expand=True, expression="in1")
+        self.add_output_w_traits("value", entity.Spread[entity.Array[entity.Float]], expand=True, expression="Spread[Array[Float]]")
+
+    def _execute(self, input_tokens):
+        # logger.info(f"ReadAbsorbance3ColorsNode execute")
+        # (data, ), opts = fluent.experiments.read_absorbance_3colors(**params)
+        data = experiments.read_absorbance_3colors(input_tokens["in1"])
+        return {"out1": input_tokens["in1"], "value": {"value": data, "traits": entity.Spread[entity.Array[entity.Float]]}}
+
+    async def _execute_async(self, input_tokens):
+        data = await self._request("read_absorbance_3colors", input_tokens["in1"])
+        return {"out1": input_tokens["in1"], "value": {"value": data, "traits": entity.Spread[entity.Array[entity.Float]]}}
+
+# Nodes declared under node in config.yaml. An output given as an expression
+# of the inputs passes that input on, and the others give placeholder values.
+# The editor mixes them into ObjectOFPNode or DataOFPNode (see
+# protocol_editor.declare_node), headless into HeadlessNode.
+
+class DataKernel:
+
+    def _execute(self, input_tokens):
+        io_mapping = self.io_mapping
+
+        output_tokens = {}
+        for output in self.output_ports():
+            traits = self.get_output_port_traits(output.name())
+            if output.name() in io_mapping:
+                traits_str = io_mapping[output.name()]
+                if traits_str in input_tokens:
+                    value = input_tokens[traits_str]
+                else:
+                    raise NotImplementedError(f"No default behavior for traits [{traits_str}]")
+            else:
+                assert entity.is_acceptable(traits, entity.Data)
+                value = {'value': 100, 'traits': traits}
+            output_tokens[output.name()] = value
+        return output_tokens
+
+class ObjectKernel:
+
+    def __init__(self):
+        super(ObjectKernel, self).__init__()
+        self.create_property('station', "", widget_type=self.TEXT_WIDGET_TYPE)
+
+    def _execute(self, input_tokens):
+        io_mapping = self.io_mapping
+
+        output_tokens = {}
+        for output in self.output_ports():
+            traits = self.get_output_port_traits(output.name())
+            if output.name() in io_mapping:
+                traits_str = io_mapping[output.name()]
+                if traits_str in input_tokens:
+                    value = input_tokens[traits_str]
+                else:
+                    raise NotImplementedError(f"No default behavior for traits [{traits_str}]")
+            else:
+                if entity.is_acceptable(traits, entity.Data):
+                    value = {'value': 100, 'traits': traits}
+                elif entity.is_acceptable(traits, entity.Object):
+                    value = {'value': {"id": uuid.uuid4()}, 'traits': traits}
+                else:
+                    assert False, "Never reach here {}".format(traits)
+            output_tokens[output.name()] = value
+        return output_tokens
+
+def declared_kernel(doc):
+    # The ports and properties declared in doc, on ObjectKernel if a port takes an Object
+    def is_object(doc):
+        for _, traits_str in doc.get('input', {}).items():
+            traits, _ = evaluate_traits(traits_str)
+            if entity.is_acceptable(traits, entity.Object):
+                return True
+        for _, traits_str in doc.get('output', {}).items():
+            try:
+                traits, _ = evaluate_traits(traits_str)
+            except:
+                pass  # io_mapping
+            else:
+                if entity.is_acceptable(traits, entity.Object):
+                    return True
+        return False
+
+    class _DeclaredKernel(ObjectKernel if is_object(doc) else DataKernel):
+
+        PROPERTY_WIDGET_TYPE = None  # Widget type of the declared properties
+
+        def __init__(self):
+            super(_DeclaredKernel, self).__init__()
+            input_traits = {}
+            for port_name, traits_str in doc.get('input', {}).items():
+                traits, _ = evaluate_traits(traits_str)
+                input_traits[port_name] = traits
+                self.add_input_w_traits(port_name, traits)
+            for port_name, traits_str in doc.get('output', {}).items():
+                traits, is_static = evaluate_traits(traits_str, input_traits)
+                self.add_output_w_traits(port_name, traits, expression=None if is_static else traits_str)
+            for prop_name, value in doc.get('property', {}).items():
+                assert not self.has_property(prop_name)
+                self.create_property(prop_name, str(value), widget_type=self.PROPERTY_WIDGET_TYPE)
+
+    return _DeclaredKernel
@@ -0,0 +1,132 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from collections import deque
+import itertools
+import threading
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# Lazy Spread values. A PURE node expanding a long Spread may return Streams
+# instead of lists (see execute): the elements are computed as the nodes
+# downstream read them, so that those start before the last element is done,
+# and a chain of such nodes holds a few elements each, not a whole Spread.
+#
+# Readers at about the same pace, e.g. the ports of a node expanding two
+# Streams of the same source, share a window of the last elements computed.
+# A reader falling behind the window, e.g. the second of two nodes reading
+# the Stream one after the other, computes the elements again instead, which
+# is safe as they come from pure, deterministic nodes. Nodes taking a Spread
+# as a whole get it as a list.
+#
+# The node computing the elements is DONE by the time they are read. An
+# error computing one is raised to the reader as a StreamError naming that
+# node, and the nodes streaming it on, for the simulator to set them ERROR.
+#
+# A checkpoint saves a Stream as a StreamSource, i.e. what it is computed
+# from, rather than its elements, which are computed again after resuming.
+
+BUFFER = 64  # Elements kept for the readers behind the first one
+CHUNK = 64  # Elements computed at a time by a node with _execute_batch
+
+
+class StreamError(Exception):
+
+    def __init__(self, origin, exception):
+        super(StreamError, self).__init__(f"{origin}: {exception!r}")
+        self.exception = exception
+        self.origins = [origin]  # The node failing first, then those streaming its elements on
+
+class StreamSource:
+
+    def __init__(self, origin, name, input_tokens):
+        # A Stream in a checkpoint: the Stream at the output port name of the
+        # node named origin, executing on input_tokens (see Simulator.resume)
+        self.origin = origin
+        self.name = name
+        self.input_tokens = input_tokens
+
+class Stream:
+
+    def __init__(self, factory, length, buffer=BUFFER, origin=None, inputs=None):
+        # factory() -> an iterator over the elements, from the first each time
+        # origin: the node computing them
+        # inputs: (input tokens, output port name) of origin giving this Stream
+        self.__factory = factory
+        self.__length = length
+        self.origin = origin
+        self.__inputs = inputs
+        self.__error = None  # The StreamError which stopped the source
+        self.__buffer = buffer
+        self.__source = None  # Shared by the readers in the window
+        self.__window = deque()  # The last elements from the source
+        self.__offset = 0  # Index of window[0]
+        self.__lock = threading.Lock()  # Readers may be in worker threads
+        self.__finalizer = None
+
+    def __len__(self):
+        return self.__length
+
+    def __iter__(self):
+        position = 0
+        while position < self.__length:
+            with self.__lock:
+                if position < self.__offset:
+                    break
+                elif position == self.__offset + len(self.__window):
+                    self.__read()
+                element = self.__window[position - self.__offset]
+            yield element
+            position += 1
+        else:
+            return
+
+        logger.info('%r: recomputed from %d', self, position)
+        elements = itertools.islice(self.__factory(), position, self.__length)
+        for _ in range(position, self.__length):
+            yield self.__finalize(self.__next(elements))
+
+    def __read(self):
+        if self.__error is not None:
+            raise self.__error
+        if self.__source is None:
+            self.__source = iter(self.__factory())
+        try:
+            element = self.__next(self.__source)
+        except StreamError as e:
+            self.__error = e
+            raise
+        self.__window.append(self.__finalize(element))
+        if len(self.__window) > self.__buffer:
+            self.__window.popleft()
+            self.__offset += 1
+
+    def __next(self, elements):
+        try:
+            return next(elements)
+        except StreamError as e:
+            if self.origin not in e.origins:
+                e.origins.append(self.origin)  # Streamed on
+            raise
+        except Exception as e:
+            raise StreamError(self.origin, e) from e
+
+    def __finalize(self, element):
+        return element if self.__finalizer is None else self.__finalizer(element)
+
+    def set_finalizer(self, finalizer):
+        # finalizer(element) -> element, applied to each once computed, e.g. token_store.freeze
+        with self.__lock:
+            self.__finalizer = finalizer
+            self.__window = deque(finalizer(element) for element in self.__window)
+
+    def __reduce__(self):
+        # Pickled, e.g. to a checkpoint, without computing the elements
+        if self.__inputs is None:
+            return (list, (list(self), ))  # Of no node
+        input_tokens, name = self.__inputs
+        return (StreamSource, (self.origin.name(), name, input_tokens))
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} of {self.__length}>"
@@ -0,0 +1,112 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from multiprocessing import shared_memory
+import os
+import weakref
+
+import numpy
+
+from token_store import Token
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# Executes pure nodes in worker processes. Arrays in the tokens travel
+# through multiprocessing.shared_memory instead of being pickled: pack()
+# replaces each large array with a SharedArray naming its segment, and
+# unpack() maps the segment back as an array without copying. An array
+# which came out of a segment is sent on by name again.
+
+MIN_SHARED_BYTES = 1 << 16  # Smaller arrays are simply pickled
+
+
+class SharedMemory(shared_memory.SharedMemory):
+    # numpy keeps the memoryview of a segment, not an export of it, so
+    # closing the mapping under a live array would crash. The mapping is
+    # instead released with the last array on it.
+
+    def __init__(self, name=None, create=False, size=0):
+        super(SharedMemory, self).__init__(name, create, size)
+        if self._fd >= 0:
+            os.close(self._fd)  # Not needed once mapped
+            self._fd = -1
+
+    def __del__(self):
+        pass
+
+class SharedArray:
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__}("{self.name}") {self.dtype}{list(self.shape)}>'
+
+_segments = {}  # id(array) -> (weakref to array, segment name)
+
+def segment_of(value):
+    entry = _segments.get(id(value))
+    if entry is None or entry[0]() is not value:
+        return None
+    return entry[1]
+
+def _register(array, name):
+    key = id(array)
+    _segments[key] = (weakref.ref(array, lambda _: _segments.pop(key, None)), name)
+
+def pack(value, created, share=True):
+    # Array -> SharedArray. Names of new segments are appended to created.
+    # share=False puts even the arrays from segments into new ones
+    if isinstance(value, dict):
+        return {key: pack(item, created, share) for key, item in value.items()}
+    elif isinstance(value, list):
+        return [pack(item, created, share) for item in value]
+    elif isinstance(value, Token):
+        return Token(pack(value.value, created, share), value.traits)
+    elif not isinstance(value, numpy.ndarray) or value.dtype.hasobject or value.nbytes < MIN_SHARED_BYTES:
+        return value
+
+    name = segment_of(value) if share else None
+    if name is None:
+        shm = SharedMemory(create=True, size=value.nbytes)
+        numpy.ndarray(value.shape, value.dtype, buffer=shm.buf)[...] = value
+        name = shm.name
+        created.append(name)
+    return SharedArray(name, value.shape, value.dtype)
+
+def unpack(value, owner=False):
+    # SharedArray -> read-only array on the segment. The owner unlinks the
+    # segment once the array is gone.
+    if isinstance(value, dict):
+        return {key: unpack(item, owner) for key, item in value.items()}
+    elif isinstance(value, list):
+        return [unpack(item, owner) for item in value]
+    elif isinstance(value, Token):
+        return Token(unpack(value.value, owner), value.traits)
+    elif not isinstance(value, SharedArray):
+        return value
+
+    shm = SharedMemory(name=value.name)
+    array = numpy.ndarray(value.shape, value.dtype, buffer=shm.buf)
+    array.flags.writeable = False
+    _register(array, value.name)
+    if owner:
+        weakref.finalize(array, unlink, value.name)
+    return array
+
+def unlink(*names):
+    for name in names:
+        try:
+            shm = SharedMemory(name=name)
+        except FileNotFoundError:
+            continue
+        shm.unlink()
+
+def execute_batch(function, batch):
+    # Runs in a worker process. Results get segments of their own, which
+    # are unlinked by the scheduler process
+    results = [function(unpack(input_tokens)) for input_tokens in batch]
+    return pack(results, [], share=False)
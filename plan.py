@@ -0,0 +1,170 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from array import array
+from collections import deque
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+class ExecutionPlan:
+    """Graph topology compiled for the simulator.
+
+    Nodes get integer ids in topological order. Edges are stored as flat
+    CSR arrays: the successors of node i are the entries
+    succ_offsets[i]:succ_offsets[i + 1] of succ_nodes (consumer id),
+    succ_ports (consumer input port index) and succ_sources (output port
+    index of node i). Predecessors are stored likewise. optional_masks[i]
+    has bit j set when the input port j is optional and disconnected, i.e.
+    it never receives a token. Ports are numbered through the plan so that
+    tokens can be kept in flat arrays (see token_store).
+    """
+
+    def __init__(self, nodes):
+        nodes = list(nodes)
+        local_ids = {node: i for i, node in enumerate(nodes)}
+
+        edges = []
+        for u, node in enumerate(nodes):
+            for j, output_port in enumerate(node.output_ports()):
+                for connected in output_port.connected_ports():
+                    v = local_ids.get(connected.node())
+                    if v is None:
+                        continue  # Not executable, e.g. PortInputNode
+                    k = [port.name() for port in nodes[v].input_ports()].index(connected.name())
+                    edges.append((u, j, v, k))
+
+        order = self.__sort(len(nodes), edges)
+        relabel = {u: i for i, u in enumerate(order)}
+
+        self.nodes = [nodes[u] for u in order]
+        self.__ids = {node: i for i, node in enumerate(self.nodes)}
+        self.__names = None
+        self.input_names = [tuple(port.name() for port in node.input_ports()) for node in self.nodes]
+        self.output_names = [tuple(port.name() for port in node.output_ports()) for node in self.nodes]
+
+        edges = sorted((relabel[u], j, relabel[v], k) for u, j, v, k in edges)
+        self.succ_offsets, (self.succ_sources, self.succ_nodes, self.succ_ports) = self.__csr(
+            len(self.nodes), [(u, (j, v, k)) for u, j, v, k in edges])
+        self.pred_offsets, (self.pred_ports, self.pred_nodes, self.pred_sources) = self.__csr(
+            len(self.nodes), sorted((v, (k, u, j)) for u, j, v, k in edges))
+
+        # Ports are interned into integers: the input port k of node i is
+        # input_offsets[i] + k, and the output port j is output_offsets[i] + j
+        self.input_offsets = array('l', [0])
+        for names in self.input_names:
+            self.input_offsets.append(self.input_offsets[-1] + len(names))
+        self.output_offsets = array('l', [self.input_offsets[-1]])
+        for names in self.output_names:
+            self.output_offsets.append(self.output_offsets[-1] + len(names))
+        self.num_ports = self.output_offsets[-1]
+
+        # output port -> ((consumer id, input port), ...)
+        consumers = [[] for _ in range(self.num_ports - self.output_offsets[0])]
+        for u, j, v, k in edges:
+            consumers[self.output_offsets[u] + j - self.output_offsets[0]].append((v, self.input_offsets[v] + k))
+        self.consumers = [tuple(value) for value in consumers]
+
+        connected = {(v, k) for _, _, v, k in edges}
+        self.optional_masks = array('Q', (
+            sum(
+                1 << k for k, name in enumerate(self.input_names[i])
+                if node.is_optional_port(name) and (i, k) not in connected
+            )
+            for i, node in enumerate(self.nodes)
+        ))
+        self.num_required = array('l', (
+            len(self.input_names[i]) - bin(self.optional_masks[i]).count("1")
+            for i in range(len(self.nodes))
+        ))
+        logger.debug("ExecutionPlan: %d nodes, %d edges", len(self.nodes), len(edges))
+
+    @staticmethod
+    def __sort(num_nodes, edges):
+        indegree = [0] * num_nodes
+        successors = [[] for _ in range(num_nodes)]
+        for u, _, v, _ in edges:
+            indegree[v] += 1
+            successors[u].append(v)
+
+        queue = deque(u for u in range(num_nodes) if indegree[u] == 0)
+        order = []
+        while len(queue) > 0:
+            u = queue.popleft()
+            order.append(u)
+            for v in successors[u]:
+                indegree[v] -= 1
+                if indegree[v] == 0:
+                    queue.append(v)
+
+        if len(order) < num_nodes:
+            logger.warning("ExecutionPlan: the graph has a cycle")
+            visited = set(order)
+            order.extend(u for u in range(num_nodes) if u not in visited)
+        return order
+
+    @staticmethod
+    def __csr(num_nodes, entries):
+        # entries: sorted (row, (a, b, c))
+        offsets = array('l', [0] * (num_nodes + 1))
+        columns = (array('l'), array('l'), array('l'))
+        for row, values in entries:
+            offsets[row + 1] += 1
+            for column, value in zip(columns, values):
+                column.append(value)
+        for i in range(num_nodes):
+            offsets[i + 1] += offsets[i]
+        return offsets, columns
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def node_id(self, node):
+        return self.__ids.get(node)
+
+    def index(self, name):
+        # node name -> node id
+        if self.__names is None:
+            self.__names = {node.name(): i for i, node in enumerate(self.nodes)}
+        return self.__names[name]
+
+    def input_port(self, i, k):
+        return self.input_offsets[i] + k
+
+    def output_port(self, i, j):
+        return self.output_offsets[i] + j
+
+    def consumers_of(self, port):
+        # Input ports connected to the given output port
+        return self.consumers[port - self.output_offsets[0]]
+
+    def successors(self, i):
+        for e in range(self.succ_offsets[i], self.succ_offsets[i + 1]):
+            yield self.succ_sources[e], self.succ_nodes[e], self.succ_ports[e]
+
+    def predecessors(self, i):
+        for e in range(self.pred_offsets[i], self.pred_offsets[i + 1]):
+            yield self.pred_ports[e], self.pred_nodes[e], self.pred_sources[e]
+
+    def bottom_levels(self, costs):
+        # costs: node id -> estimated cost of an execution. -> the cost of the
+        # longest path from each node to a sink, the node included
+        levels = [0.0] * len(self.nodes)
+        for i in reversed(range(len(self.nodes))):  # Successors first
+            longest = 0.0
+            for e in range(self.succ_offsets[i], self.succ_offsets[i + 1]):
+                longest = max(longest, levels[self.succ_nodes[e]])
+            levels[i] = costs[i] + longest
+        return levels
+
+    def critical_path(self, levels):
+        # The longest path given the bottom levels, as node ids from a source
+        if len(self.nodes) == 0:
+            return []
+        i = max((u for u in range(len(self.nodes)) if self.pred_offsets[u] == self.pred_offsets[u + 1]), key=levels.__getitem__, default=0)
+        path = [i]
+        while self.succ_offsets[i] < self.succ_offsets[i + 1]:
+            i = max(self.succ_nodes[self.succ_offsets[i]: self.succ_offsets[i + 1]], key=levels.__getitem__)
+            path.append(i)
+        return path
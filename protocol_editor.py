@@ -3,12 +3,11 @@
 from logging import getLogger
 
 import copy
-import functools
 import signal
+import os
 import inspect
 
 from Qt import QtCore, QtWidgets
-from Qt.QtCore import QTimer
 from Qt.QtGui import QPalette, QColor
 
 from NodeGraphQt import (
@@ -21,11 +20,18 @@ from NodeGraphQt import (
 from NodeGraphQt.constants import PortTypeEnum, NodePropWidgetEnum
 from NodeGraphQt.nodes.port_node import PortInputNode, PortOutputNode
 
-from nodes.ofp_node import NodeStatusEnum, OFPNode, ObjectOFPNode, DataOFPNode, IONode, evaluate_traits, traits_str
+from nodes.ofp_node import NodeStatusEnum, OFPNode, ObjectOFPNode, DataOFPNode, IONode, traits_str
+from nodes.core import PortChanges
+from nodes import kernels
 from nodes.group import OFPGroupNode, ForEachNode
 import nodes.entity as entity
 import nodes.builtins
+from nodes.control import StationAllocator
 from simulator import Simulator
+from cache import DiskCache
+from checkpoint import Checkpointer
+from plan import ExecutionPlan
+from virtual_time import DurationModel
 
 logger = getLogger(__name__)
 
@@ -56,6 +62,25 @@ def run_session(graph):
         #         #XXX
         #         run_session(subgraph)
 
+    graph.simulator.schedule(graph.execution_plan(), get_graph_id(graph))
+
+def resume_session(graph):
+    # Continues the runs saved in the last checkpoint, e.g. after a crash
+    logger.info(f"resume_session {get_graph_id(graph)}")
+    verify_session(graph)
+    try:
+        graph.simulator.resume(graph.execution_plan(), get_graph_id(graph))
+    except (OSError, ValueError) as e:
+        logger.error(f"resume_session: {e!r}")
+
+def show_critical_path(graph):
+    # Selects the nodes on the longest path by the cost estimates of the simulator, which dispatches them first
+    path, total = graph.simulator.critical_path(graph.execution_plan())
+    logger.info(f"critical_path {total:g}: {' -> '.join(node.name() for node in path)}")
+    graph.clear_selection()
+    for node in path:
+        node.set_selected(True)
+
 def reset_session(graph):
     logger.info("reset_session")
     all_nodes = (node for node in graph.all_nodes() if isinstance(node, (OFPNode, OFPGroupNode)))
@@ -66,93 +91,78 @@ def reset_session(graph):
             node.reset()
             node.set_node_status(NodeStatusEnum.READY)
 
+def verify_node(node):
+    if isinstance(node, (OFPNode, OFPGroupNode)):
+        pass
+    elif isinstance(node, PortInputNode):
+        return all(len(port.connected_ports()) > 0 for port in node.output_ports())
+    elif isinstance(node, PortOutputNode):
+        return all(len(port.connected_ports()) > 0 for port in node.input_ports())
+    else:
+        return True
+
+    is_valid_node = node.check()
+
+    if is_valid_node and isinstance(node, OFPGroupNode):
+        subgraph = node.get_sub_graph()
+        if subgraph is not None:
+            is_valid_subgraph = verify_session(subgraph)
+            is_valid_node = is_valid_node and is_valid_subgraph
+            if not is_valid_subgraph:
+                error_msg = "Invalid subgraph"
+        else:
+            error_msg = "No subgraph"
+            is_valid_node = False
+
+        if not is_valid_node:
+            node.set_node_status(NodeStatusEnum.ERROR)
+            node.message = error_msg
+    return is_valid_node
+
 def verify_session(graph):
     logger.debug("verify_session")
 
     is_valid_graph = True
 
     for node in graph.all_nodes():
-        if isinstance(node, (OFPNode, OFPGroupNode)):
-            pass
-        elif isinstance(node, PortInputNode):
-            is_valid_graph = is_valid_graph and all(len(port.connected_ports()) > 0 for port in node.output_ports())
-            continue
-        elif isinstance(node, PortOutputNode):
-            is_valid_graph = is_valid_graph and all(len(port.connected_ports()) > 0 for port in node.input_ports())
-            continue
-        else:
-            continue
-
-        is_valid_node = node.check()
-
-        if is_valid_node and isinstance(node, OFPGroupNode):
-            subgraph = node.get_sub_graph()
-            if subgraph is not None:
-                is_valid_subgraph = verify_session(subgraph)
-                is_valid_node = is_valid_node and is_valid_subgraph
-                if not is_valid_graph:
-                    error_msg = "Invalid subgraph"
-            else:
-                error_msg = "No subgraph"
-                is_valid_node = False
-
-            if not is_valid_node:
-                node.set_node_status(NodeStatusEnum.ERROR)
-                node.message = error_msg
-
-        if not is_valid_node:
-            is_valid_graph = False
+        is_valid_graph = verify_node(node) and is_valid_graph
 
     # logger.info(graph.serialize_session())
     return is_valid_graph
 
-loop_count = 0
-
-def _main_loop(graph, sim):
-    graph_id = get_graph_id(graph)
-    all_nodes = [
-        node for node in graph.all_nodes()
-        if isinstance(node, (OFPNode, OFPGroupNode))
-    ]
-    if sim.num_tokens() == 0 and all(node.get_node_status() not in (NodeStatusEnum.WAITING, NodeStatusEnum.RUNNING) for node in all_nodes):
-        return
-    
-    for node in all_nodes:
-        node.update_node_status()
-    
-    for node in all_nodes:
-        if node.get_node_status() == NodeStatusEnum.DONE:
-            sim.fetch_token(node, graph_id)
-            sim.transmit_token(node, graph_id)
-
-    for node in all_nodes:
-        if (
-            node.get_node_status() == NodeStatusEnum.WAITING
-            and all(
-                (node.is_optional_port(input_port.name()) and len(input_port.connected_ports()) == 0)
-                or sim.has_token((graph_id, node.name(), input_port.name()))
-                for input_port in node.input_ports()
-            )
-        ):
-            sim.run(node, graph_id)
-
-def main_loop(graph):
-    global loop_count
-    loop_count += 1
-    # logger.info(f"main_loop: loop_count={loop_count}, graph_id={get_graph_id(graph)}")
-
-    _main_loop(graph, graph.simulator)
+def affected_nodes(nodes):
+    # The nodes and their downstream cones, into the subgraphs of group nodes
+    # and out to the group nodes of subgraphs, as their checks depend on them
+    affected = set()
+    stack = list(nodes)
+    while len(stack) > 0:
+        node = stack.pop()
+        if node in affected:
+            continue
+        affected.add(node)
+        for port in node.output_ports():
+            stack.extend(connected.node() for connected in port.connected_ports())
+        if isinstance(node, OFPGroupNode) and node.get_sub_graph() is not None:
+            stack.extend(another for another in node.get_sub_graph().all_nodes() if isinstance(another, PortInputNode))
+        group = getattr(node.graph, "node", None)  # SubGraph
+        if isinstance(group, OFPGroupNode):
+            stack.append(group)
+    return affected
 
 class MyModel:
 
-    def __init__(self, doc):
+    def __init__(self, doc, allocator=None):
         self.__property = {}
 
         self.__stations = doc.get('station', {})
+        # The allocator of the async server in the editor, so that disabled stations are not allocated at runtime
+        self.allocator = allocator or StationAllocator(self.__stations, doc.get('capacity'))
 
     def set_property(self, name, value):
         assert value is True or value is False
         self.__property[name] = value
+        if name in self.__stations:
+            self.allocator.set_enabled(name, value)
 
     def get_property(self, name):
         return self.__property.get(name, False)
@@ -167,53 +177,28 @@ class MyModel:
         if not isinstance(node, OFPNode):
             return ""
         class_name = node.__class__.__name__
-        for key, value in self.__stations.items():
-            if class_name in value and self.get_property(key):
-                return key
-        logger.info('allocate_station %s', class_name)
-        return ""
+        station = self.allocator.allocate(class_name)  # The least loaded enabled station
+        if station == "":
+            logger.info('allocate_station %s', class_name)
+        return station
 
 def declare_node(name, doc):
-    def base_node_class(doc):
-        for _, traits_str in doc.get('input', {}).items():
-            traits, _ = evaluate_traits(traits_str)
-            if entity.is_acceptable(traits, entity.Object):
-                return ObjectOFPNode
-        for _, traits_str in doc.get('output', {}).items():
-            try:
-                traits, _ = evaluate_traits(traits_str)
-            except:
-                pass  # io_mapping
-            else:
-                if entity.is_acceptable(traits, entity.Object):
-                    return ObjectOFPNode
-        return DataOFPNode
-    
-    base_cls = base_node_class(doc)
-
-    def __init__(self):
-        base_cls.__init__(self)
-        self.__doc = doc
-        input_traits = {}
-        params = entity.get_categories()
-        for port_name, traits_str in doc.get('input', {}).items():
-            traits, _ = evaluate_traits(traits_str)
-            input_traits[port_name] = traits
-            self.add_input_w_traits(port_name, traits)
-        for port_name, traits_str in doc.get('output', {}).items():
-            traits, is_static = evaluate_traits(traits_str, input_traits)
-            self.add_output_w_traits(port_name, traits, expression=None if is_static else traits_str)
-        for prop_name, value in doc.get('property', {}).items():
-            assert not self.has_property(prop_name)
-            self.create_property(prop_name, str(value), widget_type=NodePropWidgetEnum.QLINE_EDIT.value)
+    kernel = kernels.declared_kernel(doc)
+    base_cls = ObjectOFPNode if issubclass(kernel, kernels.ObjectKernel) else DataOFPNode
 
     tab = doc.get("tab", "test")
-    cls = type(name, (base_cls, ), {'__identifier__': f'nodes.{tab}', 'NODE_NAME': name, '__init__': __init__})
+    cls = type(name, (kernel, base_cls), {
+        '__identifier__': f'nodes.{tab}', 'NODE_NAME': name, 'PROPERTY_WIDGET_TYPE': NodePropWidgetEnum.QLINE_EDIT.value})
     return cls
 
+class SimulatorNotifier(QtCore.QObject):
+
+    # Emitted from a worker thread. Slots run on the GUI thread (queued connection)
+    completed = QtCore.Signal()
+
 class MyNodeGraph(NodeGraph):
 
-    def __init__(self, simulator=None, doc=None):
+    def __init__(self, simulator=None, doc=None, allocator=None):
         super(MyNodeGraph, self).__init__()
 
         self.node_created.connect(self._node_created)
@@ -223,7 +208,15 @@ class MyNodeGraph(NodeGraph):
         self.property_changed.connect(self._property_changed)
 
         self.simulator = simulator or Simulator()
-        self.__mymodel = MyModel(doc.get('model', {}))
+        self.__mymodel = MyModel(doc.get('model', {}), allocator)
+        self.__plan = None
+        self.__plan_ports = None  # PortChanges.count when the plan was built
+        # Nodes to check in the next pass. Signals come in bursts, e.g. pasting
+        # or loading a session, and are verified together once control returns
+        # to the event loop (see verify_later)
+        self.__unverified = set()
+        self.__verify_all = False
+        self.__verify_scheduled = False
 
         self.register_nodes([
             declare_node(key, value)
@@ -235,10 +228,19 @@ class MyNodeGraph(NodeGraph):
 
     def _updated(self, *args, **kwargs):
         logger.info("updated %s %s", args, kwargs)
-        verify_session(self)
+        self.__plan = None
+        for port in args:
+            # port_connected and port_disconnected, also on undo. The nodes tell themselves otherwise
+            if hasattr(port, "type_") and port.type_() == PortTypeEnum.IN.value and isinstance(port.node(), (OFPNode, OFPGroupNode)):
+                port.node().invalidate_traits()
+        if len(args) == 2 and all(hasattr(port, "node") for port in args):
+            self.verify_later(port.node() for port in args)
+        else:
+            self.verify_later()  # nodes_deleted
 
     def _node_created(self, node):
         logger.info("node_created %s", node)
+        self.__plan = None
         if isinstance(node, GraphPropertyNode):
             # for name in node.property_names:
             #     if not self.__mymodel.has_property(name):
@@ -246,21 +248,44 @@ class MyNodeGraph(NodeGraph):
             node.update_property()
         elif isinstance(node, (OFPNode, OFPGroupNode)):
             node.update_color()
-        verify_session(self)
+        self.verify_later((node, ))
 
     def _property_changed(self, node, name, value):
         logger.debug("property_changed %s %s %s", node, name, value)
         if isinstance(node, GraphPropertyNode) and self.__mymodel.has_property(name):
             self.set_property(name, value)
-            verify_session(self)
+            self.verify_later()
         elif isinstance(node, IONode):
-            verify_session(self)
+            self.verify_later((node, ))
             node.update_color()
         elif isinstance(node, (OFPNode, OFPGroupNode)) and name == "status":
             node.update_color()
-            if value != NodeStatusEnum.DONE.value:
+            if value in (NodeStatusEnum.READY.value, NodeStatusEnum.ERROR.value):
+                # Tokens queued for the following runs survive RUNNING and DONE
                 self.simulator.reset_token(node, get_graph_id(self))  #XXX
 
+    def verify_later(self, nodes=None):
+        # Checks the nodes and those affected by them once control returns to
+        # the event loop, together with the others requested meanwhile. None for all
+        if nodes is None:
+            self.__verify_all = True
+        else:
+            self.__unverified.update(nodes)
+        if not self.__verify_scheduled:
+            self.__verify_scheduled = True
+            QtCore.QTimer.singleShot(0, self.__verify_pending)
+
+    def __verify_pending(self):
+        unverified, verify_all = self.__unverified, self.__verify_all
+        self.__unverified, self.__verify_all, self.__verify_scheduled = set(), False, False
+        if verify_all:
+            verify_session(self)
+            return
+        nodes = affected_nodes(unverified)
+        logger.debug("verify %d nodes", len(nodes))
+        for node in nodes:
+            verify_node(node)
+
     def set_property(self, name, value):
         self.__mymodel.set_property(name, value)
 
@@ -273,6 +298,16 @@ class MyNodeGraph(NodeGraph):
 
     def allocate_station(self, node):
         return self.__mymodel.allocate_station(node)
+
+    def execution_plan(self):
+        # Rebuilt only when nodes, connections or ports change. See _updated and _node_created
+        if self.__plan is None or self.__plan_ports != PortChanges.count:
+            self.__plan = ExecutionPlan(
+                node for node in self.all_nodes()
+                if isinstance(node, (OFPNode, OFPGroupNode))
+            )
+            self.__plan_ports = PortChanges.count
+        return self.__plan
     
     def expand_group_node(self, node):
         subgraph = super(MyNodeGraph, self).expand_group_node(node)
@@ -358,8 +393,26 @@ if __name__ == '__main__':
     with open('./config.yaml') as f:
         doc = yaml.safe_load(f)
 
+    # execute nodes in a thread pool, and process the completions on the GUI thread.
+    # instrument requests go through the asyncio server, allocated stations by their capacities.
+    from nodes.control import async_experiments
+    async_experiments.configure(doc.get('model', {}).get('station', {}), timeout=60.0, capacity=doc.get('model', {}).get('capacity'))
+    async_experiments.start()
+
+    # nodes on the longest path by the durations in config.yaml (model.duration) are dispatched first
+    model = doc.get('model', {})
+    cost = DurationModel(model).estimate if len(model.get('duration', {})) > 0 else None
+
+    notifier = SimulatorNotifier()
+    simulator = Simulator(max_workers=4, notify=notifier.completed.emit, server=async_experiments, incremental=True, cost=cost,
+        cache=DiskCache(os.path.join(os.path.expanduser("~"), ".cache", "protocol_editor")),
+        checkpoint=Checkpointer(os.path.join(os.path.expanduser("~"), ".cache", "protocol_editor", "checkpoint.pkl")))
+    notifier.completed.connect(simulator.process_completions)
+    app.aboutToQuit.connect(simulator.shutdown)
+    app.aboutToQuit.connect(async_experiments.stop)
+
     # create graph controller.
-    graph = MyNodeGraph(doc=doc)
+    graph = MyNodeGraph(simulator=simulator, doc=doc, allocator=async_experiments.allocator)
     # graph.set_acyclic(False)
 
     # set up context menu for the node graph.
@@ -397,11 +450,5 @@ if __name__ == '__main__':
 
     # wire function to "node_double_clicked" signal.
     graph.node_double_clicked.connect(display_properties_bin)
-    
-    t1 = QTimer()
-    # t1.setInterval(3 * 1000)  # msec
-    t1.setInterval(0.5 * 1000)  # msec
-    t1.timeout.connect(functools.partial(main_loop, graph))
-    t1.start()
 
     app.exec_()
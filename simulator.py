@@ -1,76 +1,753 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
+import functools
+import heapq
 import itertools
+import queue
+import multiprocessing
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
 
-from nodes.ofp_node import OFPNode, NodeStatusEnum
+from nodes.core import NodeStatusEnum  # Qt-free. "OFPNode" annotations are just for reference
+from nodes.stream import StreamError, StreamSource
+from plan import ExecutionPlan
+from token_store import Token, TokenStore
+from memo import Memo
+import offload
+from tracing import nbytes
 
 from logging import getLogger
 
 logger = getLogger(__name__)
 
 
+class Execution:
+
+    def __init__(self):
+        self.issued = 0  # Executions submitted to the thread pool
+        self.released = 0  # Executions whose outputs are released in order
+        self.pending = {}  # seq -> outputs (or the exception) completed out of order
+        self.inputs = {}  # seq -> input tokens until the outputs are released. For checkpoints
+
+class Instance:
+
+    def __init__(self, plan: ExecutionPlan, values: dict):
+        self.overrides = {}  # node id -> output tokens
+        for name, outputs in values.items():
+            i = plan.index(name)
+            node = plan.nodes[i]
+            self.overrides[i] = {
+                port_name: value if isinstance(value, dict) and "traits" in value else dict(value=value, traits=node.get_output_port_traits(port_name))
+                for port_name, value in outputs.items()
+            }
+        self.results = {}  # node name -> tokens
+
 class Simulator:
 
-    def __init__(self) -> None:
-        # self.__results = {}
-        self.__tokens = {}
+    def __init__(self, capacity=None, max_workers=None, notify=None, server=None, processes=None, incremental=False, cache=None, checkpoint=None, tracer=None, clock=None, cost=None, stream=None) -> None:
+        self.__stores = {}  # graph_id -> TokenStore over the port ids of the plan
+        self.__capacity = capacity  # Max tokens queued at an input port. None for unbounded
+
+        # Executor mode: nodes execute in a thread pool when max_workers is given.
+        # notify() is called from a worker thread when an execution completes, and
+        # is expected to call process_completions() on the scheduler thread.
+        self.__executor = None if max_workers is None else ThreadPoolExecutor(max_workers=max_workers)
+        self.__notify = notify
+        # Nodes with a coroutine (is_async) run on the event loop of this
+        # nodes.control.AsyncExperiments instead, without a thread each.
+        self.__server = server
+        # PURE nodes execute in worker processes, given the number of processes.
+        # Their arrays are passed through shared memory (see offload).
+        self.__processes = None if processes is None else ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+        self.__executions = {}  # (graph_id, node id) -> Execution
+        self.__executing = {}  # node -> executions in flight
+        self.__blocked = {}  # node -> graph_ids waiting for the node to be free
+        # Batch execution
+        self.__instances = {}  # (graph_id, serial) -> Instance
+        self.__instance_ids = itertools.count()
 
-    def fetch_token(self, node: OFPNode, graph_id: int) -> None:
-        # This token_store doesn't support multiple tokens at a single port
-        assert len(node.output_queue) <= 1
+        self.__completions = queue.SimpleQueue()  # (key, Execution, seq, node, function returning the outputs)
+
+        # Incremental mode, or given a cache.DiskCache, PURE and DETERMINISTIC
+        # nodes reuse the outputs of executions on the same inputs (see memo)
+        self.__memo = Memo(cache) if incremental or cache is not None else None
+
+        # A checkpoint.Checkpointer, given to save the state periodically for resume()
+        self.__checkpoint = checkpoint
+        # A tracing.Tracer, given to record the executions and the tokens
+        self.__tracer = tracer
+        # A virtual_time.VirtualClock, given to simulate the durations on the
+        # line instead. Nodes execute on the scheduler thread, and complete in
+        # virtual time as wait() advances the clock
+        self.__clock = clock
+        # Given a length, PURE and DETERMINISTIC nodes expanding a Spread of
+        # as many elements or more, or a nodes.stream.Stream, return Streams
+        # instead of lists. Their elements are computed as the nodes
+        # downstream read them, and errors doing so set them ERROR as well
+        self.__stream = stream
+
+        # Event-driven scheduler
+        self.__plans = {}  # graph_id -> ExecutionPlan
+        self.__remaining = {}  # (graph_id, node id) -> number of required input ports with no token
+        self.__credits = {}  # (graph_id, node id) -> runs left for a node without required inputs
+        # Nodes ready to run are dispatched run by run, then by the cost of
+        # the longest path from them to a sink (ExecutionPlan.bottom_levels),
+        # so that the critical path starts first without holding back the
+        # runs pipelined earlier. cost(node) estimates the duration of an
+        # execution, 1 for every node if None
+        self.__ready = []  # heap of (run, -bottom level, serial, (graph_id, node id)) ready to run
+        self.__ready_serial = itertools.count()
+        self.__dispatched = {}  # (graph_id, node id) -> executions dispatched, i.e. the run of the next one
+        self.__queued = set()
+        self.__cost = cost
+        self.__levels = weakref.WeakKeyDictionary()  # plan -> bottom levels
+        self.__dispatching = False
+
+    def fetch_token(self, node: "OFPNode", graph_id: int) -> None:
+        plan = self.__plans[graph_id]
+        store = self.__stores[graph_id]
+        i = plan.node_id(node)
+        tracer = self.__tracer
+        if tracer is not None:
+            start, fetched, size = tracer.now(), 0, 0
         while len(node.output_queue) > 0:
             logger.info('fetch_token %s', node)
             output_tokens = node.output_queue.popleft()
-            output_tokens = {(graph_id, node.name(), key): value for key, value in output_tokens.items()}
-            for key, value in output_tokens.items():
-                # self.__results[key] = value
-                self.__tokens[key] = value
-
-    def transmit_token(self, node: OFPNode, graph_id: int) -> None:
-        # Transmit a token
-        for output in node.output_ports():
-            key = (graph_id, node.name(), output.name())
-            if not key in self.__tokens:
+            if graph_id in self.__instances and len(output_tokens) > 0:
+                self.__instances[graph_id].results[node.name()] = output_tokens
+            if self.__memo is not None:
+                output_tokens = self.__memo.store(node, output_tokens)
+            for name, value in output_tokens.items():
+                store.push(plan.output_port(i, plan.output_names[i].index(name)), Token.of(value))
+            if tracer is not None:
+                fetched += len(output_tokens)
+                size += sum(nbytes(token["value"]) for token in output_tokens.values())
+        if tracer is not None:
+            tracer.complete(node.name(), "fetch", start, {"tokens": fetched, "bytes": size})
+
+    def __is_active(self, node) -> bool:
+        # Taking part in a run
+        return node.get_node_status() in (NodeStatusEnum.WAITING, NodeStatusEnum.RUNNING, NodeStatusEnum.DONE)
+
+    def transmit_token(self, node: "OFPNode", graph_id: int) -> None:
+        # Transmit tokens as long as every consumer has room for them (backpressure)
+        plan = self.__plans[graph_id]
+        store = self.__stores[graph_id]
+        capacity = self.__capacity
+        i = plan.node_id(node)
+        tracer = self.__tracer
+        if tracer is not None:
+            start, transmitted, depth = tracer.now(), 0, 0
+        for j in range(len(plan.output_names[i])):
+            port = plan.output_port(i, j)
+            if store.count(port) == 0:
+                continue
+
+            connected = plan.consumers_of(port)
+            if len(connected) == 0:
+                store.clear(port)  # Nobody consumes this
                 continue
-            logger.info('transmit_token %s', node)
-            value = self.__tokens[key]
-            send = False
-            for connected in output.connected_ports():
-                if connected.node().get_node_status() == NodeStatusEnum.WAITING:
-                    send = True
-                    new_key = (graph_id, connected.node().name(), connected.name())
-                    # self.__results[new_key] = value
-                    self.__tokens[new_key] = value
-            # if send:
-            #     del self.__tokens[key]
-            del self.__tokens[key]  #XXX: An object might lost
-
-    def run(self, node: OFPNode, graph_id: int) -> None:
+            consumers = [(v, another) for v, another in connected if self.__is_active(plan.nodes[v])]
+            if len(consumers) == 0:
+                continue  # Kept until the consumers join a run
+
+            while store.count(port) > 0 and (capacity is None or all(store.count(another) < capacity for _, another in consumers)):
+                logger.info('transmit_token %s', node)
+                token = store.pop(port)
+                for v, another in consumers:
+                    store.push(another, token)
+                    if store.count(another) == 1:
+                        self.__remaining[(graph_id, v)] = self.__get_remaining(graph_id, v) - 1
+                        self.__try_ready(graph_id, v)
+                if tracer is not None:
+                    transmitted += 1
+                    depth = max(depth, max(store.count(another) for _, another in consumers))
+        if tracer is not None and transmitted > 0:
+            tracer.complete(node.name(), "transmit", start, {"tokens": transmitted, "max depth": depth})
+
+    def run(self, node: "OFPNode", graph_id: int) -> None:
         logger.info('run %s', node)
 
+        plan = self.__plans[graph_id]
+        store = self.__stores[graph_id]
+        i = plan.node_id(node)
+        optional_mask = plan.optional_masks[i]
+        remaining = self.__get_remaining(graph_id, i)
         input_tokens = {}
-        for input in node.input_ports():
-            key = (graph_id, node.name(), input.name())
-            if key in self.__tokens:
-                input_tokens[input.name()] = self.__tokens.pop(key)
+        for k, name in enumerate(plan.input_names[i]):
+            port = plan.input_port(i, k)
+            if store.count(port) > 0:
+                input_tokens[name] = store.pop(port)
+                if store.count(port) == 0:
+                    remaining += 1
             else:
-                assert node.is_optional_port(input.name()), f"{node} {input.name()}"  # chek if optional
+                assert optional_mask & (1 << k), f"{node} {name}"  # chek if optional
+        self.__remaining[(graph_id, i)] = remaining
 
-        # input_tokens = {
-        #     input.name(): self.__results[(graph_id, node.name(), input.name())]
-        #     for input in node.input_ports()
-        #     if (graph_id, node.name(), input.name()) in self.__results  # For optional inputs
-        # }
+        if graph_id in self.__instances and len(plan.output_names[i]) == 0:
+            self.__instances[graph_id].results[node.name()] = input_tokens
         node.run(input_tokens)
 
+        # Room is made for the producers
+        for _, u, _ in plan.predecessors(i):
+            self.transmit_token(plan.nodes[u], graph_id)
+            self.__try_ready(graph_id, u)
+        return input_tokens
+
+    def __executes_on_scheduler(self, node: "OFPNode") -> bool:
+        if self.__clock is not None:
+            return self.__clock.executes_on_scheduler(node)
+        elif self.__processes is not None and node.PURE:
+            return False
+        elif node.CONCURRENCY == 0:
+            return True
+        elif self.__server is not None and node.is_async():
+            return False
+        return self.__executor is None
+
+    def __execute_options(self, graph_id: int, i: int, node: "OFPNode") -> dict:
+        # Keyword arguments of execute. Sinks have nothing to stream
+        if self.__stream is not None and node.PURE and node.DETERMINISTIC and len(self.__plans[graph_id].output_names[i]) > 0:
+            return {"stream": self.__stream}
+        return {}
+
+    def __submit(self, graph_id: int, i: int, node: "OFPNode") -> None:
+        key = (graph_id, i)
+        if key not in self.__executions:
+            self.__executions[key] = Execution()
+        execution = self.__executions[key]
+        seq = execution.issued
+        execution.issued += 1
+        self.__executing[node] = self.__executing.get(node, 0) + 1
+
+        input_tokens = execution.inputs[seq] = node.start_execution()
+        tracer = self.__tracer
+        try:
+            if self.__clock is not None:
+                future = self.__clock.execute(node, input_tokens)
+                result = future.result
+            elif self.__processes is not None and node.PURE:
+                batch, merge = node.prepare_execution(input_tokens)
+                created = []
+                future = self.__processes.submit(offload.execute_batch, node.pure_function(), offload.pack(batch, created))
+                # The arrays in batch are kept until the worker is done with their segments
+                future.add_done_callback(lambda _, batch=batch: offload.unlink(*created))
+                result = lambda: merge(offload.unpack(future.result(), owner=True))
+                if tracer is not None:
+                    # From the submission, including the wait for a worker
+                    start, name = tracer.now(), node.name()
+                    future.add_done_callback(lambda _: tracer.async_span(name, "execute", start, (key, seq), {"process": True, "batch": len(batch)}))
+            elif self.__server is not None and node.is_async():
+                coroutine = node.execute_async(input_tokens)
+                if tracer is not None:
+                    coroutine = self.__traced_async(tracer, node.name(), (key, seq), coroutine)
+                future = self.__server.submit(coroutine, owner=graph_id)  # Protocols share the stations fairly
+                result = future.result
+            else:
+                function = functools.partial(node.execute, **self.__execute_options(graph_id, i, node))
+                if tracer is not None:
+                    function = self.__traced(tracer, node.name(), function)
+                future = self.__executor.submit(function, input_tokens)
+                result = future.result
+        except Exception as e:
+            # e.g. from a Stream in the inputs, read by prepare_execution
+            future = Future()
+            future.set_exception(e)
+            result = future.result
+
+        def done(future):
+            self.__completions.put((key, execution, seq, node, result))
+            if self.__notify is not None:
+                self.__notify()
+        future.add_done_callback(done)
+
+    @staticmethod
+    def __traced(tracer, name, function):
+        def traced(*args):
+            start = tracer.now()
+            try:
+                return function(*args)
+            finally:
+                tracer.complete(name, "execute", start)
+        return traced
+
+    @staticmethod
+    async def __traced_async(tracer, name, id, coroutine):
+        # Coroutines interleave on the event loop, and do not nest like spans on a thread
+        start = tracer.now()
+        try:
+            return await coroutine
+        finally:
+            tracer.async_span(name, "execute", start, id)
+
+    def __complete(self, key, execution, seq, node, result) -> None:
+        try:
+            output_tokens = result()
+        except Exception as e:
+            output_tokens = e
+
+        self.__executing[node] -= 1
+        if self.__executing[node] == 0:
+            del self.__executing[node]
+
+        key = self.__key(key[0], node)  # The node id may change with the plan, see __remap
+        if key is not None and self.__executions.get(key) is execution:
+            self.__release(key, execution, seq, node, output_tokens)
+        # else: Reset while executing, or removed from the graph
+
+        for graph_id in self.__blocked.pop(node, ()):
+            blocked = self.__key(graph_id, node)
+            if blocked is not None:
+                self.__try_ready(*blocked)
+
+    def __key(self, graph_id, node: "OFPNode"):
+        # -> (graph_id, node id) in the current plan, None if not in it
+        plan = self.__plans.get(graph_id)
+        i = None if plan is None else plan.node_id(node)
+        return None if i is None else (graph_id, i)
+
+    def __release(self, key, execution, seq, node, output_tokens) -> None:
+        execution.pending[seq] = output_tokens
+
+        graph_id, i = key
+        # Outputs are released in the order of the inputs
+        while execution.released in execution.pending:
+            output_tokens = execution.pending.pop(execution.released)
+            execution.inputs.pop(execution.released, None)
+            execution.released += 1
+            if node.get_node_status() != NodeStatusEnum.RUNNING:
+                continue
+            elif isinstance(output_tokens, Exception):
+                self.__fail(node, output_tokens)
+                continue
+            node.finish_execution(output_tokens)
+            self.fetch_token(node, graph_id)
+            self.transmit_token(node, graph_id)
+        if execution.released == execution.issued:
+            del self.__executions[key]
+        self.__try_ready(graph_id, i)
+
+    def __fail(self, node: "OFPNode", exception: Exception) -> None:
+        logger.error('execute %s: %r', node, exception)
+        node.set_node_status(NodeStatusEnum.ERROR)
+        if self.__memo is not None:
+            self.__memo.fail(node)
+        if isinstance(exception, StreamError):
+            # Failed computing the elements of a Stream read by this node
+            # after it was DONE, and so did the nodes streaming them on
+            for origin in exception.origins:
+                origin.set_node_status(NodeStatusEnum.ERROR)
+                if self.__memo is not None:
+                    self.__memo.invalidate(origin)
+
+    def __forget(self, node: "OFPNode") -> None:
+        # Executions of node in flight are not to be memoized
+        if self.__memo is not None:
+            self.__memo.forget(node)
+
+    def process_completions(self) -> None:
+        # Call this on the scheduler thread
+        while True:
+            try:
+                self.__complete(*self.__completions.get_nowait())
+            except queue.Empty:
+                break
+        self.dispatch()
+
+    def num_executing(self) -> int:
+        return sum(execution.issued - execution.released for execution in self.__executions.values())
+
+    def wait(self) -> None:
+        # Blocks until every execution in the thread pool or the event loop is processed
+        while self.num_executing() > 0:
+            if self.__clock is not None and self.__completions.empty():
+                self.__clock.advance()
+            self.__complete(*self.__completions.get())
+            self.process_completions()
+
+    def shutdown(self) -> None:
+        if self.__executor is not None:
+            self.__executor.shutdown()
+        if self.__processes is not None:
+            self.__processes.shutdown()
+        if self.__memo is not None:
+            self.__memo.flush()
+        if self.__checkpoint is not None:
+            self.__checkpoint.flush()
+            self.__checkpoint.write(self.checkpoint())  # The final state
+            self.__checkpoint.shutdown()
+
     def num_tokens(self):
-        return len(self.__tokens)
-    
-    def reset_token(self, node: OFPNode, graph_id: int):
-        for port in itertools.chain(node.input_ports(), node.output_ports()):
-            key = (graph_id, node.name(), port.name())
-            if key in self.__tokens:
-                del self.__tokens[key]
+        return sum(len(store) for store in self.__stores.values())
+
+    def memory_stats(self) -> dict:
+        stats = {"stores": len(self.__stores), "ports": 0, "tokens": 0, "unique_tokens": 0, "queues": 0, "bytes": 0}
+        for store in self.__stores.values():
+            for key, value in store.memory_stats().items():
+                stats[key] += value
+        return stats
+
+    def reset_token(self, node: "OFPNode", graph_id: int):
+        plan = self.__plans.get(graph_id)
+        if plan is None or plan.node_id(node) is None:
+            return
+        i = plan.node_id(node)
+        store = self.__stores[graph_id]
+        for port in self.__ports(plan, i):
+            store.clear(port)
+        self.__remaining.pop((graph_id, i), None)
+        self.__credits.pop((graph_id, i), None)
+        self.__executions.pop((graph_id, i), None)
+        self.__dispatched.pop((graph_id, i), None)
+        self.__forget(node)
+
+    @staticmethod
+    def __ports(plan: ExecutionPlan, i: int):
+        return itertools.chain(
+            range(plan.input_offsets[i], plan.input_offsets[i + 1]),
+            range(plan.output_offsets[i], plan.output_offsets[i + 1]))
 
     def has_token(self, key) -> bool:
-        return key in self.__tokens
+        # key: (graph_id, node name, port name)
+        graph_id, name, port_name = key
+        plan = self.__plans.get(graph_id)
+        if plan is None:
+            return False
+        i = plan.index(name)
+        if port_name in plan.input_names[i]:
+            port = plan.input_port(i, plan.input_names[i].index(port_name))
+        else:
+            port = plan.output_port(i, plan.output_names[i].index(port_name))
+        return self.__stores[graph_id].count(port) > 0
+
+    def schedule(self, plan: ExecutionPlan, graph_id: int, runs: int = 1) -> None:
+        # Start runs: nodes without required inputs fire once more per run, and the
+        # others fire whenever every required input port has a token.
+        # Runs already in flight are pipelined with this one.
+        self.__start(plan, graph_id, runs)
+        self.dispatch()
+
+    def __start(self, plan: ExecutionPlan, graph_id, runs: int) -> None:
+        if graph_id not in self.__plans:
+            self.__plans[graph_id] = plan
+            self.__stores[graph_id] = TokenStore(plan.num_ports)
+        elif self.__plans[graph_id] is not plan:
+            ready = self.__remap(graph_id, self.__plans[graph_id], plan)
+            self.__stores[graph_id] = self.__migrate(self.__plans[graph_id], self.__stores[graph_id], plan)
+            self.__plans[graph_id] = plan
+            for i in ready:
+                self.__try_ready(graph_id, i)
+        for i, node in enumerate(plan.nodes):
+            if node.get_node_status() not in (NodeStatusEnum.WAITING, NodeStatusEnum.DONE):
+                continue
+            elif node.get_node_status() == NodeStatusEnum.WAITING:
+                self.__forget(node)  # Left by a reset while executing
+            if plan.num_required[i] == 0:
+                self.__credits[(graph_id, i)] = self.__credits.get((graph_id, i), 0) + runs
+            self.__remaining[(graph_id, i)] = self.__count_remaining(plan, i, graph_id)
+            self.__try_ready(graph_id, i)
+
+    def __remap(self, graph_id, old_plan: ExecutionPlan, plan: ExecutionPlan) -> list:
+        # Node ids of the previous plan are no longer valid. The state kept by
+        # node id follows the nodes still in the graph, as __migrate does for
+        # the tokens, e.g. the executions in flight, whose outputs are then
+        # released when they complete. Returns the new ids of the nodes that
+        # were ready, to be queued again
+        def node_id(u):
+            return plan.node_id(old_plan.nodes[u])
+
+        def remap(mapping):
+            remapped = {}
+            for key, value in mapping.items():
+                if key[0] != graph_id:
+                    remapped[key] = value
+                elif node_id(key[1]) is not None:
+                    remapped[(graph_id, node_id(key[1]))] = value
+            return remapped
+
+        self.__remaining = {key: value for key, value in self.__remaining.items() if key[0] != graph_id}  # Counted again
+        self.__credits = remap(self.__credits)
+        self.__executions = remap(self.__executions)
+        self.__dispatched = remap(self.__dispatched)
+
+        ready = [node_id(key[1]) for key in self.__queued if key[0] == graph_id]
+        self.__queued = set(key for key in self.__queued if key[0] != graph_id)
+        self.__ready = [entry for entry in self.__ready if entry[-1][0] != graph_id]
+        heapq.heapify(self.__ready)
+        return [i for i in ready if i is not None]
+
+    @staticmethod
+    def __migrate(old_plan: ExecutionPlan, old_store: TokenStore, plan: ExecutionPlan) -> TokenStore:
+        # Tokens follow their node and port name into the new plan
+        store = TokenStore(plan.num_ports)
+        for u, node in enumerate(old_plan.nodes):
+            i = plan.node_id(node)
+            if i is None:
+                continue
+            for k, name in enumerate(old_plan.input_names[u]):
+                if name in plan.input_names[i]:
+                    store.put(plan.input_port(i, plan.input_names[i].index(name)), old_store.take(old_plan.input_port(u, k)))
+            for j, name in enumerate(old_plan.output_names[u]):
+                if name in plan.output_names[i]:
+                    store.put(plan.output_port(i, plan.output_names[i].index(name)), old_store.take(old_plan.output_port(u, j)))
+        return store
+
+    def checkpoint(self) -> dict:
+        # Snapshots of every graph but batch instances
+        return {
+            "graphs": [self.snapshot(graph_id) for graph_id in self.__plans if graph_id not in self.__instances],
+        }
+
+    def snapshot(self, graph_id) -> dict:
+        # The state of a graph between executions. Inputs of the executions
+        # in flight are returned to their ports, so that they execute again
+        plan = self.__plans[graph_id]
+        store = self.__stores[graph_id]
+        nodes = {}
+        tokens = {}
+        for i, node in enumerate(plan.nodes):
+            name = node.name()
+            execution = self.__executions.get((graph_id, i))
+            inputs = [] if execution is None else [execution.inputs[seq] for seq in sorted(execution.inputs)]
+            credits = self.__credits.get((graph_id, i), 0)
+            if plan.num_required[i] == 0:
+                credits += len(inputs)
+            nodes[name] = {"status": node.get_node_status().value, "credits": credits}
+            for k, port_name in enumerate(plan.input_names[i]):
+                queued = [input_tokens[port_name] for input_tokens in inputs if port_name in input_tokens]
+                queued.extend(store.tokens(plan.input_port(i, k)))
+                if len(queued) > 0:
+                    tokens[(name, "in", port_name)] = queued
+            for j, port_name in enumerate(plan.output_names[i]):
+                queued = store.tokens(plan.output_port(i, j))
+                if len(queued) > 0:
+                    tokens[(name, "out", port_name)] = list(queued)
+        return {"nodes": nodes, "tokens": tokens}
+
+    def resume(self, plan: ExecutionPlan, graph_id: int, state: dict = None) -> None:
+        # Continues the runs of a graph from a checkpoint, by default the last one saved.
+        # The graph is found among those in the checkpoint by the names of its nodes
+        if state is None:
+            state = self.__checkpoint.load()
+        names = set(node.name() for node in plan.nodes)
+        if len(names) != len(plan.nodes):
+            raise ValueError("Node names must be unique to resume")
+        snapshot = next((snapshot for snapshot in state["graphs"] if set(snapshot["nodes"]) == names), None)
+        if snapshot is None:
+            raise ValueError("No checkpoint of the graph")
+
+        if graph_id in self.__plans:
+            for i in range(len(self.__plans[graph_id].nodes)):
+                self.__remaining.pop((graph_id, i), None)
+                self.__credits.pop((graph_id, i), None)
+                self.__executions.pop((graph_id, i), None)
+                self.__dispatched.pop((graph_id, i), None)
+        self.__plans[graph_id] = plan
+        store = self.__stores[graph_id] = TokenStore(plan.num_ports)
+
+        # Statuses first. The editor clears the tokens of a node turning READY or ERROR
+        for i, node in enumerate(plan.nodes):
+            entry = snapshot["nodes"][node.name()]
+            node.reset()
+            self.__forget(node)
+            status = NodeStatusEnum(entry["status"])
+            node.set_node_status(NodeStatusEnum.WAITING if status == NodeStatusEnum.RUNNING else status)
+            if entry["credits"] > 0:
+                self.__credits[(graph_id, i)] = entry["credits"]
+        restored = {}
+        for (name, kind, port_name), queued in snapshot["tokens"].items():
+            i = plan.index(name)
+            if kind == "in":
+                port = plan.input_port(i, plan.input_names[i].index(port_name))
+            else:
+                port = plan.output_port(i, plan.output_names[i].index(port_name))
+            for token in queued:
+                store.push(port, self.__restore(plan, token, restored))
+
+        for i in range(len(plan.nodes)):
+            # Before transmitting, which counts a token arriving at an empty port
+            self.__remaining[(graph_id, i)] = self.__count_remaining(plan, i, graph_id)
+        for i, node in enumerate(plan.nodes):
+            self.transmit_token(node, graph_id)
+            self.__try_ready(graph_id, i)
+        self.dispatch()
+
+    def __restore(self, plan: ExecutionPlan, token, restored: dict):
+        # Streams are checkpointed as a StreamSource, and their node returns
+        # them again, as lazy as before. restored: id(input tokens) -> output tokens
+        source = token["value"]
+        if not isinstance(source, StreamSource):
+            return token
+        key = id(source.input_tokens)  # Shared by the ports of an execution
+        if key not in restored:
+            input_tokens = {name: self.__restore(plan, token, restored) for name, token in source.input_tokens.items()}
+            restored[key] = plan.nodes[plan.index(source.origin)].execute(input_tokens, stream=1)
+        return Token.of(restored[key][source.name])
+
+    def submit_batch(self, plan: ExecutionPlan, graph_id: int, parameters: list) -> list:
+        # Runs the graph once per entry of parameters, all together. An entry
+        # maps node names to the outputs the node yields in that instance
+        # instead of executing, e.g. {"Integer": {"value": 3}}. Each instance
+        # has tokens of its own, and is keyed by the returned instance id
+        # where the simulator takes a graph_id.
+        instances = []
+        for values in parameters:
+            instance = (graph_id, next(self.__instance_ids))
+            self.__instances[instance] = Instance(plan, values)
+            self.__start(plan, instance, 1)
+            instances.append(instance)
+        self.dispatch()
+        return instances
+
+    def is_finished(self, instance) -> bool:
+        if len(self.__stores[instance]) > 0:
+            return False
+        plan = self.__plans[instance]
+        for i in range(len(plan.nodes)):
+            if (instance, i) in self.__executions or self.__credits.get((instance, i), 0) > 0:
+                return False
+        return True
+
+    def results(self, instance) -> dict:
+        # node name -> the last output tokens of the node. Input tokens for a
+        # node without outputs (e.g. Display)
+        return self.__instances[instance].results
+
+    def release(self, instance) -> None:
+        plan = self.__plans.pop(instance)
+        del self.__instances[instance]
+        del self.__stores[instance]
+        for i in range(len(plan.nodes)):
+            self.__remaining.pop((instance, i), None)
+            self.__credits.pop((instance, i), None)
+            self.__executions.pop((instance, i), None)
+            self.__dispatched.pop((instance, i), None)
+
+    def __count_remaining(self, plan: ExecutionPlan, i: int, graph_id: int) -> int:
+        store = self.__stores[graph_id]
+        optional_mask = plan.optional_masks[i]
+        return plan.num_required[i] - sum(
+            1 for k in range(len(plan.input_names[i]))
+            if not optional_mask & (1 << k) and store.count(plan.input_port(i, k)) > 0
+        )
+
+    def __get_remaining(self, graph_id: int, i: int) -> int:
+        key = (graph_id, i)
+        if key not in self.__remaining:
+            self.__remaining[key] = self.__count_remaining(self.__plans[graph_id], i, graph_id)
+        return self.__remaining[key]
+
+    def __is_runnable(self, graph_id: int, i: int) -> bool:
+        plan = self.__plans[graph_id]
+        node = plan.nodes[i]
+        status = node.get_node_status()
+        executing = self.__executing.get(node, 0)
+        if executing > 0 and status == NodeStatusEnum.RUNNING:
+            if executing >= max(node.CONCURRENCY, 1):
+                self.__blocked.setdefault(node, set()).add(graph_id)
+                return False
+        elif status not in (NodeStatusEnum.WAITING, NodeStatusEnum.DONE):
+            return False
+
+        store = self.__stores[graph_id]
+        if any(store.count(port) > 0 for port in range(plan.output_offsets[i], plan.output_offsets[i + 1])):
+            return False  # Blocked until the outputs are transmitted
+        elif plan.num_required[i] == 0:
+            return self.__credits.get((graph_id, i), 0) > 0
+        return self.__get_remaining(graph_id, i) == 0
+
+    def __try_ready(self, graph_id: int, i: int) -> None:
+        key = (graph_id, i)
+        if key not in self.__queued and self.__is_runnable(graph_id, i):
+            self.__queued.add(key)
+            heapq.heappush(self.__ready, (
+                self.__dispatched.get(key, 0), -self.bottom_levels(self.__plans[graph_id])[i], next(self.__ready_serial), key))
+            if self.__tracer is not None:
+                self.__tracer.instant(self.__plans[graph_id].nodes[i].name(), "ready")
+
+    def dispatch(self) -> None:
+        if self.__dispatching:
+            return  # The running loop picks up new entries
+
+        self.__dispatching = True
+        try:
+            while len(self.__ready) > 0:
+                key = heapq.heappop(self.__ready)[-1]
+                self.__queued.discard(key)
+                graph_id, i = key
+                if self.__tracer is not None:
+                    self.__tracer.counter("scheduler", {
+                        "ready": len(self.__ready), "executing": sum(self.__executing.values()), "tokens": self.num_tokens()})
+                if not self.__is_runnable(graph_id, i):
+                    continue
+
+                plan = self.__plans[graph_id]
+                node = plan.nodes[i]
+                if plan.num_required[i] == 0:
+                    self.__credits[key] -= 1
+                self.__dispatched[key] = self.__dispatched.get(key, 0) + 1
+
+                input_tokens = self.run(node, graph_id)
+                instance = self.__instances.get(graph_id)
+                overridden = instance is not None and i in instance.overrides
+                reused = None
+                if self.__memo is not None:
+                    try:
+                        reused = self.__memo.lookup(node, input_tokens, len(plan.output_names[i]) > 0, overridden)
+                    except StreamError as e:
+                        self.__fail(node, e)  # Read to be digested
+                        self.__try_ready(graph_id, i)
+                        continue
+
+                if overridden:
+                    if self.__tracer is not None:
+                        self.__tracer.instant(node.name(), "override")
+                    node.start_execution()
+                    node.finish_execution(dict(instance.overrides[i]))
+                    self.fetch_token(node, graph_id)
+                    self.transmit_token(node, graph_id)
+                elif reused is not None:
+                    logger.info('reuse %s', node)
+                    if self.__tracer is not None:
+                        self.__tracer.instant(node.name(), "reuse")
+                    node.start_execution()
+                    node.finish_execution(reused)
+                    self.fetch_token(node, graph_id)
+                    self.transmit_token(node, graph_id)
+                elif not self.__executes_on_scheduler(node):
+                    self.__submit(graph_id, i, node)
+                else:
+                    if self.__tracer is not None:
+                        start = self.__tracer.now()
+                    try:
+                        node.update_node_status(**self.__execute_options(graph_id, i, node))
+                    except Exception as e:
+                        self.__fail(node, e)  # As in the thread pool
+                    if self.__tracer is not None:
+                        self.__tracer.complete(node.name(), "execute", start)
+                    if node.get_node_status() == NodeStatusEnum.DONE:
+                        self.fetch_token(node, graph_id)
+                        self.transmit_token(node, graph_id)
+                self.__try_ready(graph_id, i)
+        finally:
+            self.__dispatching = False
+
+        if self.__checkpoint is not None and self.__checkpoint.due():
+            self.__checkpoint.write(self.checkpoint())
+
+    def bottom_levels(self, plan: ExecutionPlan) -> list:
+        levels = self.__levels.get(plan)
+        if levels is None:
+            cost = self.__cost or (lambda node: 1.0)
+            levels = self.__levels[plan] = plan.bottom_levels([cost(node) for node in plan.nodes])
+        return levels
+
+    def critical_path(self, plan: ExecutionPlan) -> tuple:
+        # -> (the nodes on the longest path by the cost estimates, its cost)
+        levels = self.bottom_levels(plan)
+        path = plan.critical_path(levels)
+        return [plan.nodes[i] for i in path], (levels[path[0]] if len(path) > 0 else 0.0)
+
+    def num_ready(self) -> int:
+        return len(self.__ready)
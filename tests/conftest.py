@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nodes import kernels  # noqa: E402
+
+
+@pytest.fixture
+def displayed(monkeypatch):
+    # Values shown by DisplayNode, in the order of the executions
+    values = []
+
+    def _execute(self, input_tokens):
+        values.append(input_tokens["in1"]["value"])
+        return {}
+
+    monkeypatch.setattr(kernels.DisplayKernel, "_execute", _execute)
+    return values
+
+@pytest.fixture
+def counted(monkeypatch):
+    # counted(AddKernel) -> a list whose length is the number of executions of the kernel
+    def count(kernel):
+        calls = []
+        _execute = kernel._execute
+
+        def counting(self, input_tokens):
+            calls.append(self.name())
+            return _execute(self, input_tokens)
+
+        monkeypatch.setattr(kernel, "_execute", counting)
+        return calls
+    return count
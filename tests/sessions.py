@@ -0,0 +1,55 @@
+# Graphs built headless for the tests
+import os
+
+import headless
+from simulator import Simulator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIXTURE = os.path.join(ROOT, "samples", "mixture.json")
+CONFIG = os.path.join(ROOT, "config.yaml")
+
+
+def chain(graph, length, value=1, step=2):
+    # value + step * length through a chain of AddNodes, shown by a DisplayNode
+    source = graph.create_node("builtins.IntegerNode", name="Source")
+    source.set_property("value", value)
+    increment = graph.create_node("builtins.IntegerNode", name="Step")
+    increment.set_property("value", step)
+    previous = source
+    for k in range(length):
+        add = graph.create_node("builtins.AddNode", name=f"Add{k}")
+        graph.connect(previous.get_output("value"), add.get_input("a"))
+        graph.connect(increment.get_output("value"), add.get_input("b"))
+        previous = add
+    display = graph.create_node("builtins.DisplayNode", name="Display")
+    graph.connect(previous.get_output("value"), display.get_input("in1"))
+    return graph
+
+def spread(graph, size):
+    # The sum of 2.0 * k for k < size, through a Spread expanded by MulNode
+    group = graph.create_node("builtins.GroupNode", name="Group")
+    group.set_property("ninputs", size)
+    group.on_value_changed(size)
+    for k in range(size):
+        source = graph.create_node("builtins.IntegerNode", name=f"I{k}")
+        source.set_property("value", k)
+        graph.connect(source.get_output("value"), group.get_input(f"in{k + 1}"))
+    factor = graph.create_node("builtins.FloatNode", name="Factor")
+    factor.set_property("value", 2.0)
+    mul = graph.create_node("builtins.MulNode", name="Mul")
+    graph.connect(group.get_output("value"), mul.get_input("a"))
+    graph.connect(factor.get_output("value"), mul.get_input("b"))
+    display = graph.create_node("builtins.DisplayNode", name="Display")
+    graph.connect(mul.get_output("value"), display.get_input("in1"))
+    return graph
+
+def run(graph, runs=1):
+    # Runs the graph to the end, and returns the statuses of its nodes by name
+    headless.reset_session(graph)
+    assert headless.verify_session(graph)
+    headless.run_session(graph, runs)
+    graph.simulator.wait()
+    return {node.name(): node.get_node_status().name for node in graph.all_nodes()}
+
+def new_graph(**options):
+    return headless.HeadlessGraph(Simulator(**options))
@@ -0,0 +1,77 @@
+import asyncio
+import concurrent.futures
+
+import pytest
+
+from nodes.control import AsyncExperiments, AsyncServerBase
+
+
+class Recording(AsyncServerBase):
+
+    def __init__(self, latency=0.01):
+        self.latency = latency
+        self.order = []
+        self.serving = 0
+        self.max_serving = 0
+
+    async def serve_plate_96wells(self, who):
+        self.order.append(who)
+        self.serving += 1
+        self.max_serving = max(self.max_serving, self.serving)
+        await asyncio.sleep(self.latency)
+        self.serving -= 1
+        return who
+
+@pytest.fixture
+def experiments():
+    started = []
+
+    def start(server, stations, timeout=None, capacity=None):
+        experiments = AsyncExperiments(server)
+        experiments.configure(stations, timeout, capacity)
+        experiments.start()
+        started.append(experiments)
+        return experiments
+
+    yield start
+    for experiments in started:
+        experiments.stop()
+
+@pytest.mark.parametrize("capacity", [1, 2])
+def test_capacity_of_a_station(experiments, capacity):
+    server = Recording()
+    e = experiments(server, {"station4": ["X"]}, capacity={"station4": capacity})
+    futures = [e.submit(e.request("X", "serve_plate_96wells", k)) for k in range(6)]
+    assert [future.result(5) for future in futures] == list(range(6))
+    assert server.max_serving == capacity
+    assert e.allocator.in_use("station4") == 0
+
+def test_unlisted_classes_are_not_limited(experiments):
+    server = Recording()
+    e = experiments(server, {"station4": ["X"]})
+    futures = [e.submit(e.request("Y", "serve_plate_96wells", k)) for k in range(4)]
+    concurrent.futures.wait(futures, 5)
+    assert server.max_serving == 4
+
+def test_owners_share_a_station(experiments):
+    server = Recording()
+    e = experiments(server, {"station4": ["X"]})
+    futures = [e.submit(e.request("X", "serve_plate_96wells", "A"), owner="A") for _ in range(4)]
+    futures += [e.submit(e.request("X", "serve_plate_96wells", "B"), owner="B") for _ in range(2)]
+    concurrent.futures.wait(futures, 5)
+    assert server.order[:5].count("B") == 2  # Not after every request of A
+
+def test_timeout_releases_the_station(experiments):
+    server = Recording(latency=1.0)
+    e = experiments(server, {"station4": ["X"]}, timeout=0.05)
+    futures = [e.submit(e.request("X", "serve_plate_96wells", k)) for k in range(2)]
+    for future in futures:
+        with pytest.raises(asyncio.TimeoutError):
+            future.result(5)
+    assert e.allocator.in_use("station4") == 0 and e.allocator.waiting("station4") == 0
+
+def test_disabled_stations_fail_at_once(experiments):
+    e = experiments(Recording(), {"station4": ["X"]})
+    e.allocator.set_enabled("station4", False)
+    with pytest.raises(RuntimeError, match="station4"):
+        e.submit(e.request("X", "serve_plate_96wells", 0)).result(5)
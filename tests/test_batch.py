@@ -0,0 +1,18 @@
+import pytest
+
+import headless
+
+from sessions import chain, new_graph
+
+
+@pytest.mark.parametrize("options", [{}, {"max_workers": 3}, {"incremental": True}, {"capacity": 1}])
+def test_instances_run_with_their_parameters(options):
+    graph = chain(new_graph(**options), 3)
+    parameters = [{"Source": {"value": 10}}, {"Step": {"value": 3}}, {}, {"Source": {"value": 10}}]
+    headless.reset_session(graph)
+    assert headless.verify_session(graph)
+    results = headless.run_batch(graph, parameters)
+    graph.simulator.shutdown()
+    assert [result["Display"]["in1"]["value"] for result in results] == [16, 10, 7, 16]
+    assert [result["Source"]["value"]["value"] for result in results] == [10, 1, 1, 10]
+    assert graph.simulator.num_tokens() == 0  # Released
@@ -0,0 +1,24 @@
+import json
+
+import pytest
+
+import benchmark
+
+
+@pytest.mark.parametrize("shape", list(benchmark.SHAPES))
+def test_bench(shape):
+    result = benchmark.bench(shape, 20, 1)
+    assert "errors" not in result, result.get("errors")
+    for name in ("save_session", "load_session", "verify_session", "get_output_port_traits", "is_acceptable", "run"):
+        assert result[name] >= 0, name
+
+def test_compare(tmp_path, capsys):
+    output = str(tmp_path / "before.json")
+    assert benchmark.main(["--shapes", "chain", "--sizes", "10", "-r", "1", "-o", output]) == 0
+    with open(output) as f:
+        results = json.load(f)
+    slower = json.loads(json.dumps(results))
+    for result in slower["results"]:
+        result["run"] *= 10
+    assert benchmark.compare(slower, results, 1.2) == [("chain", results["results"][0]["nodes"], "run", results["results"][0]["run"], slower["results"][0]["run"], pytest.approx(10.0))]
+    assert benchmark.compare(results, slower, 1.2) == []
@@ -0,0 +1,102 @@
+import os
+
+import numpy
+import pytest
+
+from cache import DiskCache, code_digest
+from nodes import entity, kernels
+
+from sessions import chain, new_graph, run
+
+
+def entries(root):
+    # Keys of the entries on disk
+    return sorted(
+        name for prefix in os.listdir(root) if not prefix.startswith(".")
+        for name in os.listdir(os.path.join(root, prefix))
+    )
+
+def test_put_and_get(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    key = bytes(range(16))
+    assert cache.get(key) is None
+    cache.put(key, {"value": {"value": numpy.arange(4.0), "traits": entity.Array[entity.Float]},
+                    "count": {"value": 4, "traits": entity.Integer}})
+    cache.flush()  # Written in the background
+    tokens = cache.get(key)
+    assert tokens["count"] == {"value": 4, "traits": entity.Integer}
+    assert numpy.array_equal(tokens["value"]["value"], numpy.arange(4.0))
+    assert not tokens["value"]["value"].flags.writeable
+    assert entries(str(tmp_path)) == [key.hex()]
+    cache.clear()
+    assert cache.get(key) is None and cache.size() == 0
+
+def test_eviction(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=20000)
+    for k in range(5):
+        cache.put(bytes([k] * 16), {"value": {"value": numpy.zeros(1000), "traits": entity.Array[entity.Float]}})
+    assert 0 < cache.size() <= 20000
+    assert cache.get(bytes([4] * 16)) is not None  # The most recent one is kept
+
+def test_code_digest():
+    def f(x):
+        return x + 1
+
+    def g(x):
+        return x + 2
+
+    assert code_digest(f) == code_digest(f)
+    assert code_digest(f) != code_digest(g)
+    assert code_digest(f) != code_digest(f, modules=("nodes.entity", ))
+    assert code_digest(kernels.AddKernel._execute, kernels.AddKernel._execute_batch) != code_digest(kernels.AddKernel._execute)
+
+def test_reused_across_sessions(tmp_path, counted, displayed):
+    calls = counted(kernels.AddKernel)
+    for _ in range(2):
+        cache = DiskCache(str(tmp_path))
+        graph = chain(new_graph(cache=cache), 5)
+        run(graph)
+        graph.simulator.shutdown()
+    assert len(calls) == 5  # None in the second session
+    assert displayed == [11, 11]
+    assert len(entries(str(tmp_path))) == 5
+
+def test_keys_follow_the_inputs(tmp_path, counted, displayed):
+    calls = counted(kernels.AddKernel)
+    for value in (1, 2, 1):
+        graph = chain(new_graph(cache=DiskCache(str(tmp_path))), 3)
+        for node in graph.all_nodes():
+            if node.name() == "Source":
+                node.set_property("value", value)
+        run(graph)
+        graph.simulator.shutdown()
+    assert len(calls) == 6  # Executed for 1 and 2 only
+    assert displayed == [7, 8, 7]
+
+def test_keys_follow_the_code(tmp_path, monkeypatch):
+    graph = chain(new_graph(cache=DiskCache(str(tmp_path))), 3)
+    run(graph)
+    graph.simulator.shutdown()
+    assert len(entries(str(tmp_path))) == 3
+
+    def _execute(self, input_tokens):
+        return {"value": {"value": input_tokens["a"]["value"] + input_tokens["b"]["value"], "traits": entity.Integer}}
+
+    monkeypatch.setattr(kernels.AddKernel, "_execute", _execute)
+    graph = chain(new_graph(cache=DiskCache(str(tmp_path))), 3)
+    run(graph)
+    graph.simulator.shutdown()
+    assert len(entries(str(tmp_path))) == 6  # Another code, other keys
+
+@pytest.mark.parametrize("stream", [None, 2])
+def test_nondeterministic_nodes_are_not_cached(tmp_path, stream):
+    graph = new_graph(cache=DiskCache(str(tmp_path)), stream=stream)
+    size = graph.create_node("builtins.IntegerNode", name="Size")
+    size.set_property("value", 3)
+    uniform = graph.create_node("builtins.RandomUniformNode", name="Uniform")
+    graph.connect(size.get_output("value"), uniform.get_input("size"))
+    display = graph.create_node("builtins.DisplayNode", name="Display")
+    graph.connect(uniform.get_output("value"), display.get_input("in1"))
+    assert set(run(graph).values()) == {"DONE"}
+    graph.simulator.shutdown()
+    assert entries(str(tmp_path)) == []
@@ -0,0 +1,101 @@
+import pickle
+import threading
+import time
+
+import pytest
+
+import headless
+from checkpoint import Checkpointer
+from nodes import kernels
+from nodes.core import NodeStatusEnum
+from simulator import Simulator
+
+from sessions import chain, new_graph, run
+
+
+@pytest.fixture
+def gated(monkeypatch):
+    # AddNodes execute up to gated.allowed times, then wait for gated.gate
+    _execute = kernels.AddKernel._execute
+    calls = []
+
+    def waiting(self, input_tokens):
+        calls.append(self.name())
+        if len(calls) > waiting.allowed:
+            waiting.gate.wait(10)
+        return _execute(self, input_tokens)
+
+    waiting.allowed, waiting.gate, waiting.calls = 0, threading.Event(), calls
+    monkeypatch.setattr(kernels.AddKernel, "_execute", waiting)
+    monkeypatch.setattr(kernels.AddKernel, "_execute_batch", None)
+    return waiting
+
+def interrupted(gated, length, runs):
+    # The checkpoint of pipelined runs stopped with executions in flight
+    gated.allowed = length * runs - 3
+    graph = chain(new_graph(max_workers=2), length)
+    headless.reset_session(graph)
+    assert headless.verify_session(graph)
+    headless.run_session(graph, runs)
+    deadline = time.monotonic() + 10
+    while len(gated.calls) <= gated.allowed:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+        graph.simulator.process_completions()
+    time.sleep(0.05)
+    graph.simulator.process_completions()
+    assert graph.simulator.num_executing() > 0
+    state = pickle.loads(pickle.dumps(graph.simulator.checkpoint()))
+    gated.gate.set()
+    graph.simulator.shutdown()  # The completions left are never processed
+    return state
+
+def test_resume_completes_the_runs(gated, displayed):
+    state = interrupted(gated, 5, 3)
+    assert len(displayed) < 3
+    assert len(state["graphs"][0]["tokens"]) > 0
+
+    graph = chain(new_graph(max_workers=2), 5)
+    graph.simulator.resume(graph.execution_plan(), id(graph), state)
+    graph.simulator.wait()
+    graph.simulator.shutdown()
+    assert set(node.get_node_status().name for node in graph.all_nodes()) == {"DONE"}
+    assert displayed == [11, 11, 11]  # Every run displayed once, before or after resuming
+
+def test_resume_from_the_file(tmp_path, displayed):
+    path = str(tmp_path / "state.ckpt")
+    graph = chain(new_graph(checkpoint=Checkpointer(path, interval=0.0)), 3)
+    run(graph, runs=2)
+    graph.simulator.shutdown()  # Writes the final state
+    assert displayed == [7, 7]
+
+    graph = chain(headless.HeadlessGraph(Simulator(checkpoint=Checkpointer(path))), 3)
+    graph.simulator.resume(graph.execution_plan(), id(graph))
+    graph.simulator.wait()
+    assert displayed == [7, 7]  # Nothing left to run
+    assert set(node.get_node_status().name for node in graph.all_nodes()) == {"DONE"}
+
+def test_resume_needs_the_same_graph(displayed):
+    graph = chain(new_graph(), 3)
+    run(graph)
+    state = graph.simulator.checkpoint()
+    another = chain(new_graph(), 4)
+    with pytest.raises(ValueError):
+        another.simulator.resume(another.execution_plan(), id(another), state)
+
+def test_resume_tokens_left_at_an_output(displayed):
+    graph = chain(new_graph(), 3)
+    display = next(node for node in graph.all_nodes() if node.name() == "Display")
+    headless.reset_session(graph)
+    assert headless.verify_session(graph)
+    display.set_node_status(NodeStatusEnum.ERROR)  # Not in the run: the token stays at Add2
+    headless.run_session(graph)
+    graph.simulator.wait()
+    state = pickle.loads(pickle.dumps(graph.simulator.checkpoint()))
+    assert list(state["graphs"][0]["tokens"]) == [("Add2", "out", "value")]
+
+    state["graphs"][0]["nodes"]["Display"]["status"] = NodeStatusEnum.WAITING.value
+    graph.simulator.resume(graph.execution_plan(), id(graph), state)
+    graph.simulator.wait()
+    assert display.get_node_status() == NodeStatusEnum.DONE
+    assert displayed == [7]
@@ -0,0 +1,50 @@
+import itertools
+import typing
+
+from nodes import entity
+from nodes.entity import Any, Array, ArrayLike, Boolean, Data, Float, Integer, LiquidClass, Object, Plate96, Real, Spread, String, Tube5
+
+TRAITS = [
+    Any, Object, Data, Boolean, Integer, Float, Real, String, LiquidClass, Plate96, Tube5, ArrayLike,
+    Array, Array[Integer], Array[Float], Array[Real], Spread, Spread[Integer], Spread[Array[Float]],
+    Spread[Plate96], Integer | Spread[Integer], Real | Array[Real] | Spread[Real | Array[Real]],
+]
+
+
+def test_acceptable():
+    assert entity.is_acceptable(Array, Any) and entity.is_acceptable(Array, Data)
+    assert not entity.is_acceptable(Array, Object)
+    assert entity.is_acceptable(Array, ArrayLike) and not entity.is_acceptable(ArrayLike, Array)
+    assert entity.is_acceptable(Spread[Array], Spread[ArrayLike])
+    assert entity.is_acceptable(Spread[Array], Data)
+    assert entity.is_acceptable(Spread[Plate96], Object)
+    assert entity.is_acceptable(Integer, Real) and not entity.is_acceptable(Real, Integer)
+    assert entity.is_acceptable(LiquidClass, String)
+
+def test_memoized_as_computed():
+    for _ in range(2):  # Computed, then memoized
+        for one, another in itertools.product(TRAITS, repeat=2):
+            assert entity.is_acceptable(one, another) == entity._check_acceptable(one, another), (one, another)
+
+def test_equal_traits_built_apart():
+    one = entity.intern(typing.Union[Integer, Array[Float]])
+    another = entity.intern(typing.Union[Integer, Array[Float]])
+    assert one is another
+    assert entity.is_acceptable(another, Data)
+
+def test_upper():
+    assert entity.upper(Integer, Float) is Float
+    assert entity.upper(Boolean, Integer) is Integer  # As numpy promotes bool
+    assert entity.upper(Boolean, Boolean) is Boolean
+    assert entity.upper(Array[Integer], Float) == Array[Float]
+    assert entity.upper(Spread[Integer], Array[Float]) == Spread[Array[Float]]
+    assert entity.upper(Spread[Spread[Integer]], Float) == Spread[Spread[Float]]
+    assert entity.upper(Integer, Integer, Float) is Float
+    assert entity.upper(Real, Integer) == Integer | Float
+
+def test_upper_is_a_join():
+    for x, y in itertools.product(entity._PRIMITIVES, repeat=2):
+        z = entity.upper(x, y)
+        assert z == entity.upper(y, x), (x, y)
+        assert entity.upper(z, x) == z and entity.upper(z, y) == z, (x, y)  # Above both
+        assert entity.upper(x, x) == x
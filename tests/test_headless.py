@@ -0,0 +1,66 @@
+import json
+
+import pytest
+import yaml
+
+import headless
+
+from sessions import CONFIG, MIXTURE, run
+
+
+def declared_session(path, extra=None):
+    # A session of nodes declared in config.yaml, saved with the switches of the stations
+    with open(CONFIG) as f:
+        graph = headless.HeadlessGraph(declarations=yaml.safe_load(f)["node"])
+    plate = graph.create_node("nodes.test.Plate96InputNode", name="Plate")
+    measure = graph.create_node("nodes.test.MeasureNode", name="Measure")
+    output = graph.create_node("nodes.test.ObjectOutputNode", name="Output")
+    data = graph.create_node("nodes.test.DataOutputNode", name="Data")
+    graph.connect(plate.get_output("out1"), measure.get_input("in1"))
+    graph.connect(measure.get_output("out1"), output.get_input("in1"))
+    graph.connect(measure.get_output("value1"), data.get_input("in1"))
+    layout_data = graph.serialize_session()
+    layout_data["nodes"]["config"] = {"type_": "nodes.config.ConfigNode", "name": "Config", "custom": {}}
+    layout_data["nodes"].update(extra or {})
+    with open(path, "w") as f:
+        json.dump(layout_data, f)
+    return str(path)
+
+def test_save_and_load(tmp_path):
+    graph = headless.HeadlessGraph()
+    graph.load_session(MIXTURE)
+    graph.save_session(str(tmp_path / "session.json"))
+    another = headless.HeadlessGraph()
+    another.load_session(str(tmp_path / "session.json"))
+    assert another.serialize_session() == graph.serialize_session()
+    assert set(run(another).values()) == {"DONE"}
+
+@pytest.mark.parametrize("argv", [[], ["-n", "3"], ["-j", "2"], ["--incremental"], ["--stream", "2"], ["--async", "--config", CONFIG]])
+def test_main(argv, capsys):
+    assert headless.main([MIXTURE] + argv) == 0
+    out = capsys.readouterr().out
+    assert ": DONE" in out
+    assert ": WAITING" not in out and ": ERROR" not in out
+
+def test_main_virtual(capsys):
+    assert headless.main([MIXTURE, "--virtual", "--config", CONFIG]) == 0
+    assert "makespan: 690 s" in capsys.readouterr().out
+
+def test_declared_nodes(tmp_path, capsys):
+    path = declared_session(tmp_path / "declared.json")
+    assert headless.main([path, "--config", CONFIG]) == 0
+    out = capsys.readouterr().out
+    assert "Measure: DONE" in out and "Config" not in out
+
+def test_declared_nodes_need_the_config(tmp_path, capsys):
+    path = declared_session(tmp_path / "declared.json")
+    assert headless.main([path]) == 1
+    assert "nodes.test.MeasureNode" in capsys.readouterr().err
+
+def test_group_nodes_are_rejected_up_front(tmp_path):
+    path = declared_session(tmp_path / "foreach.json", {"foreach": {"type_": "builtins.ForEachNode", "name": "ForEach", "custom": {}}})
+    with open(CONFIG) as f:
+        graph = headless.HeadlessGraph(declarations=yaml.safe_load(f)["node"])
+    with pytest.raises(ValueError, match="ForEachNode"):
+        graph.load_session(path)
+    assert graph.all_nodes() == []  # Nothing created
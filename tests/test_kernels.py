@@ -0,0 +1,49 @@
+import numpy
+import pytest
+
+import headless
+from nodes import entity
+
+S, A = entity.Spread, entity.Array
+I, F = entity.Integer, entity.Float
+
+
+def token(value, traits):
+    return {"value": value, "traits": traits}
+
+CASES = [
+    ("builtins.AddNode", {"a": token([1, 2, 3], S[I]), "b": token(5, I)}),
+    ("builtins.AddNode", {"a": token([1, 2, 3], S[I]), "b": token([1.5, 2, 3], S[F])}),
+    ("builtins.AddNode", {"a": token([1, 2.5], S[F]), "b": token(1, I)}),
+    ("builtins.AddNode", {"a": token([2 ** 62, 1], S[I]), "b": token(2 ** 62, I)}),
+    ("builtins.AddNode", {"a": token([numpy.ones(3, numpy.float32)] * 2, S[A[F]]), "b": token(0.1, F)}),
+    ("builtins.AddNode", {"a": token([numpy.ones(3, numpy.int32)] * 2, S[A[I]]), "b": token(3, I)}),
+    ("builtins.AddNode", {"a": token([0.1, 0.2], S[F]), "b": token(numpy.ones(3, numpy.float32), A[F])}),
+    ("builtins.SubNode", {"a": token([1, 2], S[I]), "b": token(numpy.arange(4), A[I])}),
+    ("builtins.SubNode", {"a": token([numpy.float32(3), numpy.float32(4)], S[F]), "b": token(0.5, F)}),
+    ("builtins.MulNode", {"a": token([numpy.arange(4), numpy.ones(4)], S[A[F]]), "b": token(2.0, F)}),
+    ("builtins.MulNode", {"a": token([numpy.arange(4), numpy.arange(3)], S[A[I]]), "b": token(2, I)}),
+    ("builtins.MulNode", {"a": token([numpy.int64(3), numpy.int64(4)], S[I]), "b": token(2, I)}),
+    ("builtins.MulNode", {"a": token([3, 4], S[I]), "b": token(numpy.int64(2), I)}),
+    ("builtins.FullNode", {"size": token([3, 0, 2], S[I]), "fill_value": token(1.5, F)}),
+    ("builtins.FullNode", {"size": token(2, I), "fill_value": token([1, 2], S[I])}),
+    ("builtins.SumNode", {"a": token([numpy.arange(4), numpy.arange(4.)], S[A[F]])}),
+    ("builtins.SumNode", {"a": token([numpy.arange(4), numpy.arange(2)], S[A[I]])}),
+    ("builtins.SumNode", {"a": token([numpy.arange(4.), numpy.arange(2.)], S[A[F]])}),
+]
+
+@pytest.mark.parametrize("node_type, input_tokens", CASES)
+def test_vectorized_as_per_element(node_type, input_tokens, monkeypatch):
+    # _execute_batch yields the same values, types and dtypes as _execute element by element
+    node = headless.HeadlessGraph().create_node(node_type)
+    batch = node.execute(input_tokens)
+    monkeypatch.setattr(type(node), "_execute_batch", None)
+    loop = node.execute(input_tokens)
+    assert batch.keys() == loop.keys()
+    for name in loop:
+        assert batch[name]["traits"] == loop[name]["traits"]
+        assert len(batch[name]["value"]) == len(loop[name]["value"])
+        for x, y in zip(batch[name]["value"], loop[name]["value"]):
+            assert type(x) is type(y)
+            assert getattr(x, "dtype", None) == getattr(y, "dtype", None)
+            assert numpy.array_equal(x, y)
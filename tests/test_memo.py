@@ -0,0 +1,67 @@
+import pytest
+
+from nodes import kernels
+
+from sessions import new_graph, run
+
+
+def build(graph, length, tapped):
+    # A chain of AddNodes adding Step, but the tapped one adding Other
+    nodes = {}
+    for name, value in (("Source", 1), ("Step", 2), ("Other", 2)):
+        nodes[name] = graph.create_node("builtins.IntegerNode", name=name)
+        nodes[name].set_property("value", value)
+    previous = nodes["Source"]
+    for k in range(length):
+        add = graph.create_node("builtins.AddNode", name=f"Add{k}")
+        graph.connect(previous.get_output("value"), add.get_input("a"))
+        graph.connect(nodes["Other" if k == tapped else "Step"].get_output("value"), add.get_input("b"))
+        previous = add
+    display = graph.create_node("builtins.DisplayNode", name="Display")
+    graph.connect(previous.get_output("value"), display.get_input("in1"))
+    return nodes
+
+@pytest.mark.parametrize("options", [{}, {"max_workers": 4}])
+def test_only_nodes_downstream_of_a_change_execute(options, counted, displayed):
+    graph = new_graph(incremental=True, **options)
+    nodes = build(graph, 10, 6)
+    calls = counted(kernels.AddKernel)
+    try:
+        run(graph)
+        assert len(calls) == 10
+
+        del calls[:]
+        run(graph)
+        assert len(calls) == 0  # Nothing changed
+
+        nodes["Other"].set_property("value", 12)
+        run(graph)
+        assert sorted(calls) == ["Add6", "Add7", "Add8", "Add9"]
+
+        nodes["Other"].set_property("value", 2)
+        run(graph)
+    finally:
+        graph.simulator.shutdown()
+    assert displayed == [21, 21, 31, 21]
+
+def test_nondeterministic_nodes_execute_again(counted):
+    graph = new_graph(incremental=True)
+    size = graph.create_node("builtins.IntegerNode", name="Size")
+    size.set_property("value", 3)
+    uniform = graph.create_node("builtins.RandomUniformNode", name="Uniform")
+    graph.connect(size.get_output("value"), uniform.get_input("size"))
+    add = graph.create_node("builtins.AddNode", name="Add")
+    graph.connect(uniform.get_output("value"), add.get_input("a"))
+    graph.connect(uniform.get_output("value"), add.get_input("b"))
+    calls = counted(kernels.AddKernel)
+    run(graph)
+    run(graph)
+    assert len(calls) == 2  # Downstream of new random values
+
+def test_without_memo_every_node_executes(counted):
+    graph = new_graph()
+    build(graph, 5, 2)
+    calls = counted(kernels.AddKernel)
+    run(graph)
+    run(graph)
+    assert len(calls) == 10
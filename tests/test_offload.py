@@ -0,0 +1,67 @@
+import gc
+import os
+
+import numpy
+import pytest
+
+import offload
+
+from sessions import new_graph, run, spread
+
+
+def segments():
+    return set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+
+def test_pack_and_unpack():
+    large, small = numpy.arange(1 << 14, dtype=numpy.float64), numpy.arange(4)
+    created = []
+    packed = offload.pack({"large": large, "small": [small]}, created)
+    assert isinstance(packed["large"], offload.SharedArray) and packed["small"][0] is small
+    assert len(created) == 1
+    unpacked = offload.unpack(packed, owner=True)
+    assert numpy.array_equal(unpacked["large"], large) and not unpacked["large"].flags.writeable
+
+    again = []
+    assert offload.pack(unpacked["large"], again).name == created[0]  # Sent on by name
+    assert again == []
+    assert offload.pack(unpacked["large"], again, share=False).name != created[0]
+    offload.unlink(*again)
+    del unpacked
+    gc.collect()
+    assert created[0] not in segments()
+
+def arrays(graph, num):
+    # The sum of Tile(Linspace(num), 3) added to itself
+    size = graph.create_node("builtins.IntegerNode", name="Num")
+    size.set_property("value", num)
+    reps = graph.create_node("builtins.IntegerNode", name="Reps")
+    reps.set_property("value", 3)
+    linspace = graph.create_node("builtins.LinspaceNode", name="Linspace")
+    graph.connect(size.get_output("value"), linspace.get_input("num"))
+    tile = graph.create_node("builtins.TileNode", name="Tile")
+    graph.connect(linspace.get_output("value"), tile.get_input("a"))
+    graph.connect(reps.get_output("value"), tile.get_input("reps"))
+    add = graph.create_node("builtins.AddNode", name="Add")
+    graph.connect(tile.get_output("value"), add.get_input("a"))
+    graph.connect(tile.get_output("value"), add.get_input("b"))
+    total = graph.create_node("builtins.SumNode", name="Sum")
+    graph.connect(add.get_output("value"), total.get_input("a"))
+    display = graph.create_node("builtins.DisplayNode", name="Display")
+    graph.connect(total.get_output("value"), display.get_input("in1"))
+    return graph
+
+@pytest.mark.parametrize("build", [lambda graph: arrays(graph, 100000), lambda graph: spread(graph, 30)])
+def test_processes_as_in_process(build, displayed):
+    before = segments()
+    results = []
+    for options in ({}, {"processes": 2}, {"processes": 2, "incremental": True}):
+        graph = build(new_graph(**options))
+        statuses = run(graph, runs=2)
+        graph.simulator.shutdown()
+        assert set(statuses.values()) == {"DONE"}, options
+        results.append([numpy.asarray(value).tolist() for value in displayed])
+        del displayed[:]
+        del graph
+    assert results[0] == results[1] == results[2]
+    gc.collect()
+    assert segments() - before == set()  # Every segment unlinked
@@ -0,0 +1,92 @@
+import headless
+from plan import ExecutionPlan
+
+from sessions import MIXTURE, chain, new_graph
+
+
+def diamond():
+    graph = new_graph()
+    size = graph.create_node("builtins.IntegerNode", name="Size")
+    left = graph.create_node("builtins.FullNode", name="Left")
+    right = graph.create_node("builtins.FullNode", name="Right")
+    add = graph.create_node("builtins.AddNode", name="Add")
+    graph.connect(size.get_output("value"), left.get_input("size"))
+    graph.connect(size.get_output("value"), right.get_input("size"))
+    graph.connect(left.get_output("value"), add.get_input("a"))
+    graph.connect(right.get_output("value"), add.get_input("b"))
+    return graph
+
+def edges_of(graph):
+    # (producer name, output port, consumer name, input port) from the ports of the nodes
+    edges = set()
+    for node in graph.all_nodes():
+        for port in node.input_ports():
+            for another in port.connected_ports():
+                edges.add((another.node().name(), another.name(), node.name(), port.name()))
+    return edges
+
+def test_topological_order():
+    graph = headless.HeadlessGraph()
+    graph.load_session(MIXTURE)
+    plan = ExecutionPlan(graph.all_nodes())
+    assert sorted(node.name() for node in plan.nodes) == sorted(node.name() for node in graph.all_nodes())
+    for i in range(len(plan)):
+        for _, v, _ in plan.successors(i):
+            assert v > i
+
+def test_csr_matches_the_connections():
+    for graph in (diamond(), chain(new_graph(), 5)):
+        plan = ExecutionPlan(graph.all_nodes())
+        successors = {
+            (plan.nodes[i].name(), plan.output_names[i][j], plan.nodes[v].name(), plan.input_names[v][k])
+            for i in range(len(plan)) for j, v, k in plan.successors(i)
+        }
+        predecessors = {
+            (plan.nodes[u].name(), plan.output_names[u][j], plan.nodes[i].name(), plan.input_names[i][k])
+            for i in range(len(plan)) for k, u, j in plan.predecessors(i)
+        }
+        assert successors == predecessors == edges_of(graph)
+
+def test_ports():
+    plan = ExecutionPlan(diamond().all_nodes())
+    seen = set()
+    for i in range(len(plan)):
+        for k in range(len(plan.input_names[i])):
+            seen.add(plan.input_port(i, k))
+        for j in range(len(plan.output_names[i])):
+            port = plan.output_port(i, j)
+            seen.add(port)
+            consumers = {(plan.nodes[v].name(), port) for v, port in plan.consumers_of(port)}
+            expected = {(plan.nodes[v].name(), plan.input_port(v, k)) for j2, v, k in plan.successors(i) if j2 == j}
+            assert consumers == expected
+    assert seen == set(range(plan.num_ports))
+
+def test_optional_ports():
+    plan = ExecutionPlan(diamond().all_nodes())
+    full = plan.index("Left")
+    k = plan.input_names[full].index("fill_value")
+    assert plan.optional_masks[full] == 1 << k  # Disconnected
+    assert plan.num_required[full] == len(plan.input_names[full]) - 1
+    assert plan.num_required[plan.index("Size")] == 0
+
+def test_plan_is_cached_until_edited():
+    graph = chain(new_graph(), 3)
+    plan = graph.execution_plan()
+    assert graph.execution_plan() is plan
+    node = graph.create_node("builtins.IntegerNode", name="Another")
+    replanned = graph.execution_plan()
+    assert replanned is not plan and node in replanned.nodes
+    assert graph.execution_plan() is replanned
+    group = graph.create_node("builtins.GroupNode", name="Group")
+    grouped = graph.execution_plan()
+    group.set_property("ninputs", 3)
+    group.on_value_changed(3)  # Adds ports
+    assert graph.execution_plan() is not grouped
+
+def test_bottom_levels_and_critical_path():
+    plan = ExecutionPlan(chain(new_graph(), 3).all_nodes())
+    levels = plan.bottom_levels([0.5 if node.name() == "Step" else 1.0 for node in plan.nodes])
+    assert levels[plan.index("Source")] == 5.0  # Source, three AddNodes and Display
+    assert levels[plan.index("Step")] == 4.5
+    assert levels[plan.index("Display")] == 1.0
+    assert [plan.nodes[i].name() for i in plan.critical_path(levels)] == ["Source", "Add0", "Add1", "Add2", "Display"]
@@ -0,0 +1,37 @@
+import yaml
+
+import headless
+from nodes.control import AsyncExperiments, AsyncDummyServer
+from simulator import Simulator
+
+from sessions import CONFIG, MIXTURE
+
+
+def test_executions_in_flight_survive_a_new_plan():
+    # A node added while instrument requests are in flight rebuilds the
+    # plan, and the nodes executing get their outputs through the new one
+    with open(CONFIG) as f:
+        model = yaml.safe_load(f)["model"]
+    server = AsyncExperiments(AsyncDummyServer(0.2), model["station"])
+    server.start()
+    try:
+        graph = headless.HeadlessGraph(Simulator(server=server, max_workers=2))
+        graph.load_session(MIXTURE)
+        headless.reset_session(graph)
+        assert headless.verify_session(graph)
+        headless.run_session(graph)
+        graph.simulator.process_completions()
+        running = [node.name() for node in graph.all_nodes() if node.get_node_status().name == "RUNNING"]
+        assert len(running) > 0
+
+        extra = graph.create_node("builtins.IntegerNode", name="Extra")
+        extra.set_property("value", 1)
+        assert extra.check()
+        headless.run_session(graph)  # As the editor does for a new node
+        graph.simulator.wait()
+        statuses = {node.name(): node.get_node_status().name for node in graph.all_nodes()}
+        assert set(statuses.values()) == {"DONE"}, statuses
+        assert graph.simulator.num_executing() == 0
+    finally:
+        graph.simulator.shutdown()
+        server.stop()
@@ -0,0 +1,124 @@
+import threading
+
+import pytest
+
+import headless
+from simulator import Simulator
+
+from sessions import MIXTURE, chain, new_graph, run
+
+
+@pytest.mark.parametrize("options", [{}, {"max_workers": 3}, {"capacity": 1}, {"max_workers": 3, "capacity": 1}])
+def test_mixture_runs_to_the_end(options):
+    graph = headless.HeadlessGraph(Simulator(**options))
+    graph.load_session(MIXTURE)
+    statuses = run(graph, runs=2)
+    graph.simulator.shutdown()
+    assert set(statuses.values()) == {"DONE"}, statuses
+    assert graph.simulator.num_executing() == 0
+    assert graph.simulator.num_ready() == 0
+
+@pytest.mark.parametrize("options", [{}, {"max_workers": 4}])
+def test_chain(options, displayed):
+    graph = chain(new_graph(**options), 20)
+    statuses = run(graph)
+    graph.simulator.shutdown()
+    assert set(statuses.values()) == {"DONE"}
+    assert displayed == [1 + 2 * 20]
+
+@pytest.mark.parametrize("options", [{}, {"max_workers": 4}, {"max_workers": 4, "capacity": 1}])
+def test_runs_are_pipelined_in_order(options, displayed, counted):
+    from nodes import kernels
+    calls = counted(kernels.AddKernel)
+    graph = chain(new_graph(**options), 10)
+    run(graph, runs=3)
+    graph.simulator.shutdown()
+    assert displayed == [21, 21, 21]
+    assert len(calls) == 30
+    assert graph.simulator.num_tokens() == 0
+
+def test_rerun_after_done(displayed):
+    graph = chain(new_graph(), 5)
+    run(graph)
+    for node in graph.all_nodes():
+        if node.name() == "Source":
+            node.set_property("value", 10)
+    run(graph)
+    assert displayed == [11, 20]
+
+def test_error_stops_downstream(monkeypatch):
+    from nodes import kernels
+
+    def failing(self, input_tokens):
+        raise ValueError("failed")
+
+    graph = chain(new_graph(), 5)
+    monkeypatch.setattr(kernels.AddKernel, "_execute", failing)
+    monkeypatch.setattr(kernels.AddKernel, "_execute_batch", None)
+    statuses = run(graph)
+    assert statuses["Add0"] == "ERROR"
+    assert statuses["Display"] == "WAITING"
+    assert graph.simulator.num_executing() == 0
+
+def branches(graph):
+    # Source feeding Short, and a chain of Long0, Long1 and Long2
+    source = graph.create_node("builtins.IntegerNode", name="Source")
+    source.set_property("value", 1)
+    short = graph.create_node("builtins.AddNode", name="Short")
+    graph.connect(source.get_output("value"), short.get_input("a"))
+    graph.connect(source.get_output("value"), short.get_input("b"))
+    previous = source
+    for k in range(3):
+        add = graph.create_node("builtins.AddNode", name=f"Long{k}")
+        graph.connect(previous.get_output("value"), add.get_input("a"))
+        graph.connect(source.get_output("value"), add.get_input("b"))
+        previous = add
+    return graph
+
+def test_critical_path():
+    graph = branches(new_graph())
+    simulator = Simulator(cost=lambda node: 1.0)
+    path, length = simulator.critical_path(graph.execution_plan())
+    assert [node.name() for node in path] == ["Source", "Long0", "Long1", "Long2"]
+    assert length == 4.0
+
+@pytest.mark.parametrize("cost, first", [(None, "Long0"), (lambda node: 10.0 if node.name() == "Short" else 1.0, "Short")])
+def test_critical_path_first(cost, first, counted):
+    # Of the nodes ready together, the one heading the longest path by the cost estimates is dispatched first
+    from nodes import kernels
+    calls = counted(kernels.AddKernel)
+    graph = branches(new_graph(cost=cost))
+    assert set(run(graph).values()) == {"DONE"}
+    assert calls[0] == first
+
+def test_independent_nodes_execute_in_parallel(monkeypatch):
+    from nodes import kernels
+    threads = {}
+    _execute = kernels.AddKernel._execute
+    barrier = threading.Barrier(4, timeout=5)
+
+    def waiting(self, input_tokens):
+        threads[self.name()] = threading.current_thread()
+        barrier.wait()  # Broken unless the four execute at the same time
+        return _execute(self, input_tokens)
+
+    def showing(self, input_tokens):
+        threads[self.name()] = threading.current_thread()
+        return {}
+
+    monkeypatch.setattr(kernels.AddKernel, "_execute", waiting)
+    monkeypatch.setattr(kernels.DisplayKernel, "_execute", showing)
+    graph = new_graph(max_workers=4)
+    source = graph.create_node("builtins.IntegerNode", name="Source")
+    source.set_property("value", 1)
+    for k in range(4):
+        add = graph.create_node("builtins.AddNode", name=f"Add{k}")
+        graph.connect(source.get_output("value"), add.get_input("a"))
+        graph.connect(source.get_output("value"), add.get_input("b"))
+        display = graph.create_node("builtins.DisplayNode", name=f"Display{k}")
+        graph.connect(add.get_output("value"), display.get_input("in1"))
+    statuses = run(graph)
+    graph.simulator.shutdown()
+    assert set(statuses.values()) == {"DONE"}
+    assert len({threads[f"Add{k}"] for k in range(4)}) == 4
+    assert all(threads[f"Display{k}"] is threading.main_thread() for k in range(4))  # CONCURRENCY = 0
@@ -0,0 +1,57 @@
+import pytest
+
+from nodes.control import StationAllocator
+
+
+def requests(allocator, owners, class_name="X"):
+    # Requests in the order given, and the owners in the order they are granted
+    granted = []
+    made = [allocator.request(class_name, lambda station, owner=owner: granted.append(owner), owner=owner) for owner in owners]
+    return made, granted
+
+def test_capacity():
+    allocator = StationAllocator({"s": ["X"]}, {"s": 2})
+    made, granted = requests(allocator, ["a", "a", "a"])
+    assert granted == ["a", "a"] and allocator.in_use("s") == 2 and allocator.waiting("s") == 1
+    allocator.release("s")
+    assert granted == ["a", "a", "a"] and allocator.waiting("s") == 0
+
+def test_owners_take_turns():
+    allocator = StationAllocator({"s": ["X"]})
+    made, granted = requests(allocator, ["a", "a", "a", "b", "b"])
+    for _ in range(4):
+        allocator.release("s")
+    assert granted == ["a", "b", "a", "b", "a"]
+
+def test_priority():
+    allocator = StationAllocator({"s": ["X"]})
+    allocator.set_priority("b", 1)
+    made, granted = requests(allocator, ["a", "a", "b"])
+    allocator.release("s")
+    assert granted == ["a", "b"]
+
+def test_least_loaded_and_disabled():
+    allocator = StationAllocator({"s": ["X"], "t": ["X"]})
+    allocator.set_enabled("t", False)
+    made, granted = requests(allocator, ["a", "a"])
+    assert [request.station for request in made] == ["s", None]
+    allocator.set_enabled("t")
+    assert [request.station for request in made] == ["s", "t"]
+
+def test_cancel():
+    allocator = StationAllocator({"s": ["X"]})
+    made, granted = requests(allocator, ["a", "b"])
+    assert not allocator.cancel(made[0])  # Granted: to be released
+    assert allocator.cancel(made[1])
+    allocator.release("s")
+    assert granted == ["a"] and allocator.in_use("s") == 0
+
+def test_unlisted_classes_need_no_station():
+    allocator = StationAllocator({"s": ["X"]})
+    made, granted = requests(allocator, ["a"], class_name="Y")
+    assert made == [None] and granted == ["a"]
+
+@pytest.mark.parametrize("capacity", [0, -1])
+def test_capacity_below_one(capacity):
+    with pytest.raises(ValueError, match="station4"):
+        StationAllocator({"station4": ["X"]}, {"station4": capacity})
@@ -0,0 +1,105 @@
+import pickle
+
+import pytest
+
+import headless
+from nodes import kernels
+from nodes.core import NodeStatusEnum
+from nodes.stream import Stream, StreamSource
+
+from sessions import new_graph, run, spread
+
+
+def doubled(graph):
+    # Spread: Mul by Factor twice, i.e. 4.0 * k
+    mul = next(node for node in graph.all_nodes() if node.name() == "Mul")
+    display = next(node for node in graph.all_nodes() if node.name() == "Display")
+    factor = next(node for node in graph.all_nodes() if node.name() == "Factor")
+    for port in display.get_input("in1").connected_ports():
+        port.disconnect_from(display.get_input("in1"))
+    mul2 = graph.create_node("builtins.MulNode", name="Mul2")
+    graph.connect(mul.get_output("value"), mul2.get_input("a"))
+    graph.connect(factor.get_output("value"), mul2.get_input("b"))
+    graph.connect(mul2.get_output("value"), display.get_input("in1"))
+    return graph
+
+@pytest.mark.parametrize("options", [{}, {"stream": 2}, {"stream": 200}, {"stream": 2, "max_workers": 3}, {"stream": 2, "incremental": True}])
+def test_streamed_as_list(options, displayed):
+    graph = doubled(spread(new_graph(**options), 50))
+    statuses = run(graph)
+    graph.simulator.shutdown()
+    assert set(statuses.values()) == {"DONE"}
+    assert [list(value) for value in displayed] == [[4.0 * k for k in range(50)]]
+
+def test_streams_are_returned(monkeypatch):
+    graph = doubled(spread(new_graph(stream=2), 50))
+    mul = next(node for node in graph.all_nodes() if node.name() == "Mul")
+    outputs = []
+    execute = type(mul).execute
+
+    def recording(self, input_tokens, **options):
+        output_tokens = execute(self, input_tokens, **options)
+        outputs.append(output_tokens["value"]["value"])
+        return output_tokens
+
+    monkeypatch.setattr(type(mul), "execute", recording)
+    run(graph)
+    assert len(outputs) == 2 and all(isinstance(value, Stream) for value in outputs)
+
+def failing(options):
+    # FullNode fails on the last element of the Spread, after it is DONE if streamed
+    graph = new_graph(**options)
+    group = graph.create_node("builtins.GroupNode", name="Group")
+    group.set_property("ninputs", 71)
+    group.on_value_changed(71)
+    for k in range(71):
+        source = graph.create_node("builtins.IntegerNode", name=f"I{k}")
+        source.set_property("value", 2 if k < 70 else -1)
+        graph.connect(source.get_output("value"), group.get_input(f"in{k + 1}"))
+    full = graph.create_node("builtins.FullNode", name="Full")
+    graph.connect(group.get_output("value"), full.get_input("size"))
+    total = graph.create_node("builtins.SumNode", name="Sum")
+    graph.connect(full.get_output("value"), total.get_input("a"))
+    display = graph.create_node("builtins.DisplayNode", name="Display")
+    graph.connect(total.get_output("value"), display.get_input("in1"))
+    return graph
+
+@pytest.mark.parametrize("options, downstream", [
+    ({}, "WAITING"), ({"stream": 200}, "WAITING"),
+    ({"stream": 2}, "ERROR"), ({"stream": 2, "max_workers": 3}, "ERROR"), ({"stream": 2, "incremental": True}, "ERROR"),
+])
+def test_errors(options, downstream):
+    # Streamed, the error is raised to the reader, and the nodes streaming it on are set ERROR as well
+    graph = failing(options)
+    statuses = run(graph)
+    graph.simulator.shutdown()
+    assert statuses["Group"] == "DONE"
+    assert statuses["Full"] == "ERROR"
+    assert statuses["Sum"] == downstream and statuses["Display"] == downstream
+    assert graph.simulator.num_executing() == 0
+
+def test_checkpoint_keeps_streams_lazy(monkeypatch, counted, displayed):
+    # A Stream is checkpointed as what it is computed from, and computed again after resuming
+    monkeypatch.setattr(kernels.MulKernel, "_execute_batch", None)  # Counted element by element
+    calls = counted(kernels.MulKernel)
+    graph = doubled(spread(new_graph(stream=2), 50))
+    display = next(node for node in graph.all_nodes() if node.name() == "Display")
+    headless.reset_session(graph)
+    assert headless.verify_session(graph)
+    display.set_node_status(NodeStatusEnum.ERROR)  # Not in the run: the Stream stays at Mul2
+    headless.run_session(graph)
+    graph.simulator.wait()
+    computed = len(calls)
+    assert computed < 50
+
+    state = pickle.loads(pickle.dumps(graph.simulator.checkpoint()))
+    assert len(calls) == computed  # Nothing computed to checkpoint
+    tokens = state["graphs"][0]["tokens"][("Mul2", "out", "value")]
+    assert [type(token["value"]) for token in tokens] == [StreamSource]
+
+    state["graphs"][0]["nodes"]["Display"]["status"] = NodeStatusEnum.WAITING.value
+    graph.simulator.resume(graph.execution_plan(), id(graph), state)
+    graph.simulator.wait()
+    assert display.get_node_status() == NodeStatusEnum.DONE
+    assert [list(value) for value in displayed] == [[4.0 * k for k in range(50)]]
+    assert len(calls) == computed + 100  # Both Streams from the first element
@@ -0,0 +1,88 @@
+import numpy
+import pytest
+
+import simulator
+from token_store import Token, TokenStore
+
+from sessions import chain, new_graph, run
+
+
+def test_fifo():
+    store = TokenStore(3)
+    for value in range(4):
+        store.push(1, {"value": value, "traits": None})
+    assert store.count(0) == 0 and store.count(1) == 4 and len(store) == 4
+    assert [token["value"] for token in store.tokens(1)] == [0, 1, 2, 3]
+    assert [store.pop(1)["value"] for _ in range(3)] == [0, 1, 2]
+    assert store.count(1) == 1 and len(store) == 1
+    store.push(1, {"value": 4, "traits": None})
+    assert [token["value"] for token in store.tokens(1)] == [3, 4]
+    assert list(store.ports()) == [1]
+
+def test_take_and_put():
+    store, another = TokenStore(2), TokenStore(5)
+    store.push(0, {"value": 1, "traits": None})
+    store.push(0, {"value": 2, "traits": None})
+    another.put(4, store.take(0))
+    assert store.count(0) == 0 and len(store) == 0
+    assert another.count(4) == 2 and len(another) == 2
+    assert another.pop(4)["value"] == 1
+    another.clear(4)
+    assert len(another) == 0 and list(another.ports()) == []
+
+def test_token_is_immutable():
+    token = Token.of({"value": numpy.arange(3), "traits": int})
+    assert token["traits"] is int and token.get("missing", 0) == 0 and Token.of(token) is token
+    with pytest.raises(ValueError):
+        token["value"][0] = 1
+
+@pytest.mark.parametrize("options", [{"capacity": 1}, {"capacity": 2, "max_workers": 3}])
+def test_capacity_bounds_input_ports(options, monkeypatch, displayed):
+    # Producers wait for room at the ports they feed, so that no input port
+    # queues more tokens than the capacity however many runs are pipelined
+    stores = []
+
+    class RecordingStore(TokenStore):
+
+        def __init__(self, num_ports):
+            super(RecordingStore, self).__init__(num_ports)
+            self.max_counts = [0] * num_ports
+            stores.append(self)
+
+        def push(self, port, token):
+            super(RecordingStore, self).push(port, token)
+            self.max_counts[port] = max(self.max_counts[port], self.count(port))
+
+    monkeypatch.setattr(simulator, "TokenStore", RecordingStore)
+    graph = chain(new_graph(**options), 6)
+    statuses = run(graph, runs=5)
+    graph.simulator.shutdown()
+    assert set(statuses.values()) == {"DONE"}
+    assert displayed == [13] * 5
+    plan = graph.execution_plan()
+    inputs = range(plan.input_offsets[0], plan.output_offsets[0])
+    assert len(stores) == 1
+    assert max(stores[0].max_counts[port] for port in inputs) == options["capacity"]
+
+def test_unbounded_queues(displayed):
+    # Without a capacity, the tokens of every run pile up at once
+    graph = chain(new_graph(), 2)
+    statuses = run(graph, runs=4)
+    assert set(statuses.values()) == {"DONE"}
+    assert displayed == [5] * 4
+
+@pytest.mark.parametrize("options", [{}, {"max_workers": 2}])
+def test_consumers_share_read_only_values(options, displayed):
+    graph = new_graph(**options)
+    num = graph.create_node("builtins.IntegerNode", name="Num")
+    num.set_property("value", 5)
+    linspace = graph.create_node("builtins.LinspaceNode", name="Linspace")
+    graph.connect(num.get_output("value"), linspace.get_input("num"))
+    for k in range(2):
+        display = graph.create_node("builtins.DisplayNode", name=f"Display{k}")
+        graph.connect(linspace.get_output("value"), display.get_input("in1"))
+    run(graph)
+    graph.simulator.shutdown()
+    assert len(displayed) == 2 and displayed[0] is displayed[1]  # Not copied
+    with pytest.raises(ValueError):
+        displayed[0][0] = 1.0
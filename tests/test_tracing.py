@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+from tracing import Tracer
+
+from sessions import chain, new_graph, run
+
+
+@pytest.mark.parametrize("options", [{}, {"max_workers": 2}, {"processes": 2}, {"incremental": True}])
+def test_trace(options, tmp_path):
+    tracer = Tracer()
+    graph = chain(new_graph(tracer=tracer, **options), 3)
+    run(graph)
+    run(graph)
+    graph.simulator.shutdown()
+    path = str(tmp_path / "trace.json")
+    tracer.save(path)
+    with open(path) as f:
+        events = json.load(f)["traceEvents"]
+
+    executed = [event["name"] for event in events if event.get("cat") == "execute" and event["ph"] in ("X", "b")]
+    reused = [event["name"] for event in events if event.get("cat") == "reuse"]
+    for name in ("Add0", "Add1", "Add2"):
+        assert executed.count(name) + reused.count(name) == 2, name
+    if options.get("incremental"):
+        assert sorted(reused) == ["Add0", "Add1", "Add2"]  # In the second run
+    assert all(event["dur"] >= 0 for event in events if event["ph"] == "X")
+    assert any(event["ph"] == "C" and event["name"] == "scheduler" for event in events)
+    assert any(event.get("cat") == "fetch" and event["name"] == "Add2" for event in events)
@@ -0,0 +1,41 @@
+import headless
+from nodes import entity
+from nodes.core import evaluate_traits
+
+from sessions import chain, new_graph
+
+
+def test_evaluate_traits():
+    assert evaluate_traits("upper(a, b)", {"a": entity.Integer, "b": entity.Float}) == (entity.Float, False)
+    assert evaluate_traits("upper(a, b)", {"a": entity.Integer, "b": entity.Integer}) == (entity.Integer, False)
+    assert evaluate_traits("Array[Float]") == (entity.Array[entity.Float], True)
+    assert evaluate_traits("in1", {"in1": entity.Spread[entity.Integer]}) == (entity.Spread[entity.Integer], False)
+
+def test_equal_expressions_give_the_same_traits():
+    # Interned, so that the identity caches of entity hit
+    one, _ = evaluate_traits("Integer | Array[Float]")
+    another, _ = evaluate_traits("Integer | Array[Float]")
+    assert one is another
+
+def test_traits_follow_the_connections():
+    graph = chain(new_graph(), 10)
+    source = next(node for node in graph.all_nodes() if node.name() == "Source")
+    first = next(node for node in graph.all_nodes() if node.name() == "Add0")
+    last = next(node for node in graph.all_nodes() if node.name() == "Add9")
+    assert last.get_output_port_traits("value") is entity.Integer
+
+    factor = graph.create_node("builtins.FloatNode", name="Factor")
+    first.get_input("a").disconnect_from(source.get_output("value"))
+    graph.connect(factor.get_output("value"), first.get_input("a"))
+    assert last.get_output_port_traits("value") is entity.Float  # Down the chain
+
+    first.get_input("a").disconnect_from(factor.get_output("value"))
+    graph.connect(source.get_output("value"), first.get_input("a"))
+    assert last.get_output_port_traits("value") is entity.Integer
+    assert headless.verify_session(graph)
+
+def test_long_chains():
+    # Resolved without recursing node by node
+    graph = chain(new_graph(), 5000)
+    last = next(node for node in graph.all_nodes() if node.name() == "Add4999")
+    assert last.get_output_port_traits("value") is entity.Integer
@@ -0,0 +1,76 @@
+import yaml
+
+import headless
+from simulator import Simulator
+from virtual_time import DurationModel, VirtualClock
+
+from sessions import CONFIG, MIXTURE, run
+
+
+class Measure:
+    pass
+
+def clock_of(stations=("s", "t"), capacity=1):
+    # Measure takes 10 s on s and 20 s on t
+    return VirtualClock(DurationModel({
+        "station": {station: ["Measure"] for station in stations},
+        "capacity": {"s": capacity},
+        "duration": {"Measure": {"default": 10, "t": 20}},
+    }))
+
+def completions(clock):
+    times = []
+    while clock.advance():
+        times.append(clock.now)
+    return times
+
+def test_durations_by_station():
+    model = clock_of().model
+    assert model.duration("Measure") == 10.0 and model.duration("Measure", "t") == 20.0
+    assert model.duration("Unknown") == 0.0 and not model.has_duration("Unknown")
+    assert model.estimate(Measure()) == 10.0  # The fastest station
+
+def test_a_station_queues_executions():
+    clock = clock_of(stations=("s", ))
+    futures = [clock.submit(Measure(), 1, lambda k=k: k) for k in range(3)]
+    assert completions(clock) == [10.0, 20.0, 30.0]
+    assert [future.result() for future in futures] == [0, 1, 2]
+    report = clock.report()
+    assert report["makespan"] == 30.0
+    assert report["stations"]["s"]["executions"] == 3 and report["stations"]["s"]["max_queueing_delay"] == 20.0
+
+def test_free_stations_first():
+    clock = clock_of()
+    clock.submit(Measure(), 1, lambda: None)
+    clock.submit(Measure(), 1, lambda: None)  # t is free, though slower
+    assert completions(clock) == [10.0, 20.0]
+
+def test_capacity_and_spreads():
+    clock = clock_of(stations=("s", ), capacity=2)
+    clock.submit(Measure(), 1, lambda: None)
+    clock.submit(Measure(), 3, lambda: None)  # Expands a Spread of 3, at the same time
+    assert completions(clock) == [10.0, 30.0]
+
+def test_errors_complete_in_virtual_time():
+    clock = clock_of()
+
+    def failing():
+        raise ValueError("failed")
+
+    future = clock.submit(Measure(), 1, failing)
+    assert not future.done()
+    clock.advance()
+    assert isinstance(future.exception(), ValueError) and clock.now == 10.0
+
+def test_mixture_makespan():
+    with open(CONFIG) as f:
+        model = DurationModel(yaml.safe_load(f)["model"])
+    makespans = []
+    for runs in (1, 3):
+        clock = VirtualClock(model)
+        graph = headless.HeadlessGraph(Simulator(clock=clock, cost=model.estimate))
+        graph.load_session(MIXTURE)
+        assert set(run(graph, runs).values()) == {"DONE"}
+        makespans.append(clock.report()["makespan"])
+    assert makespans[0] == 690.0
+    assert makespans[0] < makespans[1] < 3 * makespans[0]  # Pipelined on the stations
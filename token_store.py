@@ -0,0 +1,191 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from collections import deque
+import hashlib
+import sys
+
+import numpy
+
+from nodes.stream import Stream
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+def freeze(value):
+    # Makes arrays read-only, so that a value can be shared by any number of
+    # consumers without being copied
+    if isinstance(value, numpy.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            freeze(item)
+    elif isinstance(value, Stream):
+        value.set_finalizer(freeze)  # The elements, as they are computed
+    return value
+
+def digest(value, h=None):
+    # Content hash of a value, for fingerprints of tokens
+    top = h is None
+    if top:
+        h = hashlib.blake2b(digest_size=16)
+    h.update(type(value).__name__.encode())
+    if isinstance(value, numpy.ndarray) and not value.dtype.hasobject:
+        h.update(f"{value.dtype}{value.shape}".encode())
+        h.update(numpy.ascontiguousarray(value).data)
+    elif isinstance(value, (list, tuple, Stream)):
+        h.update(str(len(value)).encode())
+        for item in value:
+            digest(item, h)
+    elif isinstance(value, dict):
+        h.update(str(len(value)).encode())
+        for key in sorted(value, key=repr):
+            digest(key, h)
+            digest(value[key], h)
+    else:
+        h.update(repr(value).encode())
+    return h.digest() if top else None
+
+def fingerprint(token):
+    # Computed once per token, which is immutable
+    if token.fingerprint is None:
+        token.fingerprint = digest((token.value, repr(token.traits)))
+    return token.fingerprint
+
+class Token:
+    """A value with its traits.
+
+    Nodes read it as dict(value=..., traits=...), i.e. token["value"] and
+    token["traits"], while it takes a fraction of the memory of a dict.
+    Tokens are immutable and their arrays are read-only (see freeze), so
+    nodes pass them on as they are. Modifying one in place raises
+    ValueError: a node computes a new array, or modifies a copy.
+    """
+
+    __slots__ = ("value", "traits", "fingerprint")
+
+    def __init__(self, value, traits, fingerprint=None):
+        self.value = value
+        self.traits = traits
+        self.fingerprint = fingerprint  # See fingerprint()
+
+    @classmethod
+    def of(cls, token, fingerprint=None):
+        if isinstance(token, Token):
+            return token
+        return cls(freeze(token["value"]), token["traits"], fingerprint)
+
+    def __getitem__(self, key):
+        if key == "value":
+            return self.value
+        elif key == "traits":
+            return self.traits
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in ("value", "traits")
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def keys(self):
+        return ("value", "traits")
+
+    def copy(self):
+        return self  # Immutable
+
+    def __repr__(self):
+        return repr(dict(value=self.value, traits=self.traits))
+
+class TokenStore:
+    """FIFOs of tokens indexed by the port ids of an ExecutionPlan.
+
+    An entry is None when the port has no token, the token itself when it
+    has one, and a deque only when tokens pile up.
+    """
+
+    __slots__ = ("__queues", "__num_tokens")
+
+    def __init__(self, num_ports):
+        self.__queues = [None] * num_ports
+        self.__num_tokens = 0
+
+    def __len__(self):
+        return self.__num_tokens
+
+    def count(self, port):
+        queue = self.__queues[port]
+        if queue is None:
+            return 0
+        elif type(queue) is deque:
+            return len(queue)
+        return 1
+
+    def push(self, port, token):
+        queue = self.__queues[port]
+        if queue is None:
+            self.__queues[port] = token
+        elif type(queue) is deque:
+            queue.append(token)
+        else:
+            self.__queues[port] = deque((queue, token))
+        self.__num_tokens += 1
+
+    def pop(self, port):
+        queue = self.__queues[port]
+        assert queue is not None, port
+        self.__num_tokens -= 1
+        if type(queue) is not deque:
+            self.__queues[port] = None
+            return queue
+        token = queue.popleft()
+        if len(queue) == 1:
+            self.__queues[port] = queue[0]
+        return token
+
+    def tokens(self, port):
+        queue = self.__queues[port]
+        if queue is None:
+            return ()
+        elif type(queue) is deque:
+            return tuple(queue)
+        return (queue, )
+
+    def clear(self, port):
+        self.__num_tokens -= self.count(port)
+        self.__queues[port] = None
+
+    def take(self, port):
+        # Removes the FIFO of the port as is, for put() into another store
+        queue = self.__queues[port]
+        self.clear(port)
+        return queue
+
+    def put(self, port, queue):
+        assert self.__queues[port] is None, port
+        self.__queues[port] = queue
+        self.__num_tokens += self.count(port)
+
+    def ports(self):
+        return (port for port, queue in enumerate(self.__queues) if queue is not None)
+
+    def memory_stats(self):
+        # Bytes held by the store and its tokens, not by the values
+        queues = [queue for queue in self.__queues if type(queue) is deque]
+        tokens = {
+            id(token): token
+            for queue in self.__queues if queue is not None
+            for token in (queue if type(queue) is deque else (queue, ))
+        }
+        return {
+            "ports": len(self.__queues),
+            "tokens": self.__num_tokens,
+            "unique_tokens": len(tokens),
+            "queues": len(queues),
+            "bytes": (
+                sys.getsizeof(self.__queues)
+                + sum(sys.getsizeof(queue) for queue in queues)
+                + sum(sys.getsizeof(token) for token in tokens.values())
+            ),
+        }
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# Events of the simulator in the Chrome trace format, for chrome://tracing
+# or https://ui.perfetto.dev. The simulator calls a Tracer only when given
+# one, so tracing costs nothing but a test of None when it is off.
+
+
+def nbytes(value):
+    # Approximate size of a token value
+    if isinstance(value, numpy.ndarray):
+        return value.nbytes
+    elif isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+class Tracer:
+
+    def __init__(self):
+        self.__events = []  # list.append is atomic. Worker threads add events as well
+        self.__threads = {}  # tid -> thread name
+        self.__origin = time.perf_counter_ns()
+        self.__pid = os.getpid()
+
+    def now(self):
+        # Microseconds, the unit of the format
+        return (time.perf_counter_ns() - self.__origin) / 1000
+
+    def __tid(self):
+        tid = threading.get_ident()
+        if tid not in self.__threads:
+            self.__threads[tid] = threading.current_thread().name
+        return tid
+
+    def complete(self, name, cat, start, args=None):
+        # A span from start to now
+        event = {"name": name, "cat": cat, "ph": "X", "ts": start, "dur": self.now() - start, "pid": self.__pid, "tid": self.__tid()}
+        if args is not None:
+            event["args"] = args
+        self.__events.append(event)
+
+    def async_span(self, name, cat, start, id, args=None):
+        # A span from start to now, which may overlap the others on the thread
+        id = str(hash(id))
+        begin = {"name": name, "cat": cat, "ph": "b", "id": id, "ts": start, "pid": self.__pid, "tid": self.__tid()}
+        if args is not None:
+            begin["args"] = args
+        self.__events.append(begin)
+        self.__events.append({"name": name, "cat": cat, "ph": "e", "id": id, "ts": self.now(), "pid": self.__pid, "tid": self.__tid()})
+
+    def instant(self, name, cat, args=None):
+        event = {"name": name, "cat": cat, "ph": "i", "s": "t", "ts": self.now(), "pid": self.__pid, "tid": self.__tid()}
+        if args is not None:
+            event["args"] = args
+        self.__events.append(event)
+
+    def counter(self, name, values):
+        self.__events.append({"name": name, "ph": "C", "ts": self.now(), "pid": self.__pid, "args": values})
+
+    def events(self):
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": self.__pid, "tid": tid, "args": {"name": name}}
+            for tid, name in list(self.__threads.items())
+        ]
+        return metadata + list(self.__events)
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events(), "displayTimeUnit": "ms"}, f, default=str)
+        logger.info('trace %s: %d events', path, len(self.__events))
+
+    def clear(self):
+        self.__events = []
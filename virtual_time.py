@@ -0,0 +1,167 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from concurrent.futures import Future
+import heapq
+import itertools
+
+from nodes.control import StationAllocator
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# Discrete-event simulation of a protocol on the line. Nodes execute at
+# once, but their outputs are released at the virtual time they would be
+# done, given the durations in config.yaml and the stations they occupy:
+#
+# model:
+#   station:
+#     station4: [DispenseLiquid96WellsNode]
+#   capacity:
+#     station4: 2
+#   duration:  # seconds per execution, by node class, optionally by station
+#     ServeNode: 30
+#     DispenseLiquid96WellsNode: {default: 120, station4: 90}
+#
+# An execution expanding a Spread takes the duration once per element.
+
+
+class DurationModel:
+
+    def __init__(self, model):
+        # model: the model section of config.yaml
+        self.stations = StationAllocator(model.get('station', {}), model.get('capacity'))
+        self.__durations = {}  # node class name -> {station or "default": seconds}
+        for class_name, value in model.get('duration', {}).items():
+            self.__durations[class_name] = dict(value) if isinstance(value, dict) else {"default": value}
+
+    def stations_of(self, class_name):
+        return self.stations.candidates(class_name)
+
+    def capacity(self, station):
+        return self.stations.capacity(station)
+
+    def has_duration(self, class_name):
+        return class_name in self.__durations
+
+    def duration(self, class_name, station=None):
+        durations = self.__durations.get(class_name)
+        if durations is None:
+            return 0.0
+        return float(durations.get(station, durations.get("default", 0.0)))
+
+    def estimate(self, node):
+        # The duration of an execution on the fastest station, a cost for Simulator
+        class_name = node.__class__.__name__
+        if class_name not in self.__durations:
+            return 0.0
+        stations = self.stations_of(class_name) or (None, )
+        return min(self.duration(class_name, station) for station in stations)
+
+class StationStats:
+
+    def __init__(self):
+        self.executions = 0
+        self.busy = 0.0  # Total virtual seconds occupied
+        self.queueing_delay = 0.0  # Total virtual seconds waited for the station
+        self.max_queueing_delay = 0.0
+
+class VirtualClock:
+    """Completes the executions submitted by a Simulator in virtual time.
+
+    A station serves up to its capacity at a time. An execution waits for
+    the first of its stations to be free, the least used one of those free
+    together, and is done after its duration.
+    A Simulator given a clock calls execute() instead of submitting to its
+    executors, and advance() to move the clock to the next completion.
+    """
+
+    def __init__(self, model: DurationModel):
+        self.model = model
+        self.now = 0.0
+        self.__events = []  # heap of (time, serial, future, outputs, exception)
+        self.__serial = itertools.count()
+        self.__free = {}  # station -> heap of the virtual times its slots are free
+        self.stats = {}  # station -> StationStats
+        self.makespan = 0.0
+
+    def executes_on_scheduler(self, node):
+        # The clock executes on the scheduler thread as well. Nodes taking no time need not wait for it
+        return node.CONCURRENCY == 0 and not self.model.has_duration(node.__class__.__name__)
+
+    def execute(self, node, input_tokens):
+        # Executes node on input_tokens, done as the clock advances past its duration
+        batch, _ = node.prepare_execution(input_tokens)
+        return self.submit(node, len(batch), node.execute, input_tokens)
+
+    def submit(self, node, calls, function, *args):
+        # calls: executions of _execute, e.g. the elements of an expanded Spread
+        class_name = node.__class__.__name__
+        stations = self.model.stations_of(class_name)
+        start, station = self.now, None
+        if len(stations) > 0:
+            station = min(stations, key=lambda station: (self.__slots(station)[0], self.__executions(station)))
+            start = max(self.now, self.__slots(station)[0])
+        duration = self.model.duration(class_name, station) * calls
+        end = start + duration
+        if station is not None:
+            heapq.heapreplace(self.__slots(station), end)
+            stats = self.stats.setdefault(station, StationStats())
+            stats.executions += 1
+            stats.busy += duration
+            stats.queueing_delay += start - self.now
+            stats.max_queueing_delay = max(stats.max_queueing_delay, start - self.now)
+
+        outputs, exception = None, None
+        try:
+            outputs = function(*args)
+        except Exception as e:
+            exception = e
+        future = Future()
+        heapq.heappush(self.__events, (end, next(self.__serial), future, outputs, exception))
+        return future
+
+    def __slots(self, station):
+        if station not in self.__free:
+            self.__free[station] = [0.0] * self.model.capacity(station)
+        return self.__free[station]
+
+    def __executions(self, station):
+        stats = self.stats.get(station)
+        return 0 if stats is None else stats.executions
+
+    def advance(self):
+        # Completes the next execution. False if nothing is executing
+        if len(self.__events) == 0:
+            return False
+        self.now, _, future, outputs, exception = heapq.heappop(self.__events)
+        self.makespan = max(self.makespan, self.now)
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(outputs)
+        return True
+
+    def report(self):
+        makespan = self.makespan
+        return {
+            "makespan": makespan,
+            "stations": {
+                station: {
+                    "executions": stats.executions,
+                    "busy": stats.busy,
+                    "utilization": stats.busy / (makespan * self.model.capacity(station)) if makespan > 0 else 0.0,
+                    "queueing_delay": stats.queueing_delay,
+                    "mean_queueing_delay": stats.queueing_delay / stats.executions,
+                    "max_queueing_delay": stats.max_queueing_delay,
+                }
+                for station, stats in sorted(self.stats.items())
+            },
+        }
+
+    def reset(self):
+        assert len(self.__events) == 0
+        self.now = 0.0
+        self.__free.clear()
+        self.stats.clear()
+        self.makespan = 0.0